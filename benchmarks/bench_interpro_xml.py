@@ -0,0 +1,98 @@
+"""
+Compare parse_interpro_xml with the previous implementation (start+end events on every element, root.clear(),
+two find() per relation list): entries/s and peak RSS, each run in its own process.
+
+On a synthetic file:
+    python -m benchmarks.bench_interpro_xml --entries 30000
+On a release file:
+    python -m benchmarks.bench_interpro_xml --data-folder /path/to/interpro/60.0
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+import lxml.etree as et
+
+from benchmarks.generators import write_interpro_xml
+from contrib.interpro.parser import parse_interpro_xml
+
+
+def legacy_parse_interpro_xml(data_folder):
+    file_path = os.path.join(data_folder, "interpro.xml.gz")
+    f = gzip.GzipFile(file_path)
+    context = iter(et.iterparse(f, events=("start", "end")))
+    event, root = next(context)
+
+    for event, itemxml in context:
+        if event == "end" and itemxml.tag == "interpro":
+            item = dict(name=itemxml.find('name').text, **itemxml.attrib)
+            item['_id'] = item['id']
+            item['protein_count'] = int(item['protein_count'])
+            parents = [x.attrib['ipr_ref'] for x in itemxml.find("parent_list").getchildren()] if itemxml.find(
+                "parent_list") is not None else None
+            children = [x.attrib['ipr_ref'] for x in itemxml.find("child_list").getchildren()] if itemxml.find(
+                "child_list") is not None else None
+            contains = [x.attrib['ipr_ref'] for x in itemxml.find("contains").getchildren()] if itemxml.find(
+                "contains") is not None else None
+            found_in = [x.attrib['ipr_ref'] for x in itemxml.find("found_in").getchildren()] if itemxml.find(
+                "found_in") is not None else None
+            if parents:
+                assert len(parents) == 1
+                item['parent'] = parents[0]
+            item['children'] = children
+            item['contains'] = contains
+            item['found_in'] = found_in
+            yield item
+        root.clear()
+
+
+PARSERS = {'legacy': legacy_parse_interpro_xml, 'current': parse_interpro_xml}
+
+
+def _run(name, data_folder, queue):
+    t0 = time.perf_counter()
+    n = 0
+    # hash() is randomized per process, compare digests
+    checksum = hashlib.sha1()
+    for item in PARSERS[name](data_folder):
+        n += 1
+        checksum.update(json.dumps(item, sort_keys=True).encode())
+    elapsed = time.perf_counter() - t0
+    # ru_maxrss is in kB on linux
+    queue.put((n, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, checksum.hexdigest()))
+
+
+def measure(name, data_folder):
+    queue = multiprocessing.Queue()
+    p = multiprocessing.Process(target=_run, args=(name, data_folder, queue))
+    p.start()
+    n, elapsed, max_rss, checksum = queue.get()
+    p.join()
+    print("{:<8} {:>7} entries {:>7.2f}s {:>8.0f} entries/s {:>7.1f} MB max rss".format(
+        name, n, elapsed, n / elapsed, max_rss))
+    return checksum
+
+
+def main(data_folder):
+    checksums = {name: measure(name, data_folder) for name in PARSERS}
+    if len(set(checksums.values())) != 1:
+        print("WARNING: parsers disagree")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='benchmark interpro.xml.gz parsing')
+    parser.add_argument('--data-folder', help='folder with a real interpro.xml.gz (default: synthetic file)')
+    parser.add_argument('--entries', type=int, default=30000, help='number of synthetic entries')
+    args = parser.parse_args()
+    if args.data_folder:
+        main(args.data_folder)
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            write_interpro_xml(os.path.join(tmp_dir, "interpro.xml.gz"), args.entries)
+            main(tmp_dir)
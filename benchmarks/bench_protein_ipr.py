@@ -0,0 +1,81 @@
+"""
+Compare the per-protein work of parse_protein_ipr before and after the integer-encoded IprIndex
+
+Runs offline on a synthetic protein2ipr.dat.gz:
+    python -m benchmarks.bench_protein_ipr --proteins 200000
+"""
+import argparse
+import gzip
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.generators import iter_ipr_items, write_protein2ipr
+from contrib.interpro.parser import IprIndex, iter_line_blocks, iter_proteins, open_gzip, protein_doc
+
+
+def legacy_protein_doc(key, lines, ipr_items):
+    # parse_protein_ipr's per-protein work before IprIndex
+    protein = []
+    for line in lines:
+        uniprot_id, interpro_id, name, ext_id, start, stop = line
+        protein.append({'uniprot_id': uniprot_id, 'interpro_id': interpro_id, 'name': name,
+                        'ext_id': ext_id, 'start': start, 'stop': stop})
+    prot_items = [ipr_items[x] for x in set(x['interpro_id'] for x in protein)]
+    families = [x for x in prot_items if x['type'] == "Family"]
+    families_id = set(x['id'] for x in families)
+    parents = set(family['parent'] for family in families if 'parent' in family)
+    specific_families = families_id - parents
+    has_part = [x['id'] for x in prot_items if x['type'] != "Family"]
+    return {'_id': key, 'subclass': list(specific_families), 'has_part': list(has_part)}
+
+
+def run_legacy(file_path, ipr_items):
+    from itertools import groupby
+    with gzip.open(file_path, 'rb') as f:
+        p2ipr = map(lambda x: x.decode('utf-8').rstrip().split('\t'), f)
+        for key, lines in groupby(p2ipr, key=lambda x: x[0]):
+            yield legacy_protein_doc(key, lines, ipr_items)
+
+
+def run_current(file_path, ipr):
+    with open_gzip(file_path) as f:
+        for key, interpro_ids in iter_proteins(iter_line_blocks(f)):
+            yield protein_doc(key, interpro_ids, ipr)
+
+
+def measure(name, build, run, file_path):
+    # throughput, without tracing
+    table = build()
+    t0 = time.perf_counter()
+    n = sum(1 for _ in run(file_path, table))
+    elapsed = time.perf_counter() - t0
+    del table
+    # peak memory of building the lookup table and parsing
+    tracemalloc.start()
+    table = build()
+    table_size, _ = tracemalloc.get_traced_memory()
+    for _ in run(file_path, table):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{:<8} {:>9} proteins {:>8.2f}s {:>10.0f} proteins/s {:>8.1f} MB table {:>8.1f} MB peak".format(
+        name, n, elapsed, n / elapsed, table_size / 1e6, peak / 1e6))
+
+
+def main(n_proteins, domains):
+    ipr_ids = [x['id'] for x in iter_ipr_items()]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, "protein2ipr.dat.gz")
+        write_protein2ipr(file_path, ipr_ids, n_proteins, domains=domains)
+        measure("legacy", lambda: {x['_id']: x for x in iter_ipr_items()}, run_legacy, file_path)
+        measure("current", lambda: IprIndex(iter_ipr_items()), run_current, file_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='benchmark protein2ipr parsing')
+    parser.add_argument('--proteins', type=int, default=200000, help='number of synthetic proteins')
+    parser.add_argument('--domains', type=int, default=4, help='mean number of lines per protein')
+    args = parser.parse_args()
+    main(args.proteins, args.domains)
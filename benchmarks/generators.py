@@ -0,0 +1,133 @@
+"""
+Deterministic synthetic input files for the benchmarks
+"""
+import gzip
+import random
+
+IPR_TYPES = ["Family", "Domain", "Repeat", "Conserved_site", "Binding_site", "Active_site", "PTM"]
+
+
+def iter_ipr_items(n_entries=30000, seed=0):
+    # entries shaped like the output of parse_interpro_xml
+    rnd = random.Random(seed)
+    for n in range(n_entries):
+        ipr_id = "IPR{:06d}".format(n)
+        item = {'_id': ipr_id, 'id': ipr_id, 'type': rnd.choice(IPR_TYPES), 'name': "entry {}".format(n),
+                'short_name': "entry_{}".format(n), 'protein_count': rnd.randint(1, 10000)}
+        if n and rnd.random() < 0.3:
+            item['parent'] = "IPR{:06d}".format(rnd.randrange(n))
+        yield item
+
+
+def write_interpro_xml(file_path, n_entries=30000, seed=0):
+    """
+    Write an interpro.xml.gz with a release block and `n_entries` <interpro> entries, using the same
+    parents/types as iter_ipr_items
+    """
+    rnd = random.Random(seed + 1)
+    with gzip.open(file_path, 'wt', compresslevel=1) as f:
+        f.write('<?xml version="1.0" encoding="ISO-8859-1"?>\n<!DOCTYPE interprodb SYSTEM "interpro.dtd">\n')
+        f.write('<interprodb>\n<release>\n')
+        f.write('  <dbinfo dbname="INTERPRO" entry_count="{}" file_date="03-NOV-16" version="60.0"/>\n'.format(n_entries))
+        for db in ["PFAM", "PROSITE", "SMART", "GENE3D", "SSF", "PANTHER", "CDD"]:
+            f.write('  <dbinfo dbname="{}" entry_count="{}" file_date="01-OCT-16" version="1.0"/>\n'.format(
+                db, rnd.randint(1000, 100000)))
+        f.write('</release>\n')
+        for item in iter_ipr_items(n_entries, seed=seed):
+            f.write('<interpro id="{id}" protein_count="{protein_count}" short_name="{short_name}" '
+                    'type="{type}">\n<name>{name}</name>\n'.format(**item))
+            f.write('<abstract><p>{}</p></abstract>\n'.format(" ".join(
+                "Lorem ipsum [<cite idref=\"PUB{:05d}\"/>]".format(rnd.randrange(99999)) for _ in range(20))))
+            f.write('<pub_list>{}</pub_list>\n'.format("".join(
+                '<publication id="PUB{:05d}"><author_list>A B</author_list><title>t</title></publication>'.format(
+                    rnd.randrange(99999)) for _ in range(rnd.randint(0, 5)))))
+            if 'parent' in item:
+                f.write('<parent_list><rel_ref ipr_ref="{}"/></parent_list>\n'.format(item['parent']))
+            for tag in ["child_list", "contains", "found_in"]:
+                if rnd.random() < 0.2:
+                    f.write('<{0}>{1}</{0}>\n'.format(tag, "".join(
+                        '<rel_ref ipr_ref="IPR{:06d}"/>'.format(rnd.randrange(n_entries))
+                        for _ in range(rnd.randint(1, 4)))))
+            f.write('<member_list><db_xref protein_count="{}" db="PFAM" dbkey="PF{:05d}" name="x"/></member_list>\n'
+                    .format(item['protein_count'], rnd.randrange(20000)))
+            f.write('</interpro>\n')
+        f.write('<deleted_entries><del_ref id="IPR999999"/></deleted_entries>\n</interprodb>\n')
+
+
+def write_protein2ipr(file_path, ipr_ids, n_proteins, domains=4, seed=0):
+    """
+    Write a protein2ipr.dat.gz with `n_proteins` proteins (sorted by uniprot id), each with on average
+    `domains` lines
+    """
+    rnd = random.Random(seed)
+    with gzip.open(file_path, 'wt', compresslevel=1) as f:
+        for n in range(n_proteins):
+            uniprot_id = "A{:09d}".format(n)
+            for _ in range(rnd.randint(1, 2 * domains - 1)):
+                start = rnd.randint(1, 500)
+                f.write("{}\t{}\tsome domain name\tPF{:05d}\t{}\t{}\n".format(
+                    uniprot_id, rnd.choice(ipr_ids), rnd.randrange(20000), start, start + rnd.randint(10, 300)))
+
+
+def write_obo(file_path, n_terms=20000, seed=0):
+    """
+    Write an obo file with `n_terms` [Term] stanzas (DOID:n) with is_a/part_of edges to earlier terms, synonyms,
+    xrefs and a few obsolete terms
+    """
+    rnd = random.Random(seed)
+    with open(file_path, 'w') as f:
+        f.write("format-version: 1.2\ndata-version: releases/2016-10-18\ndate: 18:10:2016 12:00\n"
+                "saved-by: benchmarks\nsubsetdef: DO_rare_slim \"DO_rare_slim\"\nontology: doid\n\n")
+        for n in range(n_terms):
+            f.write("[Term]\nid: DOID:{}\nname: disease {}\n".format(n, n))
+            f.write('def: "A disease that is {} {}." [url:http://en.wikipedia.org/wiki/Disease_{}]\n'.format(
+                rnd.choice(["located_in", "caused_by", "has_symptom"]), rnd.randrange(n_terms), n))
+            for _ in range(rnd.randint(0, 3)):
+                f.write('synonym: "disease {} synonym {}" EXACT []\n'.format(n, rnd.randrange(100)))
+            for _ in range(rnd.randint(0, 4)):
+                f.write("xref: {}:{}\n".format(rnd.choice(["UMLS_CUI", "OMIM", "MESH", "ICD10CM"]),
+                                               rnd.randrange(10 ** 6)))
+            if n:
+                for parent in set(rnd.randrange(n) for _ in range(rnd.randint(1, 2))):
+                    f.write("is_a: DOID:{} ! disease {}\n".format(parent, parent))
+                if rnd.random() < 0.1:
+                    f.write("relationship: part_of DOID:{}\n".format(rnd.randrange(n)))
+            if rnd.random() < 0.01:
+                f.write("is_obsolete: true\n")
+            f.write("\n")
+        f.write("[Typedef]\nid: part_of\nname: part of\nis_transitive: true\n")
+
+
+OWL_PREFIXES = ["DOID", "UMLS", "OMIM", "Orphanet", "MESH"]
+
+
+def write_owl(file_path, n_classes=3000, max_chain=5, seed=0):
+    """
+    Write an rdf/xml owl file with `n_classes` classes in groups of equivalent classes. Each group is a chain of
+    owl:equivalentClass (a = b, b = c, ...) of 1 to `max_chain` classes, stated in either direction, so that the
+    whole group is only found by following the chain both ways
+    """
+    rnd = random.Random(seed)
+    uri = "http://purl.obolibrary.org/obo/{}_{}"
+    with open(file_path, 'w') as f:
+        f.write('<?xml version="1.0"?>\n<rdf:RDF xmlns="http://purl.obolibrary.org/obo/mondo.owl#"\n'
+                '     xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"\n'
+                '     xmlns:rdfs="http://www.w3.org/2000/01/rdf-schema#"\n'
+                '     xmlns:owl="http://www.w3.org/2002/07/owl#">\n'
+                '    <owl:Ontology rdf:about="http://purl.obolibrary.org/obo/mondo.owl"/>\n')
+        n = 0
+        while n < n_classes:
+            size = min(rnd.randint(1, max_chain), n_classes - n)
+            chain = [uri.format(rnd.choice(OWL_PREFIXES), n + i) for i in range(size)]
+            n += len(chain)
+            # for each link of the chain, whether it's stated on its first class (else on its second)
+            forward = [rnd.random() < 0.5 for _ in chain[1:]]
+            for i, cls in enumerate(chain):
+                f.write('    <owl:Class rdf:about="{}">\n        <rdfs:label>class {}</rdfs:label>\n'.format(
+                    cls, cls.rsplit("/", 1)[-1]))
+                if i + 1 < len(chain) and forward[i]:
+                    f.write('        <owl:equivalentClass rdf:resource="{}"/>\n'.format(chain[i + 1]))
+                if i and not forward[i - 1]:
+                    f.write('        <owl:equivalentClass rdf:resource="{}"/>\n'.format(chain[i - 1]))
+                f.write('    </owl:Class>\n')
+        f.write('</rdf:RDF>\n')
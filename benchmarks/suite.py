@@ -0,0 +1,157 @@
+"""
+Benchmark suite for the parsers of the contrib sources, on deterministic synthetic files (see generators.py)
+
+Each case runs in its own process: its setup (not timed) then the timed parse. Reports rows/s and the peak RSS of
+the process. Runs offline:
+
+    python -m benchmarks.suite                       # all cases
+    python -m benchmarks.suite --scale 0.1 --only obo_read,owl_parse
+    python -m benchmarks.suite --output results.json  # also write the results, to compare runs
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from benchmarks.generators import iter_ipr_items, write_interpro_xml, write_obo, write_owl, write_protein2ipr
+
+# sizes at scale 1
+SIZES = {'interpro_entries': 30000, 'proteins': 200000, 'domains': 4, 'obo_terms': 20000, 'owl_classes': 3000}
+RELEASE_INFO_REPEAT = 100
+
+
+def write_files(tmp_dir, sizes):
+    n_entries = sizes['interpro_entries']
+    write_interpro_xml(os.path.join(tmp_dir, "interpro.xml.gz"), n_entries)
+    ipr_ids = [x['id'] for x in iter_ipr_items(n_entries)]
+    write_protein2ipr(os.path.join(tmp_dir, "protein2ipr.dat.gz"), ipr_ids, sizes['proteins'],
+                      domains=sizes['domains'])
+    write_obo(os.path.join(tmp_dir, "mondo.obo"), sizes['obo_terms'])
+    write_owl(os.path.join(tmp_dir, "mondo.owl"), sizes['owl_classes'])
+
+
+#### cases: setup(tmp_dir, sizes) returns the args of run(*args), which returns an iterable of rows or a row count
+
+def setup_folder(tmp_dir, sizes):
+    return tmp_dir,
+
+
+def run_interpro_xml(folder):
+    from contrib.interpro.parser import parse_interpro_xml
+    return parse_interpro_xml(folder)
+
+
+def run_release_info(folder):
+    from contrib.interpro.parser import parse_release_info
+    return sum(sum(1 for _ in parse_release_info(folder)) for _ in range(RELEASE_INFO_REPEAT))
+
+
+def setup_protein_ipr(tmp_dir, sizes):
+    from contrib.interpro.parser import IprIndex
+    return tmp_dir, IprIndex(iter_ipr_items(sizes['interpro_entries']))
+
+
+def run_protein_ipr(folder, ipr):
+    from contrib.interpro.parser import parse_protein_ipr
+    return parse_protein_ipr(folder, ipr)
+
+
+def setup_obo_lines(tmp_dir, sizes):
+    with open(os.path.join(tmp_dir, "mondo.obo")) as f:
+        return f.readlines(),
+
+
+def run_obo_read(lines):
+    from contrib.mondo.obo import read_obo
+    return read_obo(lines).number_of_nodes()
+
+
+def setup_obo_graph(tmp_dir, sizes):
+    from contrib.mondo.obo import read_obo
+    return read_obo(setup_obo_lines(tmp_dir, sizes)[0]),
+
+
+def run_obo_graph_to_d(graph):
+    from contrib.mondo.parser import graph_to_d
+    return len(graph_to_d(graph))
+
+
+def setup_owl(tmp_dir, sizes):
+    return os.path.join(tmp_dir, "mondo.owl"),
+
+
+def run_owl_parse(file_path):
+    from contrib.mondo.query_owl import parse
+    return parse(file_path)
+
+
+CASES = {
+    'interpro_xml': (setup_folder, run_interpro_xml),
+    'release_info': (setup_folder, run_release_info),
+    'protein_ipr': (setup_protein_ipr, run_protein_ipr),
+    'obo_read': (setup_obo_lines, run_obo_read),
+    'obo_graph_to_d': (setup_obo_graph, run_obo_graph_to_d),
+    'owl_parse': (setup_owl, run_owl_parse),
+}
+
+
+def _run(name, tmp_dir, sizes, queue):
+    setup, run = CASES[name]
+    try:
+        args = setup(tmp_dir, sizes)
+        t0 = time.perf_counter()
+        result = run(*args)
+        rows = result if isinstance(result, int) else sum(1 for _ in result)
+        elapsed = time.perf_counter() - t0
+    except ImportError as e:
+        # e.g. networkx or rdflib isn't installed
+        queue.put({'case': name, 'skipped': str(e)})
+        return
+    except Exception as e:
+        queue.put({'case': name, 'failed': "{}: {}".format(type(e).__name__, e)})
+        return
+    # ru_maxrss is in kB on linux
+    queue.put({'case': name, 'rows': rows, 'seconds': elapsed, 'rows_per_second': rows / elapsed,
+               'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024})
+
+
+def measure(name, tmp_dir, sizes):
+    queue = multiprocessing.Queue()
+    p = multiprocessing.Process(target=_run, args=(name, tmp_dir, sizes, queue))
+    p.start()
+    p.join()
+    if p.exitcode:
+        result = {'case': name, 'failed': "exit code {}".format(p.exitcode)}
+    else:
+        result = queue.get()
+    if 'rows' in result:
+        print("{case:<16} {rows:>9} rows {seconds:>8.2f}s {rows_per_second:>10.0f} rows/s "
+              "{peak_rss_mb:>8.1f} MB peak rss".format(**result))
+    else:
+        print("{:<16} {}".format(name, result.get('skipped') or result.get('failed')))
+    return result
+
+
+def main(scale=1.0, only=None, output=None):
+    sizes = {k: v if k == 'domains' else max(1, int(v * scale)) for k, v in SIZES.items()}
+    names = only or list(CASES)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print("writing synthetic files: {}".format(sizes))
+        write_files(tmp_dir, sizes)
+        results = [measure(name, tmp_dir, sizes) for name in names]
+    if output:
+        with open(output, 'w') as f:
+            json.dump({'sizes': sizes, 'results': results}, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='benchmark the contrib parsers on synthetic data')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplies the sizes of the synthetic files')
+    parser.add_argument('--only', help='comma separated cases: {}'.format(",".join(CASES)))
+    parser.add_argument('--output', help='write the results to this json file')
+    args = parser.parse_args()
+    main(args.scale, args.only.split(",") if args.only else None, args.output)
@@ -4,16 +4,17 @@ import asyncio
 import os
 
 import asyncssh
-import concurrent.futures
 import sys
 from functools import partial
 
-executor = concurrent.futures.ProcessPoolExecutor(max_workers=2)
+import config, biothings
+from contrib.scheduler import Scheduler
+
+# jobs run in the pool of their source's resource class, see HUB_RESOURCE_CLASSES in config.py
+executor = Scheduler.from_config(config)
 loop = asyncio.get_event_loop()
 loop.set_default_executor(executor)
 
-import config, biothings
-
 biothings.config_for_app(config)
 
 import contrib
@@ -29,6 +30,19 @@ dmanager = dumper.DumperManager(loop)
 dmanager.register_sources(contrib.__sources_dict__)
 dmanager.schedule_all()
 
+from contrib import metrics
+from contrib.log_shipper import LogShipper
+from contrib.pipeline import PipelineManager
+
+# sends the log chunks left in the spool when the logging host was down
+log_shipper = LogShipper.from_config().start()
+
+# runs the post-upload stages the uploaders ask for (without a pipeline dir, the uploaders run them themselves)
+pmanager = None
+if config.HUB_PIPELINE_DIR:
+    pmanager = PipelineManager(executor, config.HUB_PIPELINE_DIR, loop)
+    pmanager.poll()
+
 from biothings.utils.hub import schedule
 
 COMMANDS = {
@@ -40,12 +54,20 @@ COMMANDS = {
     "um": umanager,
     "upload": umanager.upload_src,
     "upload_all": umanager.upload_all,
+    "log_shipper": log_shipper,
+    # metrics of the uploaders and bots
+    "metrics": metrics.read_all,
     # admin/advanced
     "loop": loop,
     "executor": executor,
+    "sched": executor.status,
     "g": globals(),
     "sch": partial(schedule, loop),
 }
+if pmanager:
+    # post-upload stages
+    COMMANDS["pm"] = pmanager
+    COMMANDS["stages"] = pmanager.status
 
 passwords = {
     'guest': '',  # guest account with no password
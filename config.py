@@ -72,5 +72,37 @@ HIPCHAT_CONFIG = {
 # path to ipcluster json config file (if any)
 CLUSTER_CLIENT_JSON = None
 
+# HUB SCHEDULER #
+# the hub's jobs run in the pool of their source's resource class (see contrib/scheduler.py). workers: size of the
+# pool, priority: queued jobs with a lower one start first, max_memory: cap (GB) on the sum of the estimated memory
+# of the running jobs, None: no cap
+HUB_RESOURCE_CLASSES = {
+    "cpu": {"workers": 2, "priority": 1, "max_memory": None},
+    "memory": {"workers": 1, "priority": 0, "max_memory": 48},
+    "network": {"workers": 4, "priority": 2, "max_memory": None},
+}
+# resource class, estimated memory (GB) and optionally priority of the jobs of each source (uploader/dumper name),
+# and the number of workers of the class they take if they start processes of their own (None: all of them)
+HUB_SOURCES = {
+    "interpro": {"class": "cpu", "memory": 2},
+    # the protein2ipr parse runs in INTERPRO_PARSE_PROCESSES processes
+    "interpro_protein": {"class": "memory", "memory": 24, "workers": INTERPRO_PARSE_PROCESSES},
+    "mondo": {"class": "cpu", "memory": 2},
+    "mygene": {"class": "network", "memory": 4},
+}
+# resource class of the jobs of the sources that aren't in HUB_SOURCES
+HUB_DEFAULT_RESOURCE_CLASS = "cpu"
+# uploaders request their post-upload stages (bots, log shipping) here, the hub runs them (see contrib/pipeline.py).
+# None: the uploaders run them themselves
+HUB_PIPELINE_DIR = "pipelines"
+
 LOGGING_HOST = "35.160.125.64"
 LOGGING_PORT = "8000"
+# bot logs are gzipped in chunks to this directory before they're sent to the logging host, and stay there until
+# it has them (see contrib/log_shipper.py)
+LOG_SPOOL_DIR = "logs/spool"
+# ship the bot logs while the bots run, instead of only when they're done
+LOG_SHIP_FOLLOW = True
+# the uploaders and bots write their metrics here, in the Prometheus text format (see contrib/metrics.py).
+# None: don't write them
+METRICS_DIR = "logs/metrics"
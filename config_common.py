@@ -126,3 +126,43 @@ DATA_TARGET_MASTER_COLLECTION = 'db_master'
 DISPATCHER_SLEEP_TIME = 1
 # Use default storage
 SOURCE_STORAGE_CLASS = None # use default one
+
+# number of worker processes used to parse protein2ipr.dat.gz
+# None: one per cpu, 1: parse in the uploader process. Needs python indexed_gzip (see contrib/interpro/parser.py),
+# without it the file is parsed in the uploader process anyway
+INTERPRO_PARSE_PROCESSES = 1
+# where the parsed interpro.xml.gz is cached. None: next to the data file
+INTERPRO_CACHE_DIR = None
+# only send proteins that were added/changed/removed since the previous interpro release to mongo,
+# and only run ProteinBot on those
+INTERPRO_PROTEIN_DELTA = False
+# only parse and upload the proteins listed in this file (see contrib/interpro/allowlist.py), e.g. the ones
+# already in wikidata: allowlist.dump_wikidata_uniprot("uniprot.bloom", taxon="Q15978631"). None: all proteins
+INTERPRO_PROTEIN_ALLOWLIST = None
+# also write the parsed proteins to a columnar store (contrib/interpro/store.py), in
+# <data_folder>/interpro_protein.store, readable without mongo
+INTERPRO_PROTEIN_STORE = False
+# how ProteinBot fetches the proteins that are in wikidata from interpro_protein, in _id order. "batch": pages of
+# _id range queries, "merge": one cursor over the collection (no_cursor_timeout)
+INTERPRO_PROTEIN_JOIN = "batch"
+# number of concurrent wikidata writes per bot (see contrib/wd_writer.py). None: write one item at a time, as the
+# mediawiki api etiquette asks bots to
+WD_WRITE_THREADS = None
+# re-read the interpro collection for ItemsBot's relationship pass instead of keeping all the terms in memory
+INTERPRO_STREAM_TERMS = False
+# read id mappings and fast run data from a local snapshot of a wikidata json dump (contrib/wd_snapshot.py)
+# instead of the sparql endpoint. None: use the sparql endpoint
+WD_SNAPSHOT = None
+# don't write to wikidata after an upload, write a report of what would be changed next to the bot logs
+# (see contrib/dry_run.py)
+WD_DRY_RUN = False
+# bots save their progress to a checkpoint next to their logs (see contrib/checkpoint.py). resume an interrupted
+# run of the same release from there, with the same run id and log, instead of starting over
+WD_RESUME = False
+# taxa ProteinBot is run for after an interpro upload, concurrently
+INTERPRO_PROTEIN_TAXA = ["Q15978631"]
+# bulk loading of the uploaders' docs (see contrib/storage.py): docs per unordered insert_many, number of
+# batches inserted concurrently, and the write concern of the inserts
+MONGO_BULK_BATCH_SIZE = 10000
+MONGO_BULK_THREADS = 4
+MONGO_BULK_WRITE_CONCERN = {'w': 1}
@@ -0,0 +1,88 @@
+"""
+Checkpoints for long bot passes
+
+A bot pass goes through a mongo collection in _id order and calls update() with each _id it's done with. Every
+`every` ids (or `interval` seconds) the last _id and the counts are saved to a json file, with the run id and log
+name, so that an interrupted run can be resumed with the same log, starting after the last saved _id:
+
+    checkpoint = Checkpoint.open(path, resume=True, run_id=run_id, key=release)
+    for doc in collection.find({'_id': {'$gt': checkpoint.last_id('proteins')}}).sort('_id', 1):
+        ...
+        checkpoint.update('proteins', doc['_id'])
+    checkpoint.done('proteins')
+    ...
+    checkpoint.remove()  # run finished
+"""
+import json
+import os
+import time
+
+SAVE_EVERY = 1000
+SAVE_INTERVAL = 60
+
+
+class Checkpoint:
+    def __init__(self, file_path, run_id=None, log_name=None, key=None, passes=None, every=SAVE_EVERY,
+                 interval=SAVE_INTERVAL):
+        self.file_path = file_path
+        self.run_id = run_id
+        self.log_name = log_name
+        self.key = key
+        self.passes = passes or {}
+        self.every = every
+        self.interval = interval
+        self.before_save = None
+        self.n_unsaved = 0
+        self.last_save = time.time()
+        self.resumed = bool(self.passes)
+
+    @classmethod
+    def open(cls, file_path, resume=False, run_id=None, log_name=None, key=None):
+        """
+        The saved checkpoint if `resume` and there is one for the same `key` (e.g. the release the run is for). Its
+        run_id and log_name win. Else a new one
+        """
+        if resume and os.path.exists(file_path):
+            with open(file_path) as f:
+                d = json.load(f)
+            if d['key'] == key:
+                print("resuming run {} from {}".format(d['run_id'], file_path))
+                return cls(file_path, d['run_id'], d['log_name'], key, d['passes'])
+            print("not resuming from {}: it's for {}, not {}".format(file_path, d['key'], key))
+        return cls(file_path, run_id, log_name, key)
+
+    def state(self, pass_name):
+        return self.passes.setdefault(pass_name, {'last_id': None, 'count': 0, 'done': False})
+
+    def last_id(self, pass_name):
+        return self.state(pass_name)['last_id']
+
+    def is_done(self, pass_name):
+        return self.state(pass_name)['done']
+
+    def update(self, pass_name, _id):
+        state = self.state(pass_name)
+        state['last_id'] = _id
+        state['count'] += 1
+        self.n_unsaved += 1
+        if self.n_unsaved >= self.every or time.time() - self.last_save >= self.interval:
+            self.save()
+
+    def done(self, pass_name):
+        self.state(pass_name)['done'] = True
+        self.save()
+
+    def save(self):
+        if self.before_save:
+            # e.g. wait for queued writes, they have to be done before their ids are saved
+            self.before_save()
+        tmp_path = self.file_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'run_id': self.run_id, 'log_name': self.log_name, 'key': self.key, 'passes': self.passes}, f)
+        os.replace(tmp_path, self.file_path)
+        self.n_unsaved = 0
+        self.last_save = time.time()
+
+    def remove(self):
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
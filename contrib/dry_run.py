@@ -0,0 +1,162 @@
+"""
+Dry run: see what the bots would change without writing anything
+
+A DryRun is passed to the bots in place of a wd_writer.WriteExecutor. Instead of writing the items, it records
+whether they require a write and how their statements differ from what's in wikidata, and writes a report:
+
+    {"items": {"skip": 28000, "update": 1500, "create": 12, "needs_online_check": 3},
+     "properties": {"P279": {"added": 130, "removed": 2}, ...},
+     "would_create": ["InterPro Release 60.0"],
+     "samples": [{"id": "IPR000001", "qid": "Q24726701", "diff": {"P279": {"added": [...], "removed": [...]}}}]}
+
+Reports from several processes can be merged. The interpro ProteinBot, which has by far the most items, splits them
+over worker processes (ProteinBot.dry_run_parallel). The other bots (ItemsBot, GeneBot, the yeast ProteinBot,
+MondoBot) build their items one after the other, as when they write: their runs are short enough.
+
+A dry run never creates items, not even the release items the references point to (DryRun.release_qid).
+With a wikidata snapshot installed offline (contrib/wd_snapshot.py), the items that would need to be loaded from
+wikidata are counted as needs_online_check.
+"""
+import copy
+import functools
+import json
+from collections import Counter, defaultdict
+
+N_SAMPLES = 20
+# stands in for the qid of a release item a dry run would create
+PLACEHOLDER_QID = "Q0"
+
+
+def claim_values(item_json):
+    """
+    {prop: set of values (as json)} of the claims of an item's json representation
+    """
+    values = defaultdict(set)
+    for prop, claims in item_json.get('claims', {}).items():
+        for claim in claims:
+            snak = claim.get('mainsnak', {})
+            if claim.get('remove') is not None or snak.get('snaktype') != 'value':
+                continue
+            values[prop].add(json.dumps(snak['datavalue']['value'], sort_keys=True))
+    return values
+
+
+def keep_loaded_entities(engine=None):
+    """
+    Makes engine.get_wd_entity keep a copy of the entity it loads, as loaded_json: the engine applies the new data
+    to wd_json_representation in place, so that one can't be diffed against anymore
+    """
+    if engine is None:
+        from ProteinBoxBot_Core import PBB_Core
+        engine = PBB_Core.WDItemEngine
+    get_wd_entity = engine.get_wd_entity
+    if getattr(get_wd_entity, 'keeps_loaded', False):
+        return
+
+    @functools.wraps(get_wd_entity)
+    def wrapper(self, *args, **kwargs):
+        entity = get_wd_entity(self, *args, **kwargs)
+        self.loaded_json = copy.deepcopy(entity)
+        return entity
+
+    wrapper.keeps_loaded = True
+    engine.get_wd_entity = wrapper
+
+
+def lookup_release(release):
+    """
+    qid of a PBB_Helpers.Release item, or None if it doesn't exist. Without a login get_or_create doesn't create it
+    """
+    try:
+        return release.get_or_create(None) or None
+    except ValueError:
+        return None
+
+
+def statement_diff(wd_item):
+    """
+    {prop: {'added': [...], 'removed': [...]}} between the item in wikidata and what would be written
+    """
+    old = claim_values(getattr(wd_item, 'loaded_json', None) or {})
+    new = claim_values(wd_item.get_wd_json_representation())
+    diff = {}
+    for prop in set(old) | set(new):
+        added, removed = new[prop] - old[prop], old[prop] - new[prop]
+        if added or removed:
+            diff[prop] = {'added': sorted(added), 'removed': sorted(removed)}
+    return diff
+
+
+class DryRun:
+    def __init__(self, n_samples=N_SAMPLES, engine=None):
+        self.n_samples = n_samples
+        self.items = Counter()
+        self.properties = defaultdict(Counter)
+        self.samples = []
+        # release title: qid
+        self.releases = {}
+        try:
+            keep_loaded_entities(engine)
+        except ImportError:
+            pass
+
+    def release_qid(self, release):
+        """
+        qid of a PBB_Helpers.Release item, looked up once and never created. One that doesn't exist yet is reported
+        as would create, and PLACEHOLDER_QID stands in for it
+        """
+        title = getattr(release, 'title', str(release))
+        if title not in self.releases:
+            self.releases[title] = lookup_release(release) or PLACEHOLDER_QID
+        return self.releases[title]
+
+    def record(self, wd_item, record_id=None):
+        if not wd_item.require_write:
+            self.items['skip'] += 1
+            return
+        if getattr(wd_item, 'needs_online_check', False):
+            # the entity couldn't be loaded (wd_snapshot offline): there's nothing to diff against
+            self.items['needs_online_check'] += 1
+            if len(self.samples) < self.n_samples:
+                self.samples.append({'id': record_id, 'qid': wd_item.wd_item_id, 'needs_online_check': True})
+            return
+        self.items['create' if wd_item.create_new_item else 'update'] += 1
+        diff = statement_diff(wd_item)
+        for prop, d in diff.items():
+            self.properties[prop]['added'] += len(d['added'])
+            self.properties[prop]['removed'] += len(d['removed'])
+        if len(self.samples) < self.n_samples:
+            self.samples.append({'id': record_id, 'qid': wd_item.wd_item_id, 'diff': diff})
+
+    # same interface as wd_writer.WriteExecutor
+    def write(self, wd_item, record_id, record_prop, login, **kwargs):
+        self.record(wd_item, record_id)
+
+    def submit(self, fn, wd_item, *args, record_id=None, **kwargs):
+        self.record(wd_item, record_id)
+
+    def join(self):
+        pass
+
+    def shutdown(self):
+        pass
+
+    def merge(self, other):
+        self.items.update(other.items)
+        for prop, counts in other.properties.items():
+            self.properties[prop].update(counts)
+        self.samples.extend(other.samples[:self.n_samples - len(self.samples)])
+        self.releases.update(other.releases)
+        return self
+
+    def report(self):
+        return {'items': dict(self.items),
+                'properties': {prop: dict(counts) for prop, counts in sorted(self.properties.items())},
+                'would_create': sorted(title for title, qid in self.releases.items() if qid == PLACEHOLDER_QID),
+                'samples': self.samples}
+
+    def write_report(self, file_path):
+        with open(file_path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+        print("dry run: {}. report: {}".format(dict(self.items), file_path))
+        return file_path
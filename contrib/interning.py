@@ -0,0 +1,39 @@
+"""
+Shared reference snaks for the bots
+
+The bots write the same "stated in <release>" / "retrieved <date>" reference snaks on millions of statements.
+These are built once and handed out to everyone. They are shared, so never modify them, and copy a reference list
+(list(reference)) before appending to it.
+
+Statements themselves are not shared: WDItemEngine sets the claim id on the statements it is given.
+"""
+from ProteinBoxBot_Core import PBB_Core
+
+_cache = {}
+
+
+def interned(key, factory):
+    """
+    factory() is cached under key. A None (e.g. a lookup that found nothing) isn't, nor an exception: factory is
+    called again the next time
+    """
+    try:
+        return _cache[key]
+    except KeyError:
+        value = factory()
+        if value is not None:
+            _cache[key] = value
+        return value
+
+
+def stated_in(qid):
+    return interned(('P248', qid), lambda: PBB_Core.WDItemID(qid, 'P248', is_reference=True))
+
+
+def retrieved(date):
+    value = date.strftime('+%Y-%m-%dT00:00:00Z')
+    return interned(('P813', value), lambda: PBB_Core.WDTime(value, 'P813', is_reference=True))
+
+
+def clear():
+    _cache.clear()
@@ -1,6 +1,11 @@
 from ProteinBoxBot_Core import PBB_Core, PBB_Helpers
 from ProteinBoxBot_Core.PBB_Helpers import format_msg
 
+from ..interning import stated_in
+from ..lazy import lazy_class_attribute
+from .. import metrics
+from ..wd_writer import count_action, timed, try_write
+
 INTERPRO = "P2926"
 
 
@@ -19,9 +24,14 @@ class IPRTerm:
      'type': 'Domain',
      'type_wdid': 'Q898273'}
 
+    Slotted, and the reference is only built when needed, so that a few 100k terms can be kept in memory
     """
+    __slots__ = ('name', 'short_name', 'id', 'wdid', 'parent', 'parent_wdid', 'children', 'children_wdid',
+                 'contains', 'contains_wdid', 'found_in', 'found_in_wdid', 'type', 'type_wdid', 'description',
+                 'release_wdid', '_reference')
     fast_run_base_filter = {INTERPRO: ''}
-    ipr2wd = PBB_Helpers.id_mapper(INTERPRO)
+    # ids that aren't in wikidata, according to the sparql endpoint
+    ipr_not_found = set()
 
     type2desc = {"Active_site": "InterPro Active Site",
                  "Binding_site": "InterPro Binding Site",
@@ -57,10 +67,8 @@ class IPRTerm:
         self.description = description
         if self.description is None and self.type:
             self.description = IPRTerm.type2desc[self.type]
-        self.lang_descr = {'en': self.description}
         self.release_wdid = release_wdid
-        self.reference = None
-        self.create_reference()
+        self._reference = None
 
     def __repr__(self):
         return '{}: {}'.format(self.id, self.name)
@@ -68,50 +76,93 @@ class IPRTerm:
     def __str__(self):
         return '{}: {}'.format(self.id, self.name)
 
+    @property
+    def lang_descr(self):
+        return {'en': self.description}
+
+    @property
+    def reference(self):
+        if self._reference is None:
+            self.create_reference()
+        return self._reference
+
+    @lazy_class_attribute
+    def ipr2wd(cls):
+        with metrics.timer("id_mapper_seconds", prop=INTERPRO):
+            return PBB_Helpers.id_mapper(INTERPRO)
+
     @classmethod
     def refresh_ipr_wd(cls):
         cls.ipr2wd = PBB_Helpers.id_mapper(INTERPRO)
+        cls.ipr_not_found = set()
+
+    @classmethod
+    def get_wdid(cls, ipr_id):
+        """
+        QID of an interpro id. ipr2wd is written through by create_item, the sparql endpoint is only asked about
+        the ones that are missing. Raises KeyError if it isn't in wikidata
+        """
+        if ipr_id not in cls.ipr2wd and ipr_id not in cls.ipr_not_found:
+            query = 'SELECT ?item WHERE {{ ?item wdt:{} "{}" }}'.format(INTERPRO, ipr_id)
+            results = PBB_Core.WDItemEngine.execute_sparql_query(query)['results']['bindings']
+            if results:
+                cls.ipr2wd[ipr_id] = results[0]['item']['value'].split("/")[-1]
+            else:
+                cls.ipr_not_found.add(ipr_id)
+        return cls.ipr2wd[ipr_id]
 
     def do_wdid_lookup(self):
         # this can only be done after all items have been created
-        self.wdid = IPRTerm.ipr2wd[self.id]
+        self.wdid = IPRTerm.get_wdid(self.id)
         if self.parent:
-            self.parent_wdid = IPRTerm.ipr2wd[self.parent]
+            self.parent_wdid = IPRTerm.get_wdid(self.parent)
         # children aren't added (reverse of parent relationship)
         if self.contains:
-            self.contains_wdid = [IPRTerm.ipr2wd[x] for x in self.contains]
+            self.contains_wdid = [IPRTerm.get_wdid(x) for x in self.contains]
         if self.found_in:
-            self.found_in_wdid = [IPRTerm.ipr2wd[x] for x in self.found_in]
+            self.found_in_wdid = [IPRTerm.get_wdid(x) for x in self.found_in]
 
     def create_reference(self):
         """ Create wikidata references for interpro
         This same reference will be used for everything. Except for a ref to the interpro item itself
         """
         # stated in Interpro version XX.X
-        ref_stated_in = PBB_Core.WDItemID(self.release_wdid, 'P248', is_reference=True)
+        ref_stated_in = stated_in(self.release_wdid)
         ref_ipr = PBB_Core.WDString(self.id, INTERPRO, is_reference=True)  # interpro ID
-        self.reference = [ref_stated_in, ref_ipr]
+        self._reference = [ref_stated_in, ref_ipr]
 
-    def create_item(self, login):
+    def create_item(self, login, executor=None):
         statements = [PBB_Core.WDExternalID(value=self.id, prop_nr=INTERPRO, references=[self.reference]),
                       PBB_Core.WDItemID(value=self.type_wdid, prop_nr="P279",
                                         references=[self.reference])]
 
-        wd_item = PBB_Core.WDItemEngine(item_name=self.name, domain='interpro', data=statements,
-                                        append_value=["P279"],
-                                        fast_run=True, fast_run_base_filter=IPRTerm.fast_run_base_filter)
+        with metrics.timer("fastrun_diff_seconds", bot="interpro_items"):
+            wd_item = PBB_Core.WDItemEngine(item_name=self.name, domain='interpro', data=statements,
+                                            append_value=["P279"],
+                                            fast_run=True, fast_run_base_filter=IPRTerm.fast_run_base_filter)
         wd_item.set_label(self.name, lang='en')
         for lang, description in self.lang_descr.items():
             wd_item.set_description(description, lang=lang)
         wd_item.set_aliases([self.short_name, self.id])
 
-        PBB_Helpers.try_write(wd_item, self.id, INTERPRO, login)
+        if executor:
+            executor.submit(self.write_item, wd_item, login, record_id=self.id)
+        else:
+            count_action(wd_item)
+            self.write_item(timed(wd_item), login)
+        # the statements keep it. no need to hold on to it until create_relationships
+        self._reference = None
 
         return wd_item
 
-    def create_relationships(self, login):
+    def write_item(self, wd_item, login):
+        PBB_Helpers.try_write(wd_item, self.id, INTERPRO, login)
+        if wd_item.wd_item_id:
+            # so that create_relationships doesn't depend on the sparql endpoint being up to date
+            IPRTerm.ipr2wd[self.id] = wd_item.wd_item_id
+
+    def create_relationships(self, login, executor=None):
         try:
-            # endpoint may not get updated in time?
             self.do_wdid_lookup()
         except KeyError as e:
             PBB_Core.WDItemEngine.log("ERROR", format_msg(self.id, INTERPRO, None, str(e), type(e)))
@@ -130,8 +181,10 @@ class IPRTerm:
         if len(statements) == 1:
             return
 
-        wd_item = PBB_Core.WDItemEngine(wd_item_id=self.wdid, domain='interpro', data=statements,
-                                        append_value=['P279', 'P527', 'P361'],
-                                        fast_run=True, fast_run_base_filter=IPRTerm.fast_run_base_filter)
+        with metrics.timer("fastrun_diff_seconds", bot="interpro_items"):
+            wd_item = PBB_Core.WDItemEngine(wd_item_id=self.wdid, domain='interpro', data=statements,
+                                            append_value=['P279', 'P527', 'P361'],
+                                            fast_run=True, fast_run_base_filter=IPRTerm.fast_run_base_filter)
 
-        PBB_Helpers.try_write(wd_item, self.id, INTERPRO, login, edit_summary="create/update subclass/has part/part of")
+        try_write(wd_item, self.id, INTERPRO, login, executor=executor,
+                  edit_summary="create/update subclass/has part/part of")
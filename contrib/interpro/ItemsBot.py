@@ -9,6 +9,10 @@ from tqdm import tqdm
 
 from local import WDUSER, WDPASS
 from .IPRTerm import IPRTerm
+from ..checkpoint import Checkpoint
+from ..dry_run import DryRun
+from ..log_shipper import shipping
+from ..wd_writer import WriteExecutor
 
 __metadata__ = {'name': 'InterproBot_Items',
                 'maintainer': 'GSS',
@@ -17,8 +21,28 @@ __metadata__ = {'name': 'InterproBot_Items',
                 }
 
 
+def iter_terms(interpro_coll, release_wdid, debug=False, after=None):
+    query = {'_id': {'$gt': after}} if after else {}
+    cursor = interpro_coll.find(query, no_cursor_timeout=True).sort('_id', 1)
+    for n, doc in tqdm(enumerate(cursor), total=cursor.count()):
+        doc['release_wdid'] = release_wdid
+        yield IPRTerm(**doc)
+        if debug and n>100:
+            break
+    cursor.close()
+
+
 def main(version_info, log_dir="./logs", run_id=None, mongo_uri="mongodb://localhost:27017",
-         mongo_db="wikidata_src", mongo_coll="interpro", debug=False):
+         mongo_db="wikidata_src", mongo_coll="interpro", debug=False, write_threads=None, stream_terms=False,
+         dry_run=False, resume=False, ship_log=False):
+    """
+    :param write_threads: number of concurrent writes. None: write one item at a time
+    :param stream_terms: read the terms from mongo again for the relationships, instead of keeping them in memory
+    :param dry_run: don't write anything, write a report of what would be changed next to the log. items that
+        don't exist yet can't get relationships
+    :param resume: continue the run that was interrupted, from its checkpoint in log_dir (same run_id and log)
+    :param ship_log: ship the log to the logging host while the bot runs (see contrib/log_shipper.py)
+    """
     # data sources
     db = MongoClient(mongo_uri)[mongo_db]
     interpro_coll = db[mongo_coll]
@@ -27,6 +51,10 @@ def main(version_info, log_dir="./logs", run_id=None, mongo_uri="mongodb://local
         run_id = datetime.now().strftime('%Y%m%d_%H:%M')
     if log_dir is None:
         log_dir = "./logs"
+    checkpoint = Checkpoint.open(os.path.join(log_dir, __metadata__['name'] + ".checkpoint.json"),
+                                 resume=resume and not dry_run, run_id=run_id,
+                                 key=version_info['version'])
+    run_id = checkpoint.run_id
     __metadata__['run_id'] = run_id
     __metadata__['timestamp'] = str(datetime.now())
 
@@ -42,30 +70,65 @@ def main(version_info, log_dir="./logs", run_id=None, mongo_uri="mongodb://local
                                   edition=version,
                                   pub_date=pub_date,
                                   archive_url="ftp://ftp.ebi.ac.uk/pub/databases/interpro/{}/".format(version))
-    release_wdid = release.get_or_create(login)
+    # a dry run only looks the release up, it doesn't create it
+    dry_run_report = DryRun() if dry_run else None
+    release_wdid = dry_run_report.release_qid(release) if dry_run else release.get_or_create(login)
     __metadata__['release'] = {
         'InterPro': {'release': version, '_id': 'InterPro', 'wdid': release_wdid, 'timestamp': str(pub_date)}}
 
     log_name = '{}-{}.log'.format(__metadata__['name'], __metadata__['run_id'])
+    checkpoint.log_name = log_name
     if PBB_Core.WDItemEngine.logger is not None:
         PBB_Core.WDItemEngine.logger.handles = []
     PBB_Core.WDItemEngine.setup_logging(log_dir=log_dir, log_name=log_name, header=json.dumps(__metadata__))
 
-    # create/update all interpro items
-    terms = []
-    cursor = interpro_coll.find(no_cursor_timeout=True)
-    for n, doc in tqdm(enumerate(cursor), total=cursor.count()):
-        doc['release_wdid'] = release_wdid
-        term = IPRTerm(**doc)
-        term.create_item(login)
-        terms.append(term)
-        if debug and n>100:
-            break
-    cursor.close()
+    with shipping(os.path.join(log_dir, log_name), ship=ship_log):
+        if dry_run:
+            executor = dry_run_report
+        else:
+            executor = WriteExecutor(write_threads) if write_threads else None
+            if executor:
+                checkpoint.before_save = executor.join
+        if dry_run:
+            # nothing is written, nothing to resume
+            checkpoint = None
+
+        try:
+            # create/update all interpro items
+            terms = []
+            if not (checkpoint and checkpoint.is_done('items')):
+                after = checkpoint.last_id('items') if checkpoint else None
+                for term in iter_terms(interpro_coll, release_wdid, debug=debug, after=after):
+                    term.create_item(login, executor=executor)
+                    if not stream_terms:
+                        terms.append(term)
+                    if checkpoint:
+                        checkpoint.update('items', term.id)
+                if executor:
+                    # all items need to exist before the relationships are made
+                    executor.join()
+                if checkpoint:
+                    checkpoint.done('items')
 
-    # create/update interpro item relationships
-    IPRTerm.refresh_ipr_wd()
-    for term in tqdm(terms):
-        term.create_relationships(login)
+            # create/update interpro item relationships. the qids of the items created above are already in
+            # IPRTerm.ipr2wd
+            if stream_terms or (checkpoint and checkpoint.resumed):
+                # when resuming, the terms of the items done before the interruption aren't in memory
+                after = checkpoint.last_id('relationships') if checkpoint else None
+                terms = iter_terms(interpro_coll, release_wdid, debug=debug, after=after)
+            else:
+                terms = tqdm(terms)
+            for term in terms:
+                term.create_relationships(login, executor=executor)
+                if checkpoint:
+                    checkpoint.update('relationships', term.id)
+        finally:
+            # the writes submitted before an error still finish, and the write threads stop
+            if executor:
+                executor.shutdown()
+        if dry_run:
+            executor.write_report(os.path.join(log_dir, log_name + ".dryrun.json"))
+        else:
+            checkpoint.remove()
 
     return os.path.join(log_dir, log_name)
\ No newline at end of file
@@ -1,6 +1,11 @@
 import json
+import multiprocessing
 import os
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import reduce
 
 from ProteinBoxBot_Core import PBB_Core, PBB_login, PBB_Helpers
 from dateutil.parser import parse as date_parse
@@ -9,6 +14,12 @@ from tqdm import tqdm
 
 from local import WDUSER, WDPASS
 from .IPRTerm import IPRTerm
+from .. import metrics
+from ..checkpoint import Checkpoint
+from ..dry_run import DryRun
+from ..interning import stated_in
+from ..log_shipper import shipping
+from ..wd_writer import WriteExecutor, try_write
 
 __metadata__ = {'name': 'InterproBot_Proteins',
                 'maintainer': 'GSS',
@@ -19,54 +30,225 @@ __metadata__ = {'name': 'InterproBot_Proteins',
 INTERPRO = "P2926"
 UNIPROT = "P352"
 
+# number of docs per page when joining by batches
+JOIN_BATCH_SIZE = 10000
+MERGE_FETCH_TIMED = 10000
+# default number of dry run processes. each one fetches the wikidata json of the items that need a write
+DRY_RUN_PROCESSES = 4
 
-def create_uniprot_relationships(login, release_wdid, collection, taxon=None):
-    # only do uniprot proteins that are already in wikidata
+
+def iter_docs_batched(collection, query, uniprot_ids, batch_size=JOIN_BATCH_SIZE, after=None):
+    """
+    Page through the collection in _id order, `batch_size` docs per _id range query, and keep the docs with `_id`
+    in uniprot_ids (a set or dict), starting after `after`. No cursor is kept open between pages, and the next page
+    is fetched while this one is processed. Stops after the largest id of uniprot_ids
+    """
+    if not uniprot_ids:
+        return
+    last_id = max(uniprot_ids)
+
+    fetch_time = metrics.histogram("mongo_fetch_seconds", join="batch")
+
+    def find(after):
+        page_query = dict(query, _id={'$gt': after, '$lte': last_id}) if after else dict(query, _id={'$lte': last_id})
+        with fetch_time.time():
+            return list(collection.find(page_query).sort('_id', 1).limit(batch_size))
+
+    with ThreadPoolExecutor(1) as executor:
+        page = executor.submit(find, after)
+        while page is not None:
+            docs = page.result()
+            page = executor.submit(find, docs[-1]['_id']) if len(docs) == batch_size else None
+            for doc in docs:
+                if doc['_id'] in uniprot_ids:
+                    yield doc
+
+
+def iter_docs_merged(collection, query, uniprot_ids):
+    """
+    Stream the whole collection in _id order and keep the docs with `_id` in uniprot_ids (a set or dict)
+    """
+    cursor = collection.find(query, no_cursor_timeout=True).sort('_id', 1)
+    fetch_time = metrics.histogram("mongo_fetch_seconds", join="merge")
+    # time spent waiting on the cursor, observed every MERGE_FETCH_TIMED docs
+    n = 0
+    elapsed = 0
+    try:
+        while True:
+            start = time.perf_counter()
+            doc = next(cursor, None)
+            elapsed += time.perf_counter() - start
+            n += 1
+            if n % MERGE_FETCH_TIMED == 0 or doc is None:
+                fetch_time.observe(elapsed)
+                elapsed = 0
+            if doc is None:
+                break
+            if doc['_id'] in uniprot_ids:
+                yield doc
+    finally:
+        cursor.close()
+
+
+def iter_uniprot_docs(collection, uniprot2wd, changed_in=None, join="batch", after=None):
+    """
+    Docs of the proteins in uniprot2wd, in _id order
+
+    :param join: "batch": pages of _id range queries, no cursor is kept open while the bot runs.
+        "merge": one pass over the collection with a single cursor, for when most of the collection is in
+        uniprot2wd (e.g. it was uploaded with an allowlist)
+    :param after: only the docs with an _id after this one (resuming from a checkpoint)
+    """
+    query = {'release': changed_in} if changed_in else {}
+    if join == "batch":
+        return iter_docs_batched(collection, query, uniprot2wd, after=after)
+    elif join == "merge":
+        if after:
+            query['_id'] = {'$gt': after}
+        return iter_docs_merged(collection, query, uniprot2wd)
+    raise ValueError("unknown join: {}".format(join))
+
+
+def get_uniprot2wd(taxon=None):
+    with metrics.timer("id_mapper_seconds", prop=UNIPROT):
+        if taxon:
+            return PBB_Helpers.id_mapper(UNIPROT, (("P703", taxon),))
+        return PBB_Helpers.id_mapper(UNIPROT)
+
+
+def fast_run_filter(taxon=None):
     if taxon:
-        uniprot2wd = PBB_Helpers.id_mapper(UNIPROT, (("P703", taxon),))
-        fast_run_base_filter = {UNIPROT: "", "P703": taxon}
-    else:
-        uniprot2wd = PBB_Helpers.id_mapper(UNIPROT)
-        fast_run_base_filter = {UNIPROT: ""}
-
-    cursor = collection.find({'_id': {'$in': list(uniprot2wd.keys())}}, no_cursor_timeout=True)
-    for doc in tqdm(cursor, total=cursor.count()):
+        return {UNIPROT: "", "P703": taxon}
+    return {UNIPROT: ""}
+
+
+def protein_item(doc, release_wdid, uniprot2wd, fast_run_base_filter):
+    uniprot_id = doc['_id']
+    statements = []
+    # uniprot ID. needed for PBB_core to find uniprot item
+    # statements.append(PBB_Core.WDExternalID(value=uniprot_id, prop_nr=UNIPROT))
+
+    ## References
+    # stated in Interpro version XX.X
+    ref_stated_in = stated_in(release_wdid)
+    ref_ipr = PBB_Core.WDString("http://www.ebi.ac.uk/interpro/protein/{}".format(uniprot_id), "P854",
+                                is_reference=True)
+    reference = [ref_stated_in, ref_ipr]
+
+    if doc['subclass']:
+        for f in doc['subclass']:
+            statements.append(PBB_Core.WDItemID(value=IPRTerm.ipr2wd[f], prop_nr='P279', references=[reference]))
+    if doc['has_part']:
+        for hp in doc['has_part']:
+            statements.append(PBB_Core.WDItemID(value=IPRTerm.ipr2wd[hp], prop_nr='P527', references=[reference]))
+
+    if uniprot_id not in uniprot2wd:
+        print("wdid_not_found " + uniprot_id + " " + uniprot2wd[uniprot_id])
+        PBB_Core.WDItemEngine.log("ERROR", PBB_Helpers.format_msg(uniprot_id, UNIPROT, None, "wdid_not_found"))
+
+    return PBB_Core.WDItemEngine(wd_item_id=uniprot2wd[uniprot_id], domain="proteins", data=statements,
+                                 fast_run=True, fast_run_base_filter=fast_run_base_filter,
+                                 append_value=["P279", "P527", "P361"])
+
+
+def create_uniprot_relationships(login, release_wdid, collection, taxon=None, changed_in=None, join="batch",
+                                 executor=None, uniprot2wd=None, shard=None, checkpoint=None):
+    """
+    :param changed_in: only do proteins that were added or changed in this interpro release
+        (interpro_protein uploaded in delta mode)
+    :param join: how docs are fetched from the collection, see iter_uniprot_docs
+    :param executor: a wd_writer.WriteExecutor to write the items with (or a dry_run.DryRun).
+        None: write one item at a time
+    :param uniprot2wd: get_uniprot2wd(taxon), if it was already queried
+    :param shard: (k, n): only do the k-th of n shards of the proteins
+    :param checkpoint: a checkpoint.Checkpoint to save the progress to, and resume from
+    """
+    # only do uniprot proteins that are already in wikidata
+    if uniprot2wd is None:
+        uniprot2wd = get_uniprot2wd(taxon)
+    if shard:
+        k, n = shard
+        uniprot2wd = {key: qid for key, qid in uniprot2wd.items() if zlib.crc32(key.encode()) % n == k}
+    fast_run_base_filter = fast_run_filter(taxon)
+
+    after = checkpoint.last_id('proteins') if checkpoint else None
+    fastrun_time = metrics.histogram("fastrun_diff_seconds", bot="interpro_proteins")
+    for doc in tqdm(iter_uniprot_docs(collection, uniprot2wd, changed_in=changed_in, join=join, after=after),
+                    total=len(uniprot2wd)):
         uniprot_id = doc['_id']
-        statements = []
-        # uniprot ID. needed for PBB_core to find uniprot item
-        # statements.append(PBB_Core.WDExternalID(value=uniprot_id, prop_nr=UNIPROT))
-
-        ## References
-        # stated in Interpro version XX.X
-        ref_stated_in = PBB_Core.WDItemID(release_wdid, 'P248', is_reference=True)
-        ref_ipr = PBB_Core.WDString("http://www.ebi.ac.uk/interpro/protein/{}".format(uniprot_id), "P854",
-                                    is_reference=True)
-        reference = [ref_stated_in, ref_ipr]
-
-        if doc['subclass']:
-            for f in doc['subclass']:
-                statements.append(PBB_Core.WDItemID(value=IPRTerm.ipr2wd[f], prop_nr='P279', references=[reference]))
-        if doc['has_part']:
-            for hp in doc['has_part']:
-                statements.append(PBB_Core.WDItemID(value=IPRTerm.ipr2wd[hp], prop_nr='P527', references=[reference]))
-
-        if uniprot_id not in uniprot2wd:
-            print("wdid_not_found " + uniprot_id + " " + uniprot2wd[uniprot_id])
-            PBB_Core.WDItemEngine.log("ERROR", PBB_Helpers.format_msg(uniprot_id, UNIPROT, None, "wdid_not_found"))
-
-        wd_item = PBB_Core.WDItemEngine(wd_item_id=uniprot2wd[uniprot_id], domain="proteins", data=statements,
-                                        fast_run=True, fast_run_base_filter=fast_run_base_filter,
-                                        append_value=["P279", "P527", "P361"])
+        with fastrun_time.time():
+            wd_item = protein_item(doc, release_wdid, uniprot2wd, fast_run_base_filter)
 
         if wd_item.create_new_item:
             raise ValueError("something bad happened")
-        PBB_Helpers.try_write(wd_item, uniprot_id, INTERPRO, login, edit_summary="add/update family and/or domains")
+        try_write(wd_item, uniprot_id, INTERPRO, login, executor=executor,
+                  edit_summary="add/update family and/or domains")
+        if checkpoint:
+            checkpoint.update('proteins', uniprot_id)
+    if checkpoint:
+        checkpoint.done('proteins')
+
+
+_worker_uniprot2wd = None
+
 
-    cursor.close()
+def _init_dry_run_worker(uniprot2wd):
+    global _worker_uniprot2wd
+    _worker_uniprot2wd = uniprot2wd
+
+
+def _dry_run_shard(task):
+    mongo_uri, mongo_db, mongo_coll, release_wdid, kwargs, shard = task
+    collection = MongoClient(mongo_uri)[mongo_db][mongo_coll]
+    dry_run = DryRun()
+    create_uniprot_relationships(None, release_wdid, collection, executor=dry_run, uniprot2wd=_worker_uniprot2wd,
+                                 shard=shard, **kwargs)
+    return dry_run
+
+
+def load_fast_run(release_wdid, uniprot2wd, taxon=None):
+    """
+    Load IPRTerm.ipr2wd and the fast run data of the proteins (all of the taxon, for P279 and P527) in this process,
+    by building one item
+    """
+    if not uniprot2wd or not IPRTerm.ipr2wd:
+        return
+    ipr_id = next(iter(IPRTerm.ipr2wd))
+    doc = {'_id': next(iter(uniprot2wd)), 'subclass': [ipr_id], 'has_part': [ipr_id]}
+    protein_item(doc, release_wdid, uniprot2wd, fast_run_filter(taxon))
+
+
+def dry_run_parallel(release_wdid, mongo_uri, mongo_db, mongo_coll, taxon=None, changed_in=None, join="batch",
+                     processes=DRY_RUN_PROCESSES):
+    """
+    create_uniprot_relationships without writing, the proteins split in shards over `processes` worker processes.
+    Returns the merged DryRun
+
+    The id mappings and the fast run data are loaded once, here, and the workers are forked from this process so
+    that they have them: they don't each query the sparql endpoint for all of it.
+    """
+    uniprot2wd = get_uniprot2wd(taxon)
+    kwargs = {'taxon': taxon, 'changed_in': changed_in, 'join': join}
+    _init_dry_run_worker(uniprot2wd)
+    if multiprocessing.current_process().daemon:
+        # daemonic processes can't have children
+        return _dry_run_shard((mongo_uri, mongo_db, mongo_coll, release_wdid, kwargs, None))
+    load_fast_run(release_wdid, uniprot2wd, taxon)
+    processes = min(processes or DRY_RUN_PROCESSES, os.cpu_count())
+    tasks = [(mongo_uri, mongo_db, mongo_coll, release_wdid, kwargs, (k, processes)) for k in range(processes)]
+    with multiprocessing.get_context("fork").Pool(processes) as pool:
+        return reduce(DryRun.merge, pool.imap_unordered(_dry_run_shard, tasks), DryRun())
 
 
 def main(version_info, log_dir="./logs", run_id=None, mongo_uri="mongodb://localhost:27017",
-         mongo_db="wikidata_src", mongo_coll="interpro_protein", taxon=None):
+         mongo_db="wikidata_src", mongo_coll="interpro_protein", taxon=None, changed_in=None,
+         join="batch", write_threads=None, dry_run=False, processes=None, resume=False, ship_log=False):
+    """
+    :param dry_run: don't write anything, write a report of what would be changed next to the log
+    :param processes: number of processes for the dry run (default: DRY_RUN_PROCESSES)
+    :param resume: continue the run that was interrupted, from its checkpoint in log_dir (same run_id and log)
+    :param ship_log: ship the log to the logging host while the bot runs (see contrib/log_shipper.py)
+    """
     # data sources
     db = MongoClient(mongo_uri)[mongo_db]
     collection = db[mongo_coll]
@@ -75,6 +257,12 @@ def main(version_info, log_dir="./logs", run_id=None, mongo_uri="mongodb://local
         run_id = datetime.now().strftime('%Y%m%d_%H:%M')
     if log_dir is None:
         log_dir = "./logs"
+    # one checkpoint per taxon, they can run concurrently
+    checkpoint_name = "{}-{}".format(__metadata__['name'], taxon) if taxon else __metadata__['name']
+    checkpoint = Checkpoint.open(os.path.join(log_dir, checkpoint_name + ".checkpoint.json"),
+                                 resume=resume and not dry_run, run_id=run_id,
+                                 key=version_info['version'])
+    run_id = checkpoint.run_id
     __metadata__['run_id'] = run_id
     __metadata__['timestamp'] = str(datetime.now())
 
@@ -90,15 +278,36 @@ def main(version_info, log_dir="./logs", run_id=None, mongo_uri="mongodb://local
                                   edition=version,
                                   pub_date=pub_date,
                                   archive_url="ftp://ftp.ebi.ac.uk/pub/databases/interpro/{}/".format(version))
-    release_wdid = release.get_or_create(login)
+    # a dry run only looks the release up, it doesn't create it
+    dry_run_report = DryRun() if dry_run else None
+    release_wdid = dry_run_report.release_qid(release) if dry_run else release.get_or_create(login)
     __metadata__['release'] = {
         'InterPro': {'release': version, '_id': 'InterPro', 'wdid': release_wdid, 'timestamp': str(pub_date)}}
 
     log_name = '{}-{}.log'.format(__metadata__['name'], __metadata__['run_id'])
+    checkpoint.log_name = log_name
     if PBB_Core.WDItemEngine.logger is not None:
         PBB_Core.WDItemEngine.logger.handles = []
     PBB_Core.WDItemEngine.setup_logging(log_dir=log_dir, log_name=log_name, header=json.dumps(__metadata__))
 
-    create_uniprot_relationships(login, release_wdid, collection, taxon=taxon)
+    with shipping(os.path.join(log_dir, log_name), ship=ship_log):
+        if dry_run:
+            report = dry_run_parallel(release_wdid, mongo_uri, mongo_db, mongo_coll, taxon=taxon,
+                                      changed_in=changed_in, join=join, processes=processes)
+            report = dry_run_report.merge(report)
+            report.write_report(os.path.join(log_dir, log_name + ".dryrun.json"))
+            return os.path.join(log_dir, log_name)
+
+        executor = WriteExecutor(write_threads) if write_threads else None
+        if executor:
+            checkpoint.before_save = executor.join
+        try:
+            create_uniprot_relationships(login, release_wdid, collection, taxon=taxon, changed_in=changed_in,
+                                         join=join, executor=executor, checkpoint=checkpoint)
+        finally:
+            # the writes submitted before an error still finish, and the write threads stop
+            if executor:
+                executor.shutdown()
+        checkpoint.remove()
 
     return os.path.join(log_dir, log_name)
@@ -1,2 +1,21 @@
-from .uploader import InterproUploader, InterproProteinUploader
-from .dumper import InterproDumper
\ No newline at end of file
+"""
+The uploaders and the dumper are imported on first access (the hub finds them with dir()), so that the parsers,
+e.g. contrib.interpro.parser, can be imported without biothings
+"""
+import importlib
+
+_CLASSES = {
+    'InterproUploader': '.uploader',
+    'InterproProteinUploader': '.uploader',
+    'InterproDumper': '.dumper',
+}
+
+
+def __getattr__(name):
+    if name in _CLASSES:
+        return getattr(importlib.import_module(_CLASSES[name], __name__), name)
+    raise AttributeError("module {} has no attribute {}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_CLASSES))
@@ -0,0 +1,94 @@
+"""
+UniProt allowlist for protein2ipr parsing
+
+ProteinBot only edits proteins that are already in wikidata, so there is no point parsing and uploading the other
+~50M proteins. An allowlist is checked on the raw uniprot id column, before any per-protein work.
+
+An allowlist file is either a (optionally gzipped) text file with one uniprot id per line, loaded into a set, or a
+pickled BloomFilter (".bloom"), which takes ~1.2 bytes per id at a 1% false positive rate. False positives only mean
+a few extra proteins get uploaded, ProteinBot skips them anyway.
+"""
+import gzip
+import hashlib
+import math
+import pickle
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        self.n_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.n_hashes = max(1, round(self.n_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.n_bits + 7) // 8)
+
+    def _positions(self, key):
+        # double hashing: position i = h1 + i * h2
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.n_bits for i in range(self.n_hashes))
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    @classmethod
+    def from_ids(cls, ids, error_rate=0.01):
+        ids = list(ids)
+        bloom = cls(len(ids), error_rate=error_rate)
+        for uniprot_id in ids:
+            bloom.add(uniprot_id)
+        return bloom
+
+
+def _open(file_path, mode):
+    return gzip.open(file_path, mode) if file_path.endswith(".gz") else open(file_path, mode)
+
+
+def read_ids(file_path):
+    with _open(file_path, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def load_allowlist(file_path):
+    """
+    Returns a container of uniprot ids (as bytes) to check protein2ipr lines against
+    """
+    if file_path.endswith(".bloom"):
+        with open(file_path, 'rb') as f:
+            return pickle.load(f)
+    return set(read_ids(file_path))
+
+
+def write_allowlist(ids, file_path, error_rate=0.01):
+    """
+    Write uniprot ids (str) to an allowlist file. A BloomFilter is written if file_path ends with ".bloom"
+    """
+    if file_path.endswith(".bloom"):
+        bloom = BloomFilter.from_ids((x.encode() for x in ids), error_rate=error_rate)
+        with open(file_path, 'wb') as f:
+            pickle.dump(bloom, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return
+    with _open(file_path, 'wt') as f:
+        for uniprot_id in sorted(ids):
+            f.write(uniprot_id + "\n")
+
+
+def dump_wikidata_uniprot(file_path, taxon=None, error_rate=0.01):
+    """
+    Write the uniprot ids that are in wikidata (optionally only the ones found in taxon `taxon`) to an allowlist
+    file. These are the proteins ProteinBot.create_uniprot_relationships works on
+    """
+    from ProteinBoxBot_Core import PBB_Helpers
+    if taxon:
+        uniprot2wd = PBB_Helpers.id_mapper("P352", (("P703", taxon),))
+    else:
+        uniprot2wd = PBB_Helpers.id_mapper("P352")
+    write_allowlist(uniprot2wd.keys(), file_path, error_rate=error_rate)
+    print("wrote {} uniprot ids to {}".format(len(uniprot2wd), file_path))
@@ -0,0 +1,81 @@
+"""
+On-disk cache of the parsed interpro.xml.gz
+
+interpro.xml.gz is needed by InterproUploader and InterproProteinUploader (to build the IprIndex). Its entries and
+dbinfo records are parsed once per distinct file content and pickled, every later consumer just loads the pickle.
+The release info alone is cheaper to get with parser.read_release_info, which only reads the top of the file.
+"""
+import hashlib
+import json
+import os
+import pickle
+import re
+
+from .parser import parse_interpro_xml, parse_release_info
+
+# bump when the output of parse_interpro_xml or parse_release_info changes
+CACHE_VERSION = 1
+HASH_BLOCK_SIZE = 1024 * 1024
+CACHE_NAME = re.compile(r'^interpro\.xml\.[0-9a-f]{40}\.v\d+\.pickle$')
+
+
+def file_digest(file_path):
+    """
+    sha1 of the content of `file_path`. Memoized in a sidecar file, keyed by the file's size and mtime
+    """
+    digest_path = file_path + ".sha1"
+    stat = os.stat(file_path)
+    if os.path.exists(digest_path):
+        with open(digest_path) as f:
+            d = json.load(f)
+        if (d['size'], d['mtime']) == (stat.st_size, stat.st_mtime):
+            return d['sha1']
+    h = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            h.update(block)
+    d = {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha1': h.hexdigest()}
+    tmp_path = "{}.{}.tmp".format(digest_path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(d, f)
+    os.replace(tmp_path, digest_path)
+    return d['sha1']
+
+
+def load_interpro(data_folder, cache_dir=None):
+    """
+    Returns {'entries': [...], 'dbinfo': [...]}, as parsed by parse_interpro_xml and parse_release_info
+
+    :param cache_dir: where to keep the cache. defaults to data_folder
+    """
+    file_path = os.path.join(data_folder, "interpro.xml.gz")
+    cache_dir = cache_dir or data_folder
+    cache_path = os.path.join(cache_dir, "interpro.xml.{}.v{}.pickle".format(file_digest(file_path), CACHE_VERSION))
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                return pickle.load(f)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, IndexError) as e:
+            print("corrupt interpro cache {}, parsing interpro.xml.gz again: {!r}".format(cache_path, e))
+
+    parsed = {'entries': list(parse_interpro_xml(data_folder)),
+              'dbinfo': list(parse_release_info(data_folder))}
+    os.makedirs(cache_dir, exist_ok=True)
+    # several uploaders may build the cache at the same time. each writes its own file, the last rename wins
+    tmp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(parsed, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+    # the caches of the other releases (or cache versions)
+    for name in os.listdir(cache_dir):
+        if CACHE_NAME.match(name) and name != os.path.basename(cache_path):
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except FileNotFoundError:
+                pass
+    return parsed
+
+
+def interpro_entries(data_folder, cache_dir=None):
+    return load_interpro(data_folder, cache_dir=cache_dir)['entries']
+
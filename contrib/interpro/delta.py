@@ -0,0 +1,135 @@
+"""
+Release-to-release delta of the interpro_protein collection
+
+Most proteins' subclass/has_part don't change from one InterPro release to the next. In delta mode the output of
+parse_protein_ipr is merge-joined against the previous release's output and only added, changed and removed proteins
+are sent to mongo. Added/changed docs are tagged with the release they changed in, so ProteinBot can process only
+those.
+
+The previous release's output is kept as a snapshot: a gzipped "uniprot_id<TAB>fingerprint" file in protein2ipr
+order, the fingerprint being a hash of the protein's subclass and has_part sets.
+"""
+import gzip
+import hashlib
+import os
+import pickle
+from collections import Counter
+
+SNAPSHOT_NAME = "interpro_protein.snapshot.gz"
+# docs per pickle in the spooled delta
+SPOOL_BATCH_SIZE = 10000
+
+
+def fingerprint(doc):
+    h = hashlib.blake2b(digest_size=8)
+    h.update(",".join(sorted(doc['subclass'])).encode())
+    h.update(b"|")
+    h.update(",".join(sorted(doc['has_part'])).encode())
+    return h.hexdigest()
+
+
+def snapshot_paths(data_folder):
+    """
+    Returns (previous, new) snapshot paths. The previous release's snapshot is kept in the source's root folder,
+    the new one is written in the release's data folder until it is committed
+    """
+    root = os.path.dirname(os.path.normpath(data_folder))
+    return os.path.join(root, SNAPSHOT_NAME), os.path.join(data_folder, SNAPSHOT_NAME)
+
+
+def commit_snapshot(data_folder):
+    previous_path, snapshot_path = snapshot_paths(data_folder)
+    os.replace(snapshot_path, previous_path)
+
+
+def iter_snapshot(file_path):
+    if not os.path.exists(file_path):
+        return
+    with gzip.open(file_path, 'rt') as f:
+        for line in f:
+            uniprot_id, fp = line.rstrip("\n").split("\t")
+            yield uniprot_id, fp
+
+
+def write_collection_snapshot(collection, file_path):
+    """
+    Build a snapshot from the docs in an interpro_protein collection (when there is no previous snapshot)
+    """
+    tmp_path = file_path + ".tmp"
+    with gzip.open(tmp_path, 'wt', compresslevel=1) as f:
+        for doc in collection.find({}, {'subclass': True, 'has_part': True}).sort('_id', 1):
+            f.write("{}\t{}\n".format(doc['_id'], fingerprint(doc)))
+    os.replace(tmp_path, file_path)
+
+
+def merge_join(docs, previous_path, out, release, counts):
+    """
+    The delta of protein_delta, as the docs are read. Writes the snapshot of `docs` to `out`
+    """
+    previous = iter_snapshot(previous_path)
+    prev = next(previous, None)
+    last_id = None
+    for doc in docs:
+        _id = doc['_id']
+        if last_id is not None and _id <= last_id:
+            raise ValueError("proteins are not sorted by id: {} after {}".format(_id, last_id))
+        last_id = _id
+        fp = fingerprint(doc)
+        out.write("{}\t{}\n".format(_id, fp))
+
+        while prev is not None and prev[0] < _id:
+            counts['removed'] += 1
+            yield {'_id': prev[0], 'status': 'removed', 'release': release}
+            prev = next(previous, None)
+        if prev is not None and prev[0] == _id:
+            status = 'changed' if prev[1] != fp else 'unchanged'
+            prev = next(previous, None)
+        else:
+            status = 'added'
+        counts[status] += 1
+        if status != 'unchanged':
+            doc['status'] = status
+            doc['release'] = release
+            yield doc
+
+    while prev is not None:
+        counts['removed'] += 1
+        yield {'_id': prev[0], 'status': 'removed', 'release': release}
+        prev = next(previous, None)
+
+
+def protein_delta(docs, previous_path, snapshot_path, release):
+    """
+    Compare `docs` (output of parse_protein_ipr, sorted by _id) with the snapshot at `previous_path`, and write
+    the snapshot of `docs` to `snapshot_path`.
+
+    Yields the added and changed docs, with 'status' ('added' or 'changed') and 'release' fields, and
+    {'_id': uniprot_id, 'status': 'removed', 'release': release} for proteins that are no longer there.
+    The delta is applied to the live collection as it is yielded: it is spooled to disk until all of `docs` were
+    read, so that unsorted docs (ValueError) leave the collection as it was
+    """
+    counts = Counter()
+    tmp_path = snapshot_path + ".tmp"
+    spool_path = snapshot_path + ".delta.tmp"
+    try:
+        with gzip.open(tmp_path, 'wt', compresslevel=1) as out, open(spool_path, 'wb') as spool:
+            batch = []
+            for doc in merge_join(docs, previous_path, out, release, counts):
+                batch.append(doc)
+                if len(batch) >= SPOOL_BATCH_SIZE:
+                    pickle.dump(batch, spool, protocol=pickle.HIGHEST_PROTOCOL)
+                    batch = []
+            pickle.dump(batch, spool, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, snapshot_path)
+        print("interpro_protein delta for release {}: {}".format(release, dict(counts)))
+        with open(spool_path, 'rb') as spool:
+            while True:
+                try:
+                    batch = pickle.load(spool)
+                except EOFError:
+                    break
+                yield from batch
+    finally:
+        for file_path in (tmp_path, spool_path):
+            if os.path.exists(file_path):
+                os.remove(file_path)
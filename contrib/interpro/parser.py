@@ -2,9 +2,14 @@
 This should parse a raw file into json/mongo
 """
 import gzip
+import importlib.util
+import json
+import multiprocessing
 import os
-import subprocess
-from itertools import groupby
+import pickle
+import shutil
+import tempfile
+from array import array
 
 import lxml.etree as et
 from dateutil import parser as dup
@@ -12,79 +17,425 @@ from dateutil import parser as dup
 
 from tqdm import tqdm
 
+from .. import metrics
+
 #DATA_DIR = "/home/gstupp/projects/wikidatabots/interproscan/data"
 
 
 def parse_release_info(data_folder):
+    """
+    Yields the dbinfo records from the release block at the top of interpro.xml.gz. Reading (and decompressing)
+    stops as soon as the release block is closed, so this doesn't depend on the size of the file.
+    """
     file_path = os.path.join(data_folder, "interpro.xml.gz")
-    f = gzip.GzipFile(file_path)
-    context = iter(et.iterparse(f, events=("start", "end")))
-    event, root = next(context)
+    with gzip.GzipFile(file_path) as f:
+        for event, db_item in et.iterparse(f, events=("end",)):
+            if db_item.tag == "dbinfo":
+                db_item.attrib['_id'] = db_item.attrib['dbname']
+                yield dict(db_item.attrib)
+            elif db_item.tag == "release":
+                break
+
+
+def read_release_info(data_folder, dbname="INTERPRO"):
+    """
+    dbinfo record of `dbname`. looks like:
+    { "_id" : "INTERPRO", "dbname" : "INTERPRO", "file_date" : "03-NOV-16", "version" : "60.0", "entry_count" : "29700" }
+    """
+    for db_item in parse_release_info(data_folder):
+        if db_item['_id'] == dbname:
+            return db_item
+    raise ValueError("no dbinfo for {} in {}".format(dbname, data_folder))
+
 
-    for event, db_item in context:
-        if event == "end" and db_item.tag == "dbinfo":
-            db_item.attrib['_id'] = db_item.attrib['dbname']
-            yield dict(db_item.attrib)
-        root.clear()
+# child elements of an <interpro> entry that hold a list of <rel_ref ipr_ref="..."/>, and the key they are stored as
+REL_LISTS = {'parent_list': 'parent', 'child_list': 'children', 'contains': 'contains', 'found_in': 'found_in'}
 
 
 def parse_interpro_xml(data_folder):
+    """
+    Yields one dict per <interpro> entry. Only end events of <interpro> elements are reported by the parser, and
+    each entry is freed (along with its already processed siblings) once it has been read, so memory use doesn't
+    grow with the file.
+    """
     file_path = os.path.join(data_folder, "interpro.xml.gz")
-    f = gzip.GzipFile(file_path)
-    context = iter(et.iterparse(f, events=("start", "end")))
-    event, root = next(context)
-
-    for event, itemxml in context:
-        if event == "end" and itemxml.tag == "interpro":
-            item = dict(name=itemxml.find('name').text, **itemxml.attrib)
+    with gzip.GzipFile(file_path) as f:
+        for event, itemxml in et.iterparse(f, events=("end",), tag="interpro"):
+            name = None
+            rels = {}
+            # single pass over the children, keeping the first element of each tag (same as find())
+            for child in itemxml:
+                tag = child.tag
+                if tag == 'name':
+                    if name is None:
+                        name = child
+                elif tag in REL_LISTS and tag not in rels:
+                    rels[tag] = [x.attrib['ipr_ref'] for x in child]
+            item = dict(name=name.text, **itemxml.attrib)
             item['_id'] = item['id']
             item['protein_count'] = int(item['protein_count'])
-            parents = [x.attrib['ipr_ref'] for x in itemxml.find("parent_list").getchildren()] if itemxml.find(
-                "parent_list") is not None else None
-            children = [x.attrib['ipr_ref'] for x in itemxml.find("child_list").getchildren()] if itemxml.find(
-                "child_list") is not None else None
-            contains = [x.attrib['ipr_ref'] for x in itemxml.find("contains").getchildren()] if itemxml.find(
-                "contains") is not None else None
-            found_in = [x.attrib['ipr_ref'] for x in itemxml.find("found_in").getchildren()] if itemxml.find(
-                "found_in") is not None else None
+            parents = rels.get('parent_list')
             if parents:
                 assert len(parents) == 1
                 item['parent'] = parents[0]
-            item['children'] = children
-            item['contains'] = contains
-            item['found_in'] = found_in
+            item['children'] = rels.get('child_list')
+            item['contains'] = rels.get('contains')
+            item['found_in'] = rels.get('found_in')
             yield item
-        root.clear()
+            itemxml.clear()
+            while itemxml.getprevious() is not None:
+                del itemxml.getparent()[0]
+
+
+#### protein2ipr.dat.gz reader
+# The file has several hundred million lines. Instead of piping it through zcat and decoding/splitting every line in
+# python, it is decompressed in process in large blocks, the blocks are split into lines in bulk, and only the
+# uniprot and interpro id columns are looked at (the remaining columns are never split or decoded).
+
+BLOCK_SIZE = 1024 * 1024
+
+
+def open_gzip(file_path, threads=1):
+    """
+    Open a gzip file for binary reading. Uses python-isal's threaded reader (decompression runs in a background
+    thread, overlapping with parsing) if it is installed, and the standard library otherwise.
+    """
+    try:
+        from isal import igzip_threaded
+    except ImportError:
+        return gzip.open(file_path, 'rb')
+    return igzip_threaded.open(file_path, 'rb', threads=threads)
+
+
+def iter_line_blocks(f, limit=None, block_size=BLOCK_SIZE):
+    """
+    Read `f` (at most `limit` bytes) in blocks and yield lists of complete lines, without their newline
+    """
+    rest = b''
+    while limit is None or limit > 0:
+        block = f.read(block_size if limit is None else min(block_size, limit))
+        if not block:
+            break
+        if limit is not None:
+            limit -= len(block)
+        block = rest + block
+        end = block.rfind(b'\n')
+        if end == -1:
+            rest = block
+            continue
+        rest = block[end + 1:]
+        yield block[:end].split(b'\n')
+    if rest:
+        yield [rest]
+
+
+def iter_proteins(line_blocks, allowlist=None):
+    """
+    Group consecutive lines by protein. Yields (uniprot_id, [interpro_id, ...]), with the interpro ids as bytes
+
+    :param allowlist: container of uniprot ids (bytes). Proteins not in it are skipped
+    """
+    key = None
+    keep = False
+    interpro_ids = []
+    for lines in line_blocks:
+        for line in lines:
+            uniprot_id, interpro_id, _ = line.split(b'\t', 2)
+            if uniprot_id != key:
+                if interpro_ids:
+                    yield key.decode(), interpro_ids
+                key = uniprot_id
+                keep = allowlist is None or uniprot_id in allowlist
+                interpro_ids = []
+            if keep:
+                interpro_ids.append(interpro_id)
+    if interpro_ids:
+        yield key.decode(), interpro_ids
+
+
+class IprIndex:
+    """
+    InterPro entries (as returned by parse_interpro_xml) compiled into integer ids, so that the per-protein loop
+    only does dict lookups on the raw interpro id column and integer set arithmetic.
+
+    ids[n]: interpro id of entry n
+    code: {interpro id (bytes): n}
+    is_family[n]: 1 if entry n is a Family
+    parent[n]: integer id of the parent of entry n, or -1
+    """
+
+    def __init__(self, items):
+        if isinstance(items, dict):
+            items = items.values()
+        self.ids = []
+        self.code = {}
+        self.is_family = bytearray()
+        parents = []
+        for item in items:
+            self.code[item['id'].encode()] = len(self.ids)
+            self.ids.append(item['id'])
+            self.is_family.append(item['type'] == "Family")
+            parents.append(item.get('parent'))
+        self.parent = array('i', (self.code.get(x.encode(), -1) if x else -1 for x in parents))
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def protein_doc(key, interpro_ids, ipr):
+    # group list of domain in a protein by ipr
+    code = ipr.code
+    prot_items = {code[x] for x in interpro_ids}
+    # Of all families, which one is the most precise? (remove families that are parents of any other family in this list)
+    is_family = ipr.is_family
+    families = {x for x in prot_items if is_family[x]}
+    parent = ipr.parent
+    parents = {parent[x] for x in families}
+    # A protein be in multiple families. ex: http://www.ebi.ac.uk/interpro/protein/A0A0B5J454
+    ids = ipr.ids
+    return {'_id': key, 'subclass': [ids[x] for x in families - parents],
+            'has_part': [ids[x] for x in prot_items - families]}
+
+
+# the parsed proteins counter is updated every this many proteins
+PARSED_COUNT_EVERY = 100000
 
 
-def parse_protein_ipr(data_folder, ipr_items, debug=False):
+def parse_protein_ipr(data_folder, ipr_items, debug=False, allowlist=None):
+    """
+    :param ipr_items: an IprIndex, or the interpro entries (iterable or dict keyed by id) to build it from
+    :param allowlist: only parse these proteins. container of uniprot ids (bytes), see allowlist.load_allowlist
+    """
     file_path = os.path.join(data_folder, "protein2ipr.dat.gz")
     print(file_path)
-    p = subprocess.Popen(["zcat", file_path], stdout=subprocess.PIPE).stdout
-    d = {}
-    p2ipr = map(lambda x: x.decode('utf-8').rstrip().split('\t'), p)
+    ipr = ipr_items if isinstance(ipr_items, IprIndex) else IprIndex(ipr_items)
+    parsed = metrics.counter("interpro_proteins_parsed_total")
     n = 0
-    for key, lines in tqdm(groupby(p2ipr, key=lambda x: x[0]), total=51536456, miniters=1000000):
-        # the total is just for a time estimate. Nothing bad happens if the total is wrong
-        n += 1
-        if debug and n > 1000:
-            break
-        protein = []
-        for line in lines:
-            uniprot_id, interpro_id, name, ext_id, start, stop = line
-            protein.append({'uniprot_id': uniprot_id, 'interpro_id': interpro_id, 'name': name,
-                            'ext_id': ext_id, 'start': start, 'stop': stop})
-
-        # group list of domain in a protein by ipr
-        prot_items = [ipr_items[x] for x in set(x['interpro_id'] for x in protein)]
-        # Of all families, which one is the most precise? (remove families that are parents of any other family in this list)
-        families = [x for x in prot_items if x['type'] == "Family"]
-        families_id = set(x['id'] for x in families)
-        parents = set(family['parent'] for family in families if 'parent' in family)
-        # A protein be in multiple families. ex: http://www.ebi.ac.uk/interpro/protein/A0A0B5J454
-        specific_families = families_id - parents
-        has_part = [x['id'] for x in prot_items if x['type'] != "Family"]
-        yield {'_id': key, 'subclass': list(specific_families), 'has_part': list(has_part)}
+    with open_gzip(file_path) as f:
+        proteins = iter_proteins(iter_line_blocks(f), allowlist=allowlist)
+        for key, interpro_ids in tqdm(proteins, total=51536456 if allowlist is None else None, miniters=1000000):
+            # the total is just for a time estimate. Nothing bad happens if the total is wrong
+            n += 1
+            if n % PARSED_COUNT_EVERY == 0:
+                parsed.inc(PARSED_COUNT_EVERY)
+            if debug and n > 1000:
+                break
+            yield protein_doc(key, interpro_ids, ipr)
+    parsed.inc(n % PARSED_COUNT_EVERY)
+
+
+#### parallel parsing of protein2ipr.dat.gz
+# protein2ipr.dat.gz is sorted by uniprot id. A sidecar index (protein2ipr.dat.gz.idx) records uncompressed
+# (byte offset, line number) pairs that fall on protein boundaries, roughly every INDEX_SPACING bytes. It is built
+# with a single decompression pass and reused as long as the data file doesn't change. The offsets are grouped
+# into shards, each worker parses its shard and writes its docs to a temporary file. Shards are read back in file
+# order, so the output order is the same as parse_protein_ipr.
+# gzip can only be read from the start. With python indexed_gzip installed, the index pass also saves seek points
+# (protein2ipr.dat.gz.gzidx: the decompressor state every SEEK_POINT_SPACING bytes, as in zlib's zran.c), and each
+# worker starts decompressing at the seek point before its shard, so the file is decompressed about once in total.
+# Without it, each worker would decompress (and throw away) everything before its shard: the last shard alone costs
+# a full pass, and the more shards the worse this gets. parse_protein_ipr_parallel parses sequentially then.
+
+INDEX_SPACING = 64 * 1024 * 1024
+SEEK_POINT_SPACING = 64 * 1024 * 1024
+SHARDS_PER_PROCESS = 2
+SHARD_BATCH_SIZE = 10000
+
+_worker_ipr = None
+_worker_allowlist = None
+
+
+def open_indexed_gzip(file_path, index_path=None):
+    """
+    Open a gzip file with indexed_gzip, which can seek to any uncompressed offset. Its seek points are read from
+    index_path if given, else they're built while reading. None if indexed_gzip isn't installed
+    """
+    try:
+        import indexed_gzip
+    except ImportError:
+        return None
+    return indexed_gzip.IndexedGzipFile(file_path, spacing=SEEK_POINT_SPACING, index_file=index_path)
+
+
+def build_protein_index(file_path, spacing=INDEX_SPACING, seek_index_path=None):
+    """
+    Scan a protein2ipr file and return a list of [byte_offset, line_number] pairs, each one pointing at the first
+    line of a protein, spaced by at least `spacing` bytes. The first pair is [0, 0] and the last one is the end of
+    the file, so consecutive pairs delimit shards that never split a protein.
+
+    :param seek_index_path: also save indexed_gzip's seek points there. Needs indexed_gzip
+    """
+    spacing = max(1, spacing)
+    offsets = [[0, 0]]
+    target = spacing
+    offset = 0  # uncompressed offset of the start of buf
+    line_no = 0  # line number of the start of buf
+    prev_key = None  # uniprot id of the last complete line before buf
+    buf = b''
+    with (open_indexed_gzip(file_path) if seek_index_path else open_gzip(file_path)) as f:
+        while True:
+            block = f.read(BLOCK_SIZE)
+            buf += block
+            # only look at complete lines, unless we are at the end of the file
+            end = len(buf) if not block else buf.rfind(b'\n') + 1
+            while target < offset + end:
+                # first line starting at or after the target. the target is always past the last recorded offset
+                pos = target - offset
+                if pos:
+                    pos = buf.find(b'\n', pos - 1, end) + 1 or end
+                if pos == end:
+                    target = offset + end
+                    break
+                # then the first of these lines that starts a new protein
+                key = prev_key
+                if pos:
+                    line_start = buf.rfind(b'\n', 0, pos - 1) + 1
+                    key = buf[line_start:buf.index(b'\t', line_start)]
+                while pos < end and buf[pos:buf.index(b'\t', pos)] == key:
+                    pos = buf.find(b'\n', pos, end) + 1 or end
+                if pos == end:
+                    # the protein continues into the next block
+                    target = offset + end
+                    break
+                if offset + pos > offsets[-1][0]:
+                    offsets.append([offset + pos, line_no + buf.count(b'\n', 0, pos)])
+                target = offset + pos + spacing
+            if not block:
+                break
+            if end:
+                line_start = buf.rfind(b'\n', 0, end - 1) + 1
+                prev_key = buf[line_start:buf.index(b'\t', line_start)]
+            line_no += buf.count(b'\n', 0, end)
+            offset += end
+            buf = buf[end:]
+        if seek_index_path:
+            f.export_index(seek_index_path)
+    if buf:
+        # last line has no trailing newline
+        offset += len(buf)
+        line_no += 1
+    if offsets[-1][0] != offset:
+        offsets.append([offset, line_no])
+    return offsets
+
+
+def load_protein_index(file_path, spacing=INDEX_SPACING):
+    """
+    Load the sidecar index of `file_path`, (re)building it if it is missing or stale. Returns the offsets, and the
+    path of the seek points (None without indexed_gzip)
+    """
+    index_path = file_path + ".idx"
+    seek_index_path = file_path + ".gzidx" if importlib.util.find_spec("indexed_gzip") else None
+    stat = os.stat(file_path)
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+        if (index['size'], index['mtime'], index['spacing']) == (stat.st_size, stat.st_mtime, spacing) and \
+                (seek_index_path is None or index.get('seek_points') and os.path.exists(seek_index_path)):
+            return index['offsets'], seek_index_path
+    offsets = build_protein_index(file_path, spacing=spacing, seek_index_path=seek_index_path)
+    index = {'size': stat.st_size, 'mtime': stat.st_mtime, 'spacing': spacing, 'offsets': offsets,
+             'seek_points': seek_index_path is not None}
+    with open(index_path + ".tmp", 'w') as f:
+        json.dump(index, f)
+    os.replace(index_path + ".tmp", index_path)
+    return offsets, seek_index_path
+
+
+def split_shards(offsets, n_shards):
+    """
+    Group consecutive index offsets into at most `n_shards` (start, end) byte ranges of similar size
+    """
+    n_shards = max(1, min(n_shards, len(offsets) - 1))
+    size = offsets[-1][0]
+    bounds = [0]
+    for n in range(1, n_shards):
+        target = size * n // n_shards
+        bound = min((x[0] for x in offsets if x[0] >= target), default=size)
+        if bound > bounds[-1]:
+            bounds.append(bound)
+    if size > bounds[-1]:
+        bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def _init_worker(ipr, allowlist=None):
+    global _worker_ipr, _worker_allowlist
+    _worker_ipr = ipr
+    _worker_allowlist = allowlist
+
+
+def _parse_shard(task):
+    file_path, seek_index_path, start, end, out_path = task
+    batch = []
+    n = 0
+    with (open_indexed_gzip(file_path, seek_index_path) if seek_index_path else open_gzip(file_path)) as f, \
+            open(out_path, 'wb') as out:
+        if seek_index_path:
+            f.seek(start)
+        else:
+            remaining = start
+            while remaining:
+                chunk = f.read(min(remaining, BLOCK_SIZE))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+        for key, interpro_ids in iter_proteins(iter_line_blocks(f, limit=end - start), allowlist=_worker_allowlist):
+            batch.append(protein_doc(key, interpro_ids, _worker_ipr))
+            if len(batch) >= SHARD_BATCH_SIZE:
+                pickle.dump(batch, out, protocol=pickle.HIGHEST_PROTOCOL)
+                n += len(batch)
+                batch = []
+        if batch:
+            pickle.dump(batch, out, protocol=pickle.HIGHEST_PROTOCOL)
+            n += len(batch)
+    return out_path, n
+
+
+def _read_shard(out_path):
+    with open(out_path, 'rb') as f:
+        while True:
+            try:
+                batch = pickle.load(f)
+            except EOFError:
+                break
+            for doc in batch:
+                yield doc
+
+
+def parse_protein_ipr_parallel(data_folder, ipr_items, processes=None, spacing=INDEX_SPACING, allowlist=None):
+    """
+    Same output (and order) as parse_protein_ipr, but the file is split into shards that are parsed by a pool
+    of `processes` workers (default: one per cpu). Sequential without indexed_gzip
+    """
+    if multiprocessing.current_process().daemon:
+        # daemonic processes can't have children
+        print("can't start workers from a daemonic process, parsing sequentially")
+        yield from parse_protein_ipr(data_folder, ipr_items, allowlist=allowlist)
+        return
+    if not importlib.util.find_spec("indexed_gzip"):
+        # without seek points the shards cost a quadratic amount of decompression
+        print("indexed_gzip isn't installed, parsing sequentially")
+        yield from parse_protein_ipr(data_folder, ipr_items, allowlist=allowlist)
+        return
+    file_path = os.path.join(data_folder, "protein2ipr.dat.gz")
+    print(file_path)
+    ipr = ipr_items if isinstance(ipr_items, IprIndex) else IprIndex(ipr_items)
+    processes = processes or os.cpu_count()
+    offsets, seek_index_path = load_protein_index(file_path, spacing=spacing)
+    shards = split_shards(offsets, processes * SHARDS_PER_PROCESS)
+    tmp_dir = tempfile.mkdtemp(prefix="protein2ipr_", dir=data_folder)
+    tasks = [(file_path, seek_index_path, start, end, os.path.join(tmp_dir, "shard_{:05d}.pickle".format(n)))
+             for n, (start, end) in enumerate(shards)]
+    try:
+        with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(ipr, allowlist)) as pool:
+            parsed = metrics.counter("interpro_proteins_parsed_total")
+            for out_path, n in tqdm(pool.imap(_parse_shard, tasks), total=len(tasks)):
+                parsed.inc(n)
+                yield from _read_shard(out_path)
+                os.remove(out_path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
 
 
 """
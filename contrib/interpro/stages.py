@@ -0,0 +1,92 @@
+"""
+Post-upload stages of interpro (see contrib/pipeline.py):
+
+    interpro_uploaded -> items_bot -> proteins_<taxon>, one per taxon in config.INTERPRO_PROTEIN_TAXA, concurrently
+                             |                 |
+                             v                 v
+                       ship_items_log    ship_proteins_<taxon>_log
+
+interpro_uploaded is a Wait stage, checked on every poll of the hub's PipelineManager.
+"""
+from datetime import datetime
+from functools import partial
+
+import config
+
+from .. import log_shipper, metrics
+from ..pipeline import Pipeline, Stage, Wait
+
+# scheduler resource class the stages run in (see HUB_RESOURCE_CLASSES in config.py)
+RESOURCE_CLASS = "network"
+# how long to wait for the interpro items upload
+UPLOAD_TIMEOUT = 6 * 3600
+
+
+def setup():
+    # stages run in the hub's worker processes
+    metrics.start_export()
+    if config.WD_SNAPSHOT:
+        from ..wd_snapshot import install_configured
+        install_configured(offline=config.WD_DRY_RUN)
+
+
+def interpro_uploaded(context):
+    """
+    The items bot reads the interpro collection, InterproUploader can still be uploading it. None while it is, or
+    while the release in src_dump isn't the one of this run (its status is the previous release's)
+    """
+    from biothings.utils.mongo import get_src_dump
+    doc = get_src_dump().find_one({'_id': 'interpro'}) or {}
+    job = doc.get('upload', {}).get('jobs', {}).get('interpro', {})
+    release = job.get('release') or doc.get('release')
+    if str(release) != str(context['release_info']['version']):
+        return None
+    status = job.get('status')
+    if status == "failed":
+        raise ValueError("interpro upload failed")
+    return status if status == "success" else None
+
+
+def run_items_bot(context):
+    from . import ItemsBot
+    setup()
+    return ItemsBot.main(context['release_info'], mongo_coll="interpro", debug=context['debug'],
+                         write_threads=config.WD_WRITE_THREADS, stream_terms=config.INTERPRO_STREAM_TERMS,
+                         dry_run=config.WD_DRY_RUN, resume=config.WD_RESUME, ship_log=config.LOG_SHIP_FOLLOW)
+
+
+def run_protein_bot(context, taxon):
+    from . import ProteinBot
+    setup()
+    release_info = context['release_info']
+    changed_in = release_info['version'] if config.INTERPRO_PROTEIN_DELTA else None
+    run_id = "{}_{}".format(datetime.now().strftime('%Y%m%d_%H:%M'), taxon)
+    return ProteinBot.main(release_info, run_id=run_id, mongo_coll="interpro_protein", taxon=taxon,
+                           changed_in=changed_in, join=config.INTERPRO_PROTEIN_JOIN,
+                           write_threads=config.WD_WRITE_THREADS, dry_run=config.WD_DRY_RUN,
+                           resume=config.WD_RESUME, ship_log=config.LOG_SHIP_FOLLOW)
+
+
+def ship_log(context, stage):
+    # whatever the bot didn't already ship while it ran
+    print("shipping log: {}".format(context[stage]))
+    log_shipper.ship_log(context[stage])
+
+
+def post_upload(params):
+    """
+    params: {'release_info': read_release_info(data_folder), 'debug': bool, 'wait_for_upload': bool}
+    """
+    stages = [Stage("items_bot", run_items_bot, resource_class=RESOURCE_CLASS),
+              Stage("ship_items_log", partial(ship_log, stage="items_bot"), after=["items_bot"],
+                    resource_class=RESOURCE_CLASS)]
+    if params.get('wait_for_upload', True):
+        stages.append(Wait("interpro_uploaded", interpro_uploaded, timeout=UPLOAD_TIMEOUT))
+        stages[0].after.append("interpro_uploaded")
+    for taxon in config.INTERPRO_PROTEIN_TAXA:
+        name = "proteins_{}".format(taxon)
+        stages.append(Stage(name, partial(run_protein_bot, taxon=taxon), after=["items_bot"],
+                            resource_class=RESOURCE_CLASS))
+        stages.append(Stage("ship_{}_log".format(name), partial(ship_log, stage=name), after=[name],
+                            resource_class=RESOURCE_CLASS))
+    return Pipeline("interpro", stages, params)
@@ -0,0 +1,189 @@
+"""
+Columnar on-disk store of the protein -> InterPro assignments (the interpro_protein docs)
+
+A store is a directory of flat, memory-mapped columns, so opening one costs nothing and lookups don't need mongo:
+    meta.json                      format version, byte order, number of proteins, interpro ids
+    accessions.bin                 uniprot ids, concatenated, sorted
+    accessions.idx                 uint64 offsets into accessions.bin (n + 1)
+    subclass.bin / has_part.bin    int32 interpro codes (index into meta['ipr_ids']), grouped by protein
+    subclass.idx / has_part.idx    uint64 offsets into the .bin (n + 1)
+
+    with ProteinStore(path) as store:
+        store["P12345"]                   # {'_id': 'P12345', 'subclass': [...], 'has_part': [...]}
+        store.lookup(["P12345", "Q9XYZ1"])  # batch lookup
+        for doc in store: ...             # full scan, in uniprot id order
+"""
+import bisect
+import json
+import mmap
+import os
+import shutil
+import sys
+from array import array
+
+STORE_VERSION = 1
+FLUSH_SIZE = 1024 * 1024
+COLUMNS = ('subclass', 'has_part')
+
+
+class _Column:
+    """
+    Appends values to a .bin/.idx pair of files. offsets are written as the values come in
+    """
+
+    def __init__(self, path, name, typecode):
+        self.bin = open(os.path.join(path, name + ".bin"), 'wb')
+        self.idx = open(os.path.join(path, name + ".idx"), 'wb')
+        self.values = array(typecode) if typecode else bytearray()
+        self.offsets = array('Q', [0])
+        self.size = 0
+
+    def append(self, values):
+        self.values.extend(values)
+        self.size += len(values)
+        self.offsets.append(self.size)
+        if len(self.offsets) >= FLUSH_SIZE:
+            self.flush()
+
+    def flush(self):
+        self.bin.write(self.values)
+        self.idx.write(self.offsets)
+        del self.values[:]
+        del self.offsets[:]
+
+    def close(self):
+        self.flush()
+        self.bin.close()
+        self.idx.close()
+
+
+def write_protein_store(docs, path, ipr):
+    """
+    Write interpro_protein docs (sorted by _id, as output by parse_protein_ipr) to a store at `path`, yielding
+    the docs as they go by, so it can be chained with the upload. The store is only moved to `path` once all docs
+    have been written.
+
+    :param ipr: the parser.IprIndex the docs were made with
+    """
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    accessions = _Column(tmp_path, "accessions", None)
+    columns = [_Column(tmp_path, name, 'i') for name in COLUMNS]
+    code = ipr.code
+    n = 0
+    last_id = None
+    for doc in docs:
+        uniprot_id = doc['_id'].encode()
+        if last_id is not None and uniprot_id <= last_id:
+            raise ValueError("proteins are not sorted by id: {} after {}".format(doc['_id'], last_id.decode()))
+        last_id = uniprot_id
+        accessions.append(uniprot_id)
+        for column, name in zip(columns, COLUMNS):
+            column.append([code[x.encode()] for x in doc[name]])
+        n += 1
+        yield doc
+    for column in [accessions] + columns:
+        column.close()
+    with open(os.path.join(tmp_path, "meta.json"), 'w') as f:
+        json.dump({'version': STORE_VERSION, 'byteorder': sys.byteorder, 'n': n, 'ipr_ids': ipr.ids}, f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    print("wrote {} proteins to {}".format(n, path))
+
+
+def _map(file_path, fmt=None):
+    with open(file_path, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            # empty files can't be mapped
+            return memoryview(array(fmt) if fmt else b'')
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(m)
+    return view.cast(fmt) if fmt else view
+
+
+class _Accessions:
+    # sequence of the sorted uniprot ids, for bisect
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes()
+
+
+class ProteinStore:
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta['version'] != STORE_VERSION or meta['byteorder'] != sys.byteorder:
+            raise ValueError("can't read protein store {} (version {}, {} endian)".format(
+                path, meta['version'], meta['byteorder']))
+        self.ipr_ids = meta['ipr_ids']
+        self.accessions = _Accessions(_map(os.path.join(path, "accessions.bin")),
+                                      _map(os.path.join(path, "accessions.idx"), 'Q'))
+        self.columns = [(name, _map(os.path.join(path, name + ".bin"), 'i'),
+                         _map(os.path.join(path, name + ".idx"), 'Q')) for name in COLUMNS]
+
+    def __len__(self):
+        return len(self.accessions)
+
+    def doc(self, i):
+        doc = {'_id': self.accessions[i].decode()}
+        ids = self.ipr_ids
+        for name, values, offsets in self.columns:
+            doc[name] = [ids[x] for x in values[offsets[i]:offsets[i + 1]]]
+        return doc
+
+    def find(self, uniprot_id, lo=0):
+        """
+        Index of `uniprot_id` in the store, or -1. binary search
+        """
+        key = uniprot_id.encode()
+        i = bisect.bisect_left(self.accessions, key, lo)
+        return i if i < len(self.accessions) and self.accessions[i] == key else -1
+
+    def __contains__(self, uniprot_id):
+        return self.find(uniprot_id) >= 0
+
+    def __getitem__(self, uniprot_id):
+        i = self.find(uniprot_id)
+        if i < 0:
+            raise KeyError(uniprot_id)
+        return self.doc(i)
+
+    def get(self, uniprot_id, default=None):
+        i = self.find(uniprot_id)
+        return self.doc(i) if i >= 0 else default
+
+    def lookup(self, uniprot_ids):
+        """
+        Returns {uniprot_id: doc} for the ids that are in the store. The ids are looked up in sorted order, each
+        search starting where the previous one stopped
+        """
+        docs = {}
+        lo = 0
+        for uniprot_id in sorted(set(uniprot_ids)):
+            i = self.find(uniprot_id, lo)
+            if i >= 0:
+                docs[uniprot_id] = self.doc(i)
+                lo = i + 1
+        return docs
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.doc(i)
+
+    def close(self):
+        # the mmaps are closed once the views on them are garbage collected
+        self.accessions = _Accessions(memoryview(b''), memoryview(array('Q', [0])))
+        self.columns = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,18 +1,61 @@
+import logging
+import os
+
 import biothings.dataload.uploader as uploader
+from biothings.utils.mongo import get_src_db
+from pymongo import DeleteOne, ReplaceOne
+
 import config
 
-from . import ItemsBot, ProteinBot
-from .parser import parse_interpro_xml, parse_release_info, parse_protein_ipr
+from .. import metrics
+from ..pipeline import request
+from ..storage import BulkStorage
+from .allowlist import load_allowlist
+from .cache import interpro_entries
+from .delta import commit_snapshot, protein_delta, snapshot_paths, write_collection_snapshot
+from .stages import post_upload
+from .store import write_protein_store
+from .parser import parse_protein_ipr, parse_protein_ipr_parallel, read_release_info, IprIndex
 
 DEBUG = False
 
+
+class DeltaStorage(BulkStorage):
+    """
+    Applies the output of delta.protein_delta to the live collection: added/changed docs are upserted, removed ones
+    deleted. The temp collection biothings loads into is left empty.
+    """
+    # ProteinBot's changed_in query
+    indexes = [("release", {})]
+
+    def __init__(self, db, dest_col_name, logger=logging):
+        super().__init__(db, dest_col_name, logger)
+        # dest_col_name is "<collection>_temp_<random>"
+        self.temp_collection = self.temp_collection.database[dest_col_name.split("_temp_")[0]]
+
+    def process(self, doc_d, batch_size):
+        self.logger.info("Applying delta to {}...".format(self.temp_collection.name))
+        collection = self.temp_collection.with_options(write_concern=self.write_concern)
+        total = 0
+        for doc_li in self.doc_iterator(doc_d, batch=True, batch_size=self.batch_size or batch_size):
+            ops = [DeleteOne({'_id': doc['_id']}) if doc['status'] == 'removed' else
+                   ReplaceOne({'_id': doc['_id']}, doc, upsert=True) for doc in doc_li]
+            if ops:
+                collection.bulk_write(ops, ordered=False)
+            total += len(ops)
+        # a no-op once the index exists
+        self.create_indexes(self.temp_collection)
+        return total
+
+
 class InterproUploader(uploader.BaseSourceUploader):
     name = "interpro"
     main_source = "interpro"
+    storage_class = BulkStorage
 
     def load_data(self, data_folder):
         self.data_folder = data_folder
-        return parse_interpro_xml(data_folder)
+        return interpro_entries(data_folder, cache_dir=config.INTERPRO_CACHE_DIR)
 
     def post_update_data(self):
         print("done uploading interpro")
@@ -25,39 +68,51 @@ class InterproUploader(uploader.BaseSourceUploader):
 class InterproProteinUploader(uploader.BaseSourceUploader):
     name = "interpro_protein"
     main_source = "interpro"
+    storage_class = DeltaStorage if config.INTERPRO_PROTEIN_DELTA else BulkStorage
 
     def load_data(self, data_folder):
         self.data_folder = data_folder
-        ipr_items = parse_interpro_xml(data_folder)
-        ipr_items = {x['_id']: x for x in ipr_items}
-        p = parse_protein_ipr(data_folder, ipr_items, debug=DEBUG)
+        metrics.start_export()
+        ipr_items = IprIndex(interpro_entries(data_folder, cache_dir=config.INTERPRO_CACHE_DIR))
+        allowlist = load_allowlist(config.INTERPRO_PROTEIN_ALLOWLIST) if config.INTERPRO_PROTEIN_ALLOWLIST else None
+        if DEBUG or config.INTERPRO_PARSE_PROCESSES == 1:
+            p = parse_protein_ipr(data_folder, ipr_items, debug=DEBUG, allowlist=allowlist)
+        else:
+            p = parse_protein_ipr_parallel(data_folder, ipr_items, processes=config.INTERPRO_PARSE_PROCESSES,
+                                           allowlist=allowlist)
+        if config.INTERPRO_PROTEIN_STORE:
+            p = write_protein_store(p, os.path.join(data_folder, "interpro_protein.store"), ipr_items)
+        if config.INTERPRO_PROTEIN_DELTA:
+            previous_path, snapshot_path = snapshot_paths(data_folder)
+            if not os.path.exists(previous_path):
+                # first delta run: diff against what is in mongo
+                write_collection_snapshot(get_src_db()[self.name], previous_path)
+            p = protein_delta(p, previous_path, snapshot_path, read_release_info(data_folder)['version'])
         return p
 
+    def switch_collection(self):
+        if not config.INTERPRO_PROTEIN_DELTA:
+            return super().switch_collection()
+        # the delta went straight to the live collection. this release is now the one to diff against
+        self.db[self.temp_collection_name].drop()
+        commit_snapshot(self.data_folder)
+
     def post_update_data(self):
         print("done uploading interpro_protein")
-        release_info = list(parse_release_info(self.data_folder))
-        interpro_release_info = [x for x in release_info if x['_id'] == "INTERPRO"][0]
-
-        # TODO: check that interpro upload is completed
-
-        log_path = ItemsBot.main(interpro_release_info, mongo_coll="interpro", debug=DEBUG)
-        print("done with interpro items. parsing log: {}".format(log_path))
-        #bot_log_parser.process_log(log_path)
-        upload_log(log_path)
-        print("running interpro-protein")
-        log_path = ProteinBot.main(interpro_release_info, mongo_coll="interpro_protein", taxon="Q15978631")
-        print("done with interpro-protein. parsing log: {}".format(log_path))
-        #bot_log_parser.process_log(log_path)
-        upload_log(log_path)
-        print("done")
+        params = {'release_info': read_release_info(self.data_folder), 'debug': DEBUG}
+        if config.HUB_PIPELINE_DIR:
+            # the hub runs the bots, this uploader's slot is free as soon as we return
+            file_path = request("contrib.interpro.stages.post_upload", params, config.HUB_PIPELINE_DIR)
+            print("requested post-upload stages: {}".format(file_path))
+        else:
+            # not in the hub: run them here, one after the other
+            params['wait_for_upload'] = False
+            pipeline = post_upload(params)
+            print(pipeline.run())
+            if pipeline.errors:
+                raise ValueError("post-upload stages failed: {}".format(pipeline.errors))
 
     @classmethod
     def get_mapping(cls):
         return {}
 
-
-def upload_log(file_path):
-    import requests
-    url = "http://{}:{}/uploadPOST/".format(config.LOGGING_HOST, config.LOGGING_PORT)
-    data = open(file_path).read()
-    r = requests.post(url, data=data)
\ No newline at end of file
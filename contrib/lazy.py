@@ -0,0 +1,34 @@
+"""
+Lazily computed class attributes
+
+Id mappings like IPRTerm.ipr2wd are sparql queries. As plain class attributes they run when the module is imported,
+so every hub start and every worker process would pay for them, and nothing can be imported offline.
+
+    class IPRTerm:
+        @lazy_class_attribute
+        def ipr2wd(cls):
+            return PBB_Helpers.id_mapper(INTERPRO)
+
+The function runs on first access and its result replaces it on the class, so it is computed once per process
+(assigning to the attribute works as usual). Threads that access it while it's being computed wait for it, instead
+of computing it again and replacing a value that may have been updated in the meantime (e.g. the write-through
+IPRTerm.ipr2wd, first read by the write executor's threads).
+"""
+import threading
+
+
+class lazy_class_attribute:
+    def __init__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+        self.lock = threading.Lock()
+
+    def __get__(self, instance, owner):
+        name = self.func.__name__
+        with self.lock:
+            # another thread may have computed it while we waited
+            value = vars(owner).get(name, self)
+            if value is self:
+                value = self.func(owner)
+                setattr(owner, name, value)
+        return value
@@ -0,0 +1,264 @@
+"""
+Ship bot logs to the logging host (config.LOGGING_HOST)
+
+Logs are read in chunks of `chunk_size` bytes from where the last shipping left off, gzipped and written to a local
+spool directory first. Spooled chunks are POSTed in order, and removed once the receiver has them. Several shippers
+can drain the same spool: a chunk is claimed with a rename before it's sent, so it's sent once. When the receiver
+is down they stay in the spool, and the sender retries with a growing delay (the hub runs one in the background for
+the whole spool). Each POST has the headers:
+
+    Content-Encoding: gzip
+    X-Log-Name: <log file name>
+    X-Log-Offset: <offset of the chunk in the log>, so that the receiver can put chunks in order and drop the ones it
+        already has
+
+    shipper = LogShipper.from_config()
+    shipper.ship("logs/InterproBot_Items-20170101_00:00.log")  # spool what's new, send it
+    with shipping("logs/InterproBot_Items-20170101_00:00.log"):  # ship while the bot is still writing it
+        ...
+"""
+import glob
+import gzip
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+CHUNK_SIZE = 4 * 1024 * 1024
+FOLLOW_INTERVAL = 30
+SEND_TIMEOUT = 60
+MIN_DELAY = 5
+MAX_DELAY = 600
+# a chunk being sent is renamed to <chunk>.sending, so that the other shippers of the spool (the hub's, the bots')
+# leave it alone. a claim older than this is one of a shipper that died while sending, the chunk goes back to the spool
+SENDING = ".sending"
+CLAIM_TIMEOUT = 10 * SEND_TIMEOUT
+
+
+class LogShipper:
+    def __init__(self, url, spool_dir, chunk_size=CHUNK_SIZE, timeout=SEND_TIMEOUT, min_delay=MIN_DELAY,
+                 max_delay=MAX_DELAY, claim_timeout=CLAIM_TIMEOUT):
+        self.url = url
+        self.spool_dir = spool_dir
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.claim_timeout = claim_timeout
+        self.delay = min_delay
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+        os.makedirs(spool_dir, exist_ok=True)
+
+    @classmethod
+    def from_config(cls):
+        import config
+        url = "http://{}:{}/uploadPOST/".format(config.LOGGING_HOST, config.LOGGING_PORT)
+        return cls(url, config.LOG_SPOOL_DIR)
+
+    def offset_path(self, log_name):
+        return os.path.join(self.spool_dir, log_name + ".offset")
+
+    def get_offset(self, log_name):
+        try:
+            with open(self.offset_path(log_name)) as f:
+                return json.load(f)['offset']
+        except FileNotFoundError:
+            return 0
+
+    def set_offset(self, log_name, offset):
+        tmp_path = self.offset_path(log_name) + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'offset': offset}, f)
+        os.replace(tmp_path, self.offset_path(log_name))
+
+    def spool(self, file_path, final=True):
+        """
+        Write what was added to the log since the last call to the spool, in gzipped chunks. Unless `final`, only
+        whole lines are taken (the bot is still writing). Returns the number of chunks
+        """
+        log_name = os.path.basename(file_path)
+        n = 0
+        with self.lock, open(file_path, 'rb') as f:
+            offset = self.get_offset(log_name)
+            f.seek(offset)
+            while True:
+                data = f.read(self.chunk_size)
+                if not data:
+                    break
+                if not final and not data.endswith(b"\n"):
+                    end = data.rfind(b"\n")
+                    if len(data) < self.chunk_size:
+                        # the last line isn't complete yet
+                        if end < 0:
+                            break
+                        data = data[:end + 1]
+                    elif end >= 0:
+                        data = data[:end + 1]
+                    f.seek(offset + len(data))
+                chunk_path = os.path.join(self.spool_dir, "{}.{:015d}.gz".format(log_name, offset))
+                with open(chunk_path + ".tmp", 'wb') as out:
+                    out.write(gzip.compress(data, compresslevel=6))
+                os.replace(chunk_path + ".tmp", chunk_path)
+                offset += len(data)
+                self.set_offset(log_name, offset)
+                n += 1
+        return n
+
+    def pending(self):
+        return sorted(glob.glob(os.path.join(self.spool_dir, "*.gz")))
+
+    def claim(self, chunk_path):
+        """
+        Rename the chunk to <chunk>.sending. False if another shipper got it first
+        """
+        try:
+            os.rename(chunk_path, chunk_path + SENDING)
+        except FileNotFoundError:
+            return False
+        # the age of the claim, for recover()
+        os.utime(chunk_path + SENDING)
+        return True
+
+    def unclaim(self, chunk_path):
+        try:
+            os.rename(chunk_path + SENDING, chunk_path)
+        except FileNotFoundError:
+            pass
+
+    def recover(self):
+        """
+        Put the chunks of the claims older than claim_timeout back in the spool
+        """
+        for sending_path in glob.glob(os.path.join(self.spool_dir, "*.gz" + SENDING)):
+            try:
+                if time.time() - os.path.getmtime(sending_path) > self.claim_timeout:
+                    os.rename(sending_path, sending_path[:-len(SENDING)])
+            except FileNotFoundError:
+                pass
+
+    def send(self, chunk_path):
+        log_name, offset, _ = os.path.basename(chunk_path).rsplit(".", 2)
+        if not self.claim(chunk_path):
+            # sent (or being sent) by another shipper
+            return True
+        with open(chunk_path + SENDING, 'rb') as f:
+            data = f.read()
+        headers = {'Content-Encoding': 'gzip', 'Content-Type': 'text/plain', 'X-Log-Name': log_name,
+                   'X-Log-Offset': str(int(offset))}
+        try:
+            r = requests.post(self.url, data=data, headers=headers, timeout=self.timeout)
+            r.raise_for_status()
+        except requests.RequestException as e:
+            self.unclaim(chunk_path)
+            print("log shipping to {} failed, {} chunks left in {}: {}".format(self.url, len(self.pending()),
+                                                                              self.spool_dir, e))
+            return False
+        try:
+            os.remove(chunk_path + SENDING)
+        except FileNotFoundError:
+            pass
+        return True
+
+    def send_pending(self):
+        """
+        Send the spooled chunks, in order. Stops at the first one that fails, returns False if one did
+        """
+        self.recover()
+        for chunk_path in self.pending():
+            if not self.send(chunk_path):
+                return False
+        return True
+
+    def ship(self, file_path, final=True):
+        """
+        Spool what's new in the log, and send it: in the background if start() was called, else right away
+        (returns False if it's left in the spool)
+        """
+        self.spool(file_path, final=final)
+        if self.thread is not None:
+            self.wakeup.set()
+            return True
+        return self.send_pending()
+
+    def start(self):
+        """
+        Send spooled chunks in a background thread, retrying with a growing delay while the receiver is down
+        """
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="log-shipper", daemon=True)
+            self.thread.start()
+        return self
+
+    def _run(self):
+        while not self.stopped.is_set():
+            if self.send_pending():
+                self.delay = self.min_delay
+                wait = self.max_delay
+            else:
+                wait = self.delay
+                self.delay = min(self.delay * 2, self.max_delay)
+            self.wakeup.wait(wait)
+            self.wakeup.clear()
+
+    def stop(self):
+        self.stopped.set()
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+class Follower:
+    """
+    Ships a log every `interval` seconds while it's being written
+    """
+
+    def __init__(self, shipper, file_path, interval=FOLLOW_INTERVAL):
+        self.shipper = shipper
+        self.file_path = file_path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="log-follower", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            if os.path.exists(self.file_path):
+                self.shipper.ship(self.file_path, final=False)
+
+    def stop(self):
+        """
+        Stop following, ship the rest of the log. Returns False if some of it is left in the spool
+        """
+        self.stopped.set()
+        self.thread.join()
+        return self.shipper.ship(self.file_path)
+
+
+@contextmanager
+def shipping(file_path, ship=True, shipper=None):
+    """
+    Ship the log at file_path while the block runs, and the rest of it at the end. Nothing if not `ship`
+    """
+    if not ship:
+        yield None
+        return
+    follower = Follower(shipper or LogShipper.from_config(), file_path)
+    try:
+        yield follower
+    finally:
+        follower.stop()
+
+
+def ship_log(file_path):
+    """
+    Ship a finished log. What can't be sent now stays in the spool, for the hub's shipper
+    """
+    if not LogShipper.from_config().ship(file_path):
+        print("{} left in the log spool".format(file_path))
@@ -0,0 +1,232 @@
+"""
+Metrics for the parsers, uploaders and bots
+
+Counters, and histograms of durations (timers), kept in a per-process registry:
+
+    from contrib import metrics
+    metrics.counter("wd_items_total", action="create").inc()
+    with metrics.timer("mongo_fetch_seconds"):
+        docs = list(collection.find(...))
+
+Look the metric up once outside of a hot loop, inc()/observe() only take a lock and do an addition.
+
+The bots run in the hub's worker processes: each process writes its registry, in the Prometheus text format, to
+<config.METRICS_DIR>/<pid>.prom every `interval` seconds once start_export() was called, and removes it at exit.
+The hub's "metrics" command reads them all (and removes the ones of processes that died without removing theirs),
+and node_exporter's textfile collector can serve them as they are.
+"""
+import atexit
+import bisect
+import glob
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# latency buckets, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+EXPORT_INTERVAL = 15
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self.lock:
+            self.value += n
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        return Timer(self)
+
+    def samples(self, name, labels):
+        total = 0
+        for le, count in zip(self.buckets + ("+Inf",), self.counts):
+            total += count
+            yield name + "_bucket", dict(labels, le=str(le)), total
+        yield name + "_sum", labels, self.sum
+        yield name + "_count", labels, self.count
+
+
+class Timer:
+    """
+    Observes the duration of a with block in a histogram
+    """
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def get(self, cls, name, labels):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self.metrics.get(key)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.setdefault(key, cls())
+        if not isinstance(metric, cls):
+            raise ValueError("{} is a {}, not a {}".format(name, metric.type, cls.type))
+        return metric
+
+    def counter(self, name, **labels):
+        return self.get(Counter, name, labels)
+
+    def histogram(self, name, **labels):
+        return self.get(Histogram, name, labels)
+
+    def timer(self, name, **labels):
+        return self.histogram(name, **labels).time()
+
+    def to_text(self, **extra_labels):
+        """
+        The registry in the Prometheus text format, with `extra_labels` added to every sample
+        """
+        lines = []
+        typed = set()
+        with self.lock:
+            metrics = sorted(self.metrics.items(), key=lambda x: x[0])
+        for (name, labels), metric in metrics:
+            if name not in typed:
+                lines.append("# TYPE {} {}".format(name, metric.type))
+                typed.add(name)
+            for sample_name, sample_labels, value in metric.samples(name, dict(labels, **extra_labels)):
+                lines.append("{}{} {}".format(sample_name, format_labels(sample_labels), value))
+        return "\n".join(lines) + "\n"
+
+    def write(self, file_path, **extra_labels):
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.to_text(**extra_labels))
+        os.replace(tmp_path, file_path)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(k, str(v).replace('"', '\\"')) for k, v in sorted(labels.items())) + "}"
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+timer = REGISTRY.timer
+
+_exporter_pid = None
+
+
+def start_export(metrics_dir=None, interval=EXPORT_INTERVAL):
+    """
+    Write this process' metrics to <metrics_dir>/<pid>.prom every `interval` seconds, and at exit
+    """
+    global _exporter_pid
+    if _exporter_pid == os.getpid():
+        # (a forked child doesn't have its parent's thread)
+        return
+    if metrics_dir is None:
+        import config
+        metrics_dir = config.METRICS_DIR
+    if not metrics_dir:
+        return
+    os.makedirs(metrics_dir, exist_ok=True)
+    pid = os.getpid()
+    file_path = os.path.join(metrics_dir, "{}.prom".format(pid))
+
+    # the export thread can be writing the file when it's removed at exit: it mustn't write it again after that
+    lock = threading.Lock()
+    stopped = []
+
+    def export():
+        with lock:
+            if not stopped:
+                REGISTRY.write(file_path, pid=pid)
+
+    def run():
+        while True:
+            time.sleep(interval)
+            export()
+
+    def remove():
+        # (not in a forked child that inherited the handler)
+        if os.getpid() != pid:
+            return
+        with lock:
+            stopped.append(True)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    threading.Thread(target=run, name="metrics-export", daemon=True).start()
+    atexit.register(remove)
+    _exporter_pid = pid
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_all(metrics_dir=None):
+    """
+    The metrics of all live processes that exported to metrics_dir, in the Prometheus text format: the samples of
+    every process under one TYPE line per metric. Their samples have a pid label. The files of dead processes are
+    removed
+    """
+    if metrics_dir is None:
+        import config
+        metrics_dir = config.METRICS_DIR
+    # {name: [type line, samples...]}
+    families = OrderedDict()
+    for file_path in sorted(glob.glob(os.path.join(metrics_dir, "*.prom"))):
+        pid = os.path.basename(file_path)[:-len(".prom")]
+        if pid.isdigit() and not pid_alive(int(pid)):
+            os.remove(file_path)
+            continue
+        with open(file_path) as f:
+            lines = f.read().splitlines()
+        family = None
+        for line in lines:
+            if line.startswith("# TYPE "):
+                family = families.setdefault(line.split()[2], [line])
+            elif line and not line.startswith("#") and family is not None:
+                family.append(line)
+    return "".join(line + "\n" for name in sorted(families) for line in families[name])
@@ -15,6 +15,10 @@ from tqdm import tqdm
 
 import config
 from WDHelper import WDHelper
+from contrib import metrics, wd_snapshot
+from contrib.dry_run import DryRun
+from contrib.lazy import lazy_class_attribute
+from contrib.wd_writer import WriteExecutor, count_action, timed
 from local import WDUSER, WDPASS
 
 biothings.config_for_app(config)
@@ -38,9 +42,13 @@ class MondoBot:
     DOID_PROP = "P699"
     UMLS_PROP = "P2892"
     MONDO_WDID = "Q27468140"
-    DOID2WD = WDHelper().id_mapper(DOID_PROP)
 
-    def __init__(self, log_dir=None, date=None, dry_run=False):
+    @lazy_class_attribute
+    def DOID2WD(cls):
+        with metrics.timer("id_mapper_seconds", prop=cls.DOID_PROP):
+            return WDHelper().id_mapper(cls.DOID_PROP)
+
+    def __init__(self, log_dir=None, date=None, dry_run=False, write_threads=None):
         self.log_dir = log_dir if log_dir else os.getcwd()
         d = datetime.now()
         self.date = date if date else "".join(map(str, [d.year, d.month, d.day]))
@@ -50,6 +58,10 @@ class MondoBot:
         self.info_log_path = None
         self.exc_log_path = None
         self.reference = None
+        # None: write one item at a time
+        self.executor = WriteExecutor(write_threads) if write_threads else None
+        # what a dry run would change
+        self.diff = DryRun()
         self.setup_logging()
         self.collection = get_src_db().mondo
         src_dump = get_src_dump()
@@ -84,20 +96,28 @@ class MondoBot:
         for umls in umls_list:
             statements.append(PBB_Core.WDExternalID(value=umls, prop_nr=self.UMLS_PROP, references=[self.reference]))
 
-        wd_item = PBB_Core.WDItemEngine(wd_item_id=self.DOID2WD[doid], domain='disease', data=statements,
-                                        append_value=[self.UMLS_PROP], fast_run=True,
-                                        fast_run_base_filter=self.fast_run_base_filter)
+        with metrics.timer("fastrun_diff_seconds", bot="mondo"):
+            wd_item = PBB_Core.WDItemEngine(wd_item_id=self.DOID2WD[doid], domain='disease', data=statements,
+                                            append_value=[self.UMLS_PROP], fast_run=True,
+                                            fast_run_base_filter=self.fast_run_base_filter)
 
         # no item creation should be done
         if wd_item.create_new_item:
             raise ValueError("something bad happpened")
 
         if dry_run:
+            self.diff.record(wd_item, doid)
             if wd_item.require_write:
                 info_logger.info(" ".join(["item_updated", doid, wd_item.wd_item_id]))
 
         if wd_item.require_write and not dry_run:
-            self.try_write(wd_item, doid)
+            if self.executor:
+                self.executor.submit(self.try_write, wd_item, doid)
+            else:
+                count_action(wd_item)
+                self.try_write(timed(wd_item), doid)
+        elif not dry_run:
+            count_action(wd_item)
 
     def try_write(self, wd_item, doid):
         try:
@@ -121,6 +141,8 @@ class MondoBot:
                 continue
             self.do_umls_statement(doid, umls_list, dry_run=dry_run)
         cursor.close()
+        if self.executor:
+            self.executor.join()
 
     def generate_report(self):
         item_updated, item_created = parse_info(self.info_log_path)
@@ -132,6 +154,9 @@ class MondoBot:
         print("Errors: ")
         print(df)
 
+        if self.diff.items:
+            self.diff.write_report(os.path.join(self.log_dir, 'mondo_{}_wikidata_dryrun.json'.format(self.date)))
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='run doid - umls wikidata import bot')
@@ -140,9 +165,12 @@ if __name__ == "__main__":
     parser.add_argument('--log_dir', help='directory to store logs', type=str)
     parser.add_argument('--date', help='log date', type=str)
     parser.add_argument('--cheat', help='only run every hundredth doc', action='store_true')
+    parser.add_argument('--write-threads', help='number of concurrent writes', type=int,
+                        default=config.WD_WRITE_THREADS)
     args = parser.parse_args()
 
-    bot = MondoBot(log_dir=args.log_dir, date=args.date)
+    wd_snapshot.install_configured(offline=args.dry_run)
+    bot = MondoBot(log_dir=args.log_dir, date=args.date, write_threads=args.write_threads)
     bot.run(dry_run=args.dry_run, cheat=args.cheat)
     bot.generate_report()
 
@@ -1,13 +1,13 @@
-import pandas as pd
 from io import StringIO
 
+
 def parse_info(file_path):
     """
     2016-10-10 16:24:23,060 INFO item_updated IPR026494 Q24785812
     2016-10-10 16:26:55,996 INFO item_updated A0A0E0XWW8 Q24278509
     2016-10-10 16:26:57,587 INFO item_updated A0A0E0XWX1 Q24282146
     """
-
+    import pandas as pd
     df = pd.read_csv(file_path, sep=" ", names=['date','time','level','msg','id','wdid'])
     item_updated = len(df.query("msg == 'item_updated'"))
     item_created = len(df.query("msg == 'item_created'"))
@@ -28,6 +28,7 @@ def parse_exc(file_path):
         for prop_nr, dt in self.prop_data[qid].items():
     KeyError: 'Q24277976'
     """
+    import pandas as pd
     lines = [line[1:] for line in open(file_path).readlines() if line.startswith(">")]
     df = pd.read_csv(StringIO("\n".join(lines)), sep=" ", names=['date','time','level','msg','id','wdid'])
     return df
\ No newline at end of file
@@ -2,7 +2,6 @@
 
 import itertools
 import re
-import networkx
 
 
 def read_obo(obofile):
@@ -13,6 +12,7 @@ def read_obo(obofile):
     This function attempts to follow the specifications provided at:
     https://oboformat.googlecode.com/svn/trunk/doc/GO.format.obo-1_4.html
     """
+    import networkx
     typedefs, terms, instances, header = get_sections(obofile)
     graph = networkx.MultiDiGraph(name=header['ontology'],
                                   typedefs=typedefs, instances=instances,
@@ -25,13 +25,15 @@ def read_obo(obofile):
         if is_obsolete:
             continue
         term_id = term.pop('id')
-        graph.add_node(term_id, attr_dict=term)
+        is_a = term.pop('is_a', [])
+        relationships = term.pop('relationship', [])
+        graph.add_node(term_id, **term)
 
-        for target_term in term.pop('is_a', []):
+        for target_term in is_a:
             edge_tuple = term_id, 'is_a', target_term
             edge_tuples.append(edge_tuple)
 
-        for relationship in term.pop('relationship', []):
+        for relationship in relationships:
             typedef, target_term = relationship.split(' ')
             edge_tuple = term_id, typedef, target_term
             edge_tuples.append(edge_tuple)
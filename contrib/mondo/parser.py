@@ -1,46 +1,35 @@
-from typing import List
-
-import networkx
 from .obo import read_obo
-from biothings.utils.common import list2dict
-from networkx.readwrite import json_graph
-
 
-print("Dont use this for equaivalent class because it doesn't have it. use owl file")
 
 def graph_to_d(graph):
     """
     :param graph: A networkx graph made from reading ontology
     :type graph: networkx.classes.multidigraph.MultiDiGraph
-    :return:
+    :return: {node id: node attributes, and the targets of its edges by edge key}
     """
-    node_link_data = json_graph.node_link_data(graph)
-    nodes = node_link_data['nodes']
-
-    idx_id = {idx: node['id'] for idx, node in enumerate(nodes)}
-    for link in node_link_data['links']:
+    # straight from the graph: node_link_data's format changed across networkx versions
+    d = {}
+    for node_id, data in graph.nodes(data=True):
+        node = {k: v for k, v in data.items() if k != 'id'}
+        d[node_id] = node
+    for source, target, key in graph.edges(keys=True):
         # store the edges (links) within the graph
-        key = link['key']
-        source = link['source']
-        target = link['target']
-
-        if key not in nodes[source]:
-            nodes[source][key] = set()
-        nodes[source][key].add(idx_id[target])
+        if key not in d[source]:
+            d[source][key] = set()
+        d[source][key].add(target)
 
     # for mongo insertion
-    for node in nodes:
-        node['_id'] = node['id']
-        del node['id']
+    for node_id, node in d.items():
+        node['_id'] = node_id
         for k, v in node.items():
             if isinstance(v, set):
                 node[k] = list(v)
-    d = {node['_id']: node for node in nodes}
 
     return d
 
 
 def parse(file_path):
+    print("Dont use this for equaivalent class because it doesn't have it. use owl file")
     graph = read_obo(open(file_path).readlines())
     d = graph_to_d(graph)
     for v in d.values():
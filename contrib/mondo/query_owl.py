@@ -1,42 +1,67 @@
 from itertools import chain
 
-import rdflib
-from rdflib.plugins.sparql import prepareQuery
-from rdflib.term import URIRef
-from tqdm import tqdm
+# rdflib is imported where it's used, it takes a while to import
+
+
+def equivalent_pairs(g):
+    # (s, x) for every owl:equivalentClass triple
+    from rdflib.namespace import OWL
+    return g.subject_objects(OWL.equivalentClass)
 
 
 def get_all_ids(g):
     # get all ids that could have an equivalent class
-    q = prepareQuery("""
-    PREFIX owl: <http://www.w3.org/2002/07/owl#>
-    select * where {
-      ?s owl:equivalentClass|^owl:equivalentClass ?x .
-      filter (?s != ?x)
-    }
-    """)
-    result = g.query(q)
-    all_ids = set(chain(*[(str(r[0]), str(r[1])) for r in result]))
+    return set(chain(*((str(s), str(x)) for s, x in equivalent_pairs(g) if s != x)))
 
-    return all_ids
 
+def equivalence_classes(pairs):
+    """
+    Union-find over the equivalentClass pairs. Returns {node: set of the nodes equivalent to it (itself included)},
+    the same as following (owl:equivalentClass|^owl:equivalentClass)* from each node
+    """
+    parent = {}
+    size = {}
+
+    def find(node):
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    for a, b in pairs:
+        for node in (a, b):
+            if node not in parent:
+                parent[node] = node
+                size[node] = 1
+        a, b = find(a), find(b)
+        if a != b:
+            if size[a] < size[b]:
+                a, b = b, a
+            parent[b] = a
+            size[a] += size[b]
+
+    classes = {}
+    for node in parent:
+        classes.setdefault(find(node), set()).add(node)
+    return {node: classes[find(node)] for node in parent}
 
 
 def do_queries(g, ids):
     # get all (symetrical, follow chains) equivalent classes for each id
+    from rdflib.term import URIRef
+    classes = equivalence_classes(equivalent_pairs(g))
     d = []
-    for id in tqdm(ids):
-        q = prepareQuery("""PREFIX owl: <http://www.w3.org/2002/07/owl#>
-        select * where {
-            ?s (owl:equivalentClass|^owl:equivalentClass)* ?x .
-        }""")
-        result = g.query(q, initBindings={'s': URIRef(id)})
-        equiv_class = [x.split("/")[-1] for x in set(chain(*list(result)))]
+    for id in ids:
+        # ids of blank nodes aren't uris, they are only equivalent to themselves
+        equiv_class = [x.split("/")[-1] for x in classes.get(URIRef(id), {id})]
         d.append({'_id': id.split("/")[-1].replace("_", ":"), 'equivalent_class': [x.replace("_", ":") for x in equiv_class]})
     return d
 
 
 def parse(file_path):
+    import rdflib
     g = rdflib.Graph()
     g.parse(file_path)
 
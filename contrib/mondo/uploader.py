@@ -2,12 +2,14 @@ import os
 
 import biothings.dataload.uploader as uploader
 
+from ..storage import BulkStorage
 from .query_owl import parse
 
 
 class MondoUploader(uploader.BaseSourceUploader):
     name = "mondo"
     main_source = "mondo"
+    storage_class = BulkStorage
 
     def load_data(self, data_folder):
         return parse(os.path.join(data_folder, self.name, "mondo.owl"))
@@ -13,6 +13,7 @@ https://www.wikidata.org/wiki/Q23162696
 
 """
 import json
+import os
 from datetime import datetime
 
 from ProteinBoxBot_Core import PBB_login, PBB_Core, PBB_Helpers
@@ -20,6 +21,9 @@ from tqdm import tqdm
 
 import ChromosomeBot
 from HelperBot import strain_info, format_msg, make_ref_source
+from contrib import wd_snapshot
+from contrib.dry_run import DryRun
+from contrib.wd_writer import WriteExecutor, try_write
 from SourceBot import get_source_versions, get_data_from_mygene
 from local import WDUSER, WDPASS
 
@@ -41,7 +45,7 @@ __metadata__ = {'name': 'YeastBot_Gene',
                 'properties': list(PROPS.values())
                 }
 
-def wd_item_construction(record, strain_info, chrom_wdid, login):
+def wd_item_construction(record, strain_info, chrom_wdid, login, executor=None):
     """
     generate pbb_core item object
     """
@@ -68,11 +72,13 @@ def wd_item_construction(record, strain_info, chrom_wdid, login):
                         }
 
         # entrez gene id
-        entrez_ref = make_ref_source(record['entrezgene']['@source'], 'entrez_gene', external_ids['entrez_gene'])
+        entrez_ref = make_ref_source(record['entrezgene']['@source'], 'entrez_gene', external_ids['entrez_gene'],
+                                     executor=executor)
         s.append(PBB_Core.WDString(external_ids['entrez_gene'], PROPS['Entrez Gene ID'], references=[entrez_ref]))
 
         # ensembl gene id
-        ensembl_ref = make_ref_source(record['ensembl']['@source'], 'ensembl_gene', external_ids['ensembl_gene'])
+        ensembl_ref = make_ref_source(record['ensembl']['@source'], 'ensembl_gene', external_ids['ensembl_gene'],
+                                      executor=executor)
         s.append(PBB_Core.WDString(external_ids['ensembl_gene'], PROPS['Ensembl Gene ID'], references=[ensembl_ref]))
 
         # ncbi locus tag
@@ -93,7 +99,8 @@ def wd_item_construction(record, strain_info, chrom_wdid, login):
         genomic_pos_value = record['genomic_pos']['@value']
         genomic_pos_source = record['genomic_pos']['@source']
         genomic_pos_id_prop = source_ref_id[genomic_pos_source['_id']]
-        genomic_pos_ref = make_ref_source(genomic_pos_source, genomic_pos_id_prop, external_ids[genomic_pos_id_prop])
+        genomic_pos_ref = make_ref_source(genomic_pos_source, genomic_pos_id_prop, external_ids[genomic_pos_id_prop],
+                                          executor=executor)
 
         # create chromosome qualifier
         chrom_genomeid = strain_info['chrom_genomeid_map'][genomic_pos_value['chr']]
@@ -123,10 +130,10 @@ def wd_item_construction(record, strain_info, chrom_wdid, login):
     wd_item_gene.set_description(item_description, lang='en')
     wd_item_gene.set_aliases([record['symbol']['@value'], record['locus_tag']['@value']])
 
-    PBB_Helpers.try_write(wd_item_gene, record['_id']['@value'], ENTREZ_PROP, login)
+    try_write(wd_item_gene, record['_id']['@value'], ENTREZ_PROP, login, executor=executor)
 
 
-def run(login, gene_records, chrom_wdid):
+def run(login, gene_records, chrom_wdid, executor=None):
     for record in tqdm(gene_records):
         if 'genomic_pos' not in record:
             # see: http://mygene.info/v3/gene/855814
@@ -136,10 +143,10 @@ def run(login, gene_records, chrom_wdid):
             # see: http://mygene.info/v3/gene/853483
             PBB_Core.WDItemEngine.log("WARNING", format_msg(record['_id']['@value'], "multiple_positions", '', ENTREZ_PROP))
             continue
-        wd_item_construction(record, strain_info, chrom_wdid, login)
+        wd_item_construction(record, strain_info, chrom_wdid, login, executor=executor)
 
 
-def main(log_dir="./logs", run_id=None):
+def main(log_dir="./logs", run_id=None, write_threads=None, dry_run=False):
     if run_id is None:
         run_id = datetime.now().strftime('%Y%m%d_%H:%M')
     __metadata__['run_id'] = run_id
@@ -150,6 +157,7 @@ def main(log_dir="./logs", run_id=None):
     __metadata__['sources'] = get_source_versions()
 
     records = get_data_from_mygene()
+    wd_snapshot.install_configured(offline=dry_run)
 
     login = PBB_login.WDLogin(user=WDUSER, pwd=WDPASS)
 
@@ -158,7 +166,15 @@ def main(log_dir="./logs", run_id=None):
     if PBB_Core.WDItemEngine.logger is not None:
         PBB_Core.WDItemEngine.logger.handles = []
     PBB_Core.WDItemEngine.setup_logging(log_dir=log_dir, log_name=log_name, header=json.dumps(__metadata__))
-    run(login, records, chrom_wdid)
+    if dry_run:
+        executor = DryRun()
+    else:
+        executor = WriteExecutor(write_threads) if write_threads else None
+    run(login, records, chrom_wdid, executor=executor)
+    if executor:
+        executor.shutdown()
+    if dry_run:
+        executor.write_report(os.path.join(log_dir, log_name + ".dryrun.json"))
 
 
 if __name__ == "__main__":
@@ -2,6 +2,9 @@ from datetime import datetime
 from ProteinBoxBot_Core import PBB_Core
 from ProteinBoxBot_Core import PBB_Helpers
 
+from contrib.dry_run import DryRun
+from contrib.interning import interned, retrieved, stated_in
+
 strain_info = {
     "organism_type": "fungal",
     "organism_name": "Saccharomyces cerevisiae S288c",
@@ -78,7 +81,7 @@ prop_ids = {'uniprot': 'P352',
             }
 
 
-def make_ref_source(source_doc, id_prop, identifier, login=None):
+def make_ref_source(source_doc, id_prop, identifier, login=None, executor=None):
     """
     Reference is made up of:
     stated_in: if the source has a release #:
@@ -87,6 +90,7 @@ def make_ref_source(source_doc, id_prop, identifier, login=None):
     link to id: link to identifier in source
     retrieved: only if source has no release #
     login: must be passed if you want to be able to create new release items
+    executor: the bot's executor. a dry_run.DryRun only looks the release up, and reports it if it would be created
 
     :param source_doc:
     :param id_prop:
@@ -108,18 +112,17 @@ def make_ref_source(source_doc, id_prop, identifier, login=None):
         title = "{} Release {}".format(source_doc['_id'], source_doc['release'])
         description = "Release {} of {}".format(source_doc['release'], source_doc['_id'])
         edition_of_wdid = source_items[source_doc['_id']]
-        release = PBB_Helpers.Release(title, description, source_doc['release'],
-                                      edition_of_wdid=edition_of_wdid).get_or_create(login)
+        release = PBB_Helpers.Release(title, description, source_doc['release'], edition_of_wdid=edition_of_wdid)
+        if isinstance(executor, DryRun):
+            release = executor.release_qid(release)
+        else:
+            # one lookup per release, not one per record. only a release that was found (or created) is kept
+            release = interned(('release', source, source_doc['release']), lambda: release.get_or_create(login))
 
-        stated_in = PBB_Core.WDItemID(value=release, prop_nr='P248', is_reference=True)
-        reference = [stated_in, link_to_id]
+        return [stated_in(release), link_to_id]
     else:
         date_string = source_doc['timestamp']
-        retrieved = datetime.strptime(date_string,"%Y%m%d")
-        stated_in = PBB_Core.WDItemID(value=source_items[source], prop_nr='P248', is_reference=True)
-        retrieved = PBB_Core.WDTime(retrieved.strftime('+%Y-%m-%dT00:00:00Z'), prop_nr='P813', is_reference=True)
-        reference = [stated_in, retrieved, link_to_id]
-    return reference
+        return [stated_in(source_items[source]), retrieved(datetime.strptime(date_string, "%Y%m%d")), link_to_id]
 
 
 def make_reference(source, id_prop, identifier, retrieved):
@@ -5,15 +5,18 @@ https://bitbucket.org/sulab/wikidatabots/raw/c448a375f97daf279bec71fd800d551dede
 example microbial protein:
 https://www.wikidata.org/wiki/Q22291171
 """
-import copy
 import json
+import os
 from datetime import datetime
 
 from ProteinBoxBot_Core import PBB_login, PBB_Core, PBB_Helpers
 from interproscan.WDHelper import WDHelper
 from tqdm import tqdm
 
-from HelperBot import strain_info, go_props, go_evidence_codes, format_msg, make_ref_source, try_write
+from HelperBot import strain_info, go_props, go_evidence_codes, format_msg, make_ref_source
+from contrib import wd_snapshot
+from contrib.dry_run import DryRun
+from contrib.wd_writer import WriteExecutor, try_write
 from SourceBot import get_data_from_mygene, get_source_versions
 from local import WDUSER, WDPASS
 
@@ -30,7 +33,7 @@ source_ref_id = {'ensembl': 'ensembl_protein',
                  'swiss_prot': 'uniprot'}
 
 
-def gene_encodes_statement(gene_qid, protein_qid, id_prop, external_id, source, login):
+def gene_encodes_statement(gene_qid, protein_qid, id_prop, external_id, source, login, executor=None):
     """
 
     :param gene_qid:
@@ -39,9 +42,10 @@ def gene_encodes_statement(gene_qid, protein_qid, id_prop, external_id, source,
     :param external_id:
     :param source:
     :param login:
+    :param executor: wd_writer.WriteExecutor or dry_run.DryRun
     :return:
     """
-    ensembl_protein_reference = make_ref_source(source, id_prop, external_id)
+    ensembl_protein_reference = make_ref_source(source, id_prop, external_id, executor=executor)
 
     # gene
     gene_encodes = PBB_Core.WDItemID(value=protein_qid, prop_nr='P688', references=[ensembl_protein_reference])
@@ -53,7 +57,7 @@ def gene_encodes_statement(gene_qid, protein_qid, id_prop, external_id, source,
     if wd_item_protein.create_new_item:
         raise ValueError("nooo!!")
 
-    try_write(wd_item_protein, external_id, id_prop, login)
+    try_write(wd_item_protein, external_id, id_prop, login, executor=executor)
 
 
 
@@ -74,7 +78,7 @@ def preprocess_go(record):
         record['go']['@value'][level] = go_terms
 
 
-def protein_item(record, strain_info, gene_qid, go_wdid_mapping, login, add_pubmed):
+def protein_item(record, strain_info, gene_qid, go_wdid_mapping, login, add_pubmed, executor=None):
     """
     generate pbb_core item object
     """
@@ -95,13 +99,15 @@ def protein_item(record, strain_info, gene_qid, go_wdid_mapping, login, add_pubm
                     'uniprot': record['uniprot']['@value']['Swiss-Prot']}
 
     # ensembl protein id
-    ensembl_ref = make_ref_source(record['ensembl']['@source'], 'ensembl_protein', external_ids['ensembl_protein'])
+    ensembl_ref = make_ref_source(record['ensembl']['@source'], 'ensembl_protein', external_ids['ensembl_protein'],
+                                  executor=executor)
     s.append(PBB_Core.WDString(external_ids['ensembl_protein'], 'P705', references=[ensembl_ref]))
     # refseq protein id
-    refseq_ref = make_ref_source(record['refseq']['@source'], 'refseq_protein', external_ids['refseq_protein'])
+    refseq_ref = make_ref_source(record['refseq']['@source'], 'refseq_protein', external_ids['refseq_protein'],
+                                 executor=executor)
     s.append(PBB_Core.WDString(external_ids['refseq_protein'], 'P637', references=[refseq_ref]))
     # uniprot id
-    uniprot_ref = make_ref_source(record['uniprot']['@source'], 'uniprot', external_ids['uniprot'])
+    uniprot_ref = make_ref_source(record['uniprot']['@source'], 'uniprot', external_ids['uniprot'], executor=executor)
     s.append(PBB_Core.WDString(external_ids['uniprot'], 'P352', references=[uniprot_ref]))
 
     ############
@@ -113,15 +119,17 @@ def protein_item(record, strain_info, gene_qid, go_wdid_mapping, login, add_pubm
     print(record)
     go_source = record['go']['@source']
     go_id_prop = source_ref_id[go_source['_id']]
-    reference = make_ref_source(go_source, go_id_prop, external_ids[go_id_prop])
+    reference = make_ref_source(go_source, go_id_prop, external_ids[go_id_prop], executor=executor)
     for go_level, go_records in record['go']['@value'].items():
         level_wdid = go_props[go_level]
         for go_record in go_records:
             go_wdid = go_wdid_mapping[go_record['id']]
             evidence_wdid = go_evidence_codes[go_record['evidence']]
             evidence_statement = PBB_Core.WDItemID(value=evidence_wdid, prop_nr='P459',is_qualifier=True)
-            this_reference = copy.deepcopy(reference)
-            if add_pubmed:
+            # the reference is shared by all go records, only copied when pubmed refs are added to it
+            this_reference = reference
+            if add_pubmed and go_record['pubmed']:
+                this_reference = list(reference)
                 for pubmed in go_record['pubmed']:
                     pmid_wdid = PBB_Helpers.PubmedStub(pubmed).create(login)
                     this_reference.append(PBB_Core.WDItemID(pmid_wdid, 'P248', is_reference=True))
@@ -154,10 +162,10 @@ def protein_item(record, strain_info, gene_qid, go_wdid_mapping, login, add_pubm
         PBB_Core.WDItemEngine.log("ERROR", format_msg(record['entrezgene']['@value'], str(e), None, ENTREZ_PROP))
         return
 
-    try_write(wd_item_protein, record['entrezgene']['@value'], 'P351', login)
+    try_write(wd_item_protein, record['entrezgene']['@value'], 'P351', login, executor=executor)
 
 
-def run(login, records, add_pubmed):
+def run(login, records, add_pubmed, executor=None):
 
     # get all entrez gene id -> wdid mappings, where found in taxon is this strain
     gene_wdid_mapping = WDHelper().id_mapper("P351", (("P703", strain_info['organism_wdid']),))
@@ -171,10 +179,10 @@ def run(login, records, add_pubmed):
             PBB_Core.WDItemEngine.log("ERROR", format_msg(record['_id']['@value'], "gene_not_found", None, ENTREZ_PROP))
             continue
         gene_qid = gene_wdid_mapping[entrez_gene]
-        protein_item(record, strain_info, gene_qid, go_wdid_mapping, login, add_pubmed)
+        protein_item(record, strain_info, gene_qid, go_wdid_mapping, login, add_pubmed, executor=executor)
 
 
-def run_encodes(login, records):
+def run_encodes(login, records, executor=None):
     # get all entrez gene id -> wdid mappings, where found in taxon is this strain
     gene_wdid_mapping = PBB_Helpers.id_mapper("P351", (("P703", strain_info['organism_wdid']),))
 
@@ -188,10 +196,24 @@ def run_encodes(login, records):
             continue
         gene_qid = gene_wdid_mapping[entrez_gene]
         protein_qid = protein_wdid_mapping[record['ensembl']['@value']['protein']]
-        gene_encodes_statement(gene_qid, protein_qid, 'ncbi_gene', entrez_gene, record['ensembl']['@source'], login)
+        gene_encodes_statement(gene_qid, protein_qid, 'ncbi_gene', entrez_gene, record['ensembl']['@source'], login,
+                               executor=executor)
 
 
-def main(log_dir="./logs", run_id=None, add_pubmed=True):
+def new_executor(write_threads=None, dry_run=False):
+    if dry_run:
+        return DryRun()
+    return WriteExecutor(write_threads) if write_threads else None
+
+
+def finish(executor, log_path):
+    if executor:
+        executor.shutdown()
+    if isinstance(executor, DryRun):
+        executor.write_report(log_path + ".dryrun.json")
+
+
+def main(log_dir="./logs", run_id=None, add_pubmed=True, write_threads=None, dry_run=False):
     if run_id is None:
         run_id = datetime.now().strftime('%Y%m%d_%H:%M')
     __metadata__['run_id'] = run_id
@@ -200,12 +222,16 @@ def main(log_dir="./logs", run_id=None, add_pubmed=True):
     __metadata__['sources'] = get_source_versions()
 
     records = get_data_from_mygene()
+    wd_snapshot.install_configured(offline=dry_run)
 
     login = PBB_login.WDLogin(user=WDUSER, pwd=WDPASS)
     if PBB_Core.WDItemEngine.logger is not None:
         PBB_Core.WDItemEngine.logger.handles = []
     PBB_Core.WDItemEngine.setup_logging(log_dir=log_dir, log_name=log_name, header=json.dumps(__metadata__))
-    run(login, records, add_pubmed)
+    executor = new_executor(write_threads, dry_run)
+    # creating pubmed items is a write
+    run(login, records, add_pubmed and not dry_run, executor=executor)
+    finish(executor, os.path.join(log_dir, log_name))
 
     log_name = 'YeastBot_encodes-{}.log'.format(run_id)
     __metadata__['log_name'] = log_name
@@ -213,7 +239,9 @@ def main(log_dir="./logs", run_id=None, add_pubmed=True):
     if PBB_Core.WDItemEngine.logger is not None:
         PBB_Core.WDItemEngine.logger.handles = []
     PBB_Core.WDItemEngine.setup_logging(log_dir=log_dir, log_name=log_name, header=json.dumps(__metadata__))
-    run_encodes(login, records)
+    executor = new_executor(write_threads, dry_run)
+    run_encodes(login, records, executor=executor)
+    finish(executor, os.path.join(log_dir, log_name))
 
 
 if __name__ == "__main__":
@@ -39,12 +39,13 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='run mygene wikidata import bot')
     parser.add_argument('--log_dir', help='directory to store logs', type=str)
     parser.add_argument('--run_id', help='run id', type=str)
+    parser.add_argument('--dry-run', action='store_true', help="don't write, report what would be changed")
     args = parser.parse_args()
     log_dir = args.log_dir if args.log_dir else "./logs"
     run_id = args.run_id if args.run_id else datetime.now().strftime('%Y%m%d_%H:%M')
 
-    GeneBot.main(log_dir=log_dir, run_id=run_id)
-    ProteinBot.main(log_dir=log_dir, run_id=run_id)
+    GeneBot.main(log_dir=log_dir, run_id=run_id, dry_run=args.dry_run)
+    ProteinBot.main(log_dir=log_dir, run_id=run_id, dry_run=args.dry_run)
 
     print("mygene yeastbot done")
 
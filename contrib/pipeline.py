@@ -0,0 +1,330 @@
+"""
+Post-upload work as a DAG of stages, run by the hub
+
+A Pipeline is a set of Stages, each a function run in the hub's scheduler (see scheduler.py) once the stages it
+depends on are done. Stages that don't depend on each other run concurrently. A stage gets a dict with the pipeline's
+params and the results of the stages before it, by name. When a stage fails, the stages after it are skipped;
+stages nothing depends on (e.g. shipping a log) never hold anything up. A Wait stage waits for something outside
+the pipeline (e.g. another upload) without holding a worker: its check is re-run on every poll().
+
+Uploaders run in the scheduler's worker processes, which can't reach the hub, so post_update_data doesn't run the
+bots: it requests a pipeline with request(), which drops a json file in config.HUB_PIPELINE_DIR. The hub's
+PipelineManager picks it up on its next poll:
+
+    # contrib/interpro/stages.py
+    def post_upload(params):
+        return Pipeline("interpro", [Stage("items_bot", run_items_bot, resource_class="network"),
+                                     Stage("ship_items_log", ship_log, after=["items_bot"]), ...], params)
+
+    # InterproProteinUploader.post_update_data
+    request("contrib.interpro.stages.post_upload", {'release_info': ...}, config.HUB_PIPELINE_DIR)
+
+    # bin/hub.py
+    pmanager = PipelineManager(scheduler, config.HUB_PIPELINE_DIR, loop)
+    pmanager.poll()
+
+The manager saves the results of the stages that are done in the request, so that when the hub is restarted its
+pipelines go on from where they were.
+"""
+import concurrent.futures
+import glob
+import importlib
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from datetime import datetime
+
+PENDING, WAITING, RUNNING, DONE, FAILED, SKIPPED = "pending", "waiting", "running", "done", "failed", "skipped"
+POLL_INTERVAL = 10
+
+
+class Stage:
+    def __init__(self, name, fn, after=(), resource_class=None):
+        """
+        :param fn: fn(context), a module level function (it's run in a worker process)
+        :param after: names of the stages that have to be done first
+        :param resource_class: scheduler resource class to run it in. None: the scheduler's default
+        """
+        self.name = name
+        self.fn = fn
+        self.after = list(after)
+        self.resource_class = resource_class
+
+
+class Wait(Stage):
+    def __init__(self, name, check, after=(), timeout=None):
+        """
+        :param check: check(context), run in the thread that schedules the stages (the hub's), so it has to be quick.
+            Returns None while the stage has to wait, else its result. Fails the stage if it raises
+        :param timeout: fail the stage if it still waits after this many seconds
+        """
+        super().__init__(name, check, after)
+        self.timeout = timeout
+
+
+class Pipeline:
+    def __init__(self, name, stages, params=None):
+        self.name = name
+        self.stages = {stage.name: stage for stage in stages}
+        for stage in stages:
+            for dep in stage.after:
+                if dep not in self.stages:
+                    raise ValueError("stage {} depends on unknown stage {}".format(stage.name, dep))
+        self.context = dict(params or {})
+        self.state = {name: PENDING for name in self.stages}
+        self.errors = {}
+        self.started = {}
+        self.ended = {}
+        self.executor = None
+        self.future = Future()
+        self.lock = threading.Lock()
+        self.check_lock = threading.Lock()
+        # on_finish(pipeline, stage_name), called when a stage is done or failed
+        self.on_finish = None
+
+    def restore(self, done):
+        """
+        Mark stages as already done, {name: result}. Before start()
+        """
+        for name, result in done.items():
+            if name in self.stages:
+                self.state[name] = DONE
+                self.context[name] = result
+
+    def done(self):
+        """
+        {name: result} of the stages that are done
+        """
+        with self.lock:
+            return {name: self.context.get(name) for name, state in self.state.items() if state == DONE}
+
+    def ready(self):
+        return [stage for name, stage in self.stages.items()
+                if self.state[name] == PENDING and all(self.state[dep] == DONE for dep in stage.after)]
+
+    def skip_failed(self):
+        # stages after a failed (or skipped) one won't run
+        changed = True
+        while changed:
+            changed = False
+            for name, stage in self.stages.items():
+                if self.state[name] == PENDING and any(self.state[dep] in (FAILED, SKIPPED) for dep in stage.after):
+                    self.state[name] = SKIPPED
+                    changed = True
+
+    def start(self, executor=None):
+        """
+        Run the stages in `executor` (a scheduler.Scheduler). Returns a future that is done when all stages are done,
+        failed or skipped. Without an executor, the stages are run one after the other in this thread
+        """
+        self.executor = executor
+        self.future.set_running_or_notify_cancel()
+        self._schedule()
+        return self.future
+
+    def run(self, executor=None, poll_interval=POLL_INTERVAL):
+        self.start(executor)
+        while True:
+            try:
+                return self.future.result(timeout=poll_interval)
+            except concurrent.futures.TimeoutError:
+                self.poll()
+
+    def poll(self):
+        """
+        Check the Wait stages again, and start the stages that were waiting for them
+        """
+        with self.lock:
+            waiting = [self.stages[name] for name, state in self.state.items() if state == WAITING]
+        if waiting and self._check(waiting):
+            self._schedule()
+
+    def _schedule(self):
+        while True:
+            with self.lock:
+                self.skip_failed()
+                stages = self.ready()
+                for stage in stages:
+                    self.state[stage.name] = WAITING if isinstance(stage, Wait) else RUNNING
+                    self.started[stage.name] = datetime.now()
+                if not stages and RUNNING not in self.state.values() and WAITING not in self.state.values():
+                    if not self.future.done():
+                        self.future.set_result(self.status())
+                    return
+            checked = self._check([stage for stage in stages if isinstance(stage, Wait)])
+            stages = [stage for stage in stages if not isinstance(stage, Wait)]
+            if self.executor is None:
+                for stage in stages:
+                    self._run_inline(stage)
+            else:
+                for stage in stages:
+                    if stage.resource_class:
+                        future = self.executor.run(stage.resource_class, stage.fn, dict(self.context))
+                    else:
+                        future = self.executor.submit(stage.fn, dict(self.context))
+                    future.add_done_callback(lambda f, stage=stage: self._done(stage, f))
+            # go on with the stages after the ones that just ended
+            if not checked and (not stages or self.executor is not None):
+                break
+
+    def _check(self, stages):
+        """
+        Run the checks of Wait stages. Returns how many of them ended
+        """
+        n = 0
+        with self.check_lock:
+            for stage in stages:
+                if self.state[stage.name] != WAITING:
+                    continue
+                try:
+                    result = stage.fn(dict(self.context))
+                    waited = (datetime.now() - self.started[stage.name]).total_seconds()
+                    if result is None and stage.timeout is not None and waited > stage.timeout:
+                        raise TimeoutError("still waiting after {}s".format(stage.timeout))
+                except Exception as e:
+                    self._finish(stage, error=e)
+                    n += 1
+                else:
+                    if result is not None:
+                        self._finish(stage, result=result)
+                        n += 1
+        return n
+
+    def _run_inline(self, stage):
+        self.started[stage.name] = datetime.now()
+        try:
+            result = stage.fn(dict(self.context))
+        except Exception as e:
+            self._finish(stage, error=e)
+        else:
+            self._finish(stage, result=result)
+
+    def _done(self, stage, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            self._finish(stage, error=e)
+        else:
+            self._finish(stage, result=result)
+        self._schedule()
+
+    def _finish(self, stage, result=None, error=None):
+        with self.lock:
+            self.ended[stage.name] = datetime.now()
+            if error is None:
+                self.context[stage.name] = result
+                self.state[stage.name] = DONE
+            else:
+                self.errors[stage.name] = "".join(traceback.format_exception_only(type(error), error)).strip()
+                self.state[stage.name] = FAILED
+        if error is not None:
+            print("pipeline {}: stage {} failed: {}".format(self.name, stage.name, self.errors[stage.name]))
+        if self.on_finish is not None:
+            self.on_finish(self, stage.name)
+
+    def status(self):
+        return {name: {'state': self.state[name],
+                       'started': str(self.started[name]) if name in self.started else None,
+                       'ended': str(self.ended[name]) if name in self.ended else None,
+                       'error': self.errors.get(name)}
+                for name in self.stages}
+
+    def __repr__(self):
+        counts = {}
+        for state in self.state.values():
+            counts[state] = counts.get(state, 0) + 1
+        return "<Pipeline {} {}>".format(self.name, counts)
+
+
+def request(factory, params, pipeline_dir):
+    """
+    Ask the hub to run the pipeline factory(params). factory: "module.function" returning a Pipeline
+    """
+    os.makedirs(pipeline_dir, exist_ok=True)
+    file_path = os.path.join(pipeline_dir, "{}-{}.json".format(factory.rsplit(".", 1)[-1], time.time()))
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'factory': factory, 'params': params}, f)
+    os.replace(tmp_path, file_path)
+    return file_path
+
+
+def build(factory, params):
+    module, function = factory.rsplit(".", 1)
+    return getattr(importlib.import_module(module), function)(params)
+
+
+class PipelineManager:
+    """
+    Starts the pipelines requested in `pipeline_dir`. Their requests are renamed to .running while they run, and
+    removed when they're done (.failed if a stage failed). The results of the stages that are done are saved in the
+    request as they end: a .running request found at startup, or a .failed one renamed back to .json, is started
+    again from there
+    """
+
+    def __init__(self, executor, pipeline_dir, loop=None, poll_interval=POLL_INTERVAL):
+        self.executor = executor
+        self.pipeline_dir = pipeline_dir
+        self.loop = loop
+        self.poll_interval = poll_interval
+        self.pipelines = []
+        self.lock = threading.Lock()
+        # pipelines that were running when the hub stopped are started again
+        for file_path in glob.glob(os.path.join(self.pipeline_dir, "*.json.running")):
+            os.replace(file_path, file_path[:-len(".running")])
+
+    def poll(self):
+        try:
+            for pipeline in self.pipelines:
+                if not pipeline.future.done():
+                    pipeline.poll()
+            for file_path in sorted(glob.glob(os.path.join(self.pipeline_dir, "*.json"))):
+                self.start(file_path)
+        finally:
+            if self.loop is not None:
+                self.loop.call_later(self.poll_interval, self.poll)
+
+    def start(self, file_path):
+        with open(file_path) as f:
+            d = json.load(f)
+        running_path = file_path + ".running"
+        os.replace(file_path, running_path)
+        try:
+            pipeline = build(d['factory'], d['params'])
+        except Exception:
+            os.replace(running_path, file_path[:-len(".json")] + ".failed")
+            raise
+        done = d.get('done', {})
+        pipeline.restore(done)
+        print("starting pipeline {} from {}{}".format(pipeline.name, file_path,
+                                                       ", already done: {}".format(sorted(done)) if done else ""))
+        pipeline.on_finish = lambda pipeline, stage_name: self.save(pipeline, d, running_path)
+        self.pipelines.append(pipeline)
+        pipeline.start(self.executor).add_done_callback(lambda f: self._done(pipeline, running_path))
+        return pipeline
+
+    def save(self, pipeline, request, running_path):
+        """
+        Save the results of the stages that are done in the request (results that aren't json are saved as str)
+        """
+        with self.lock:
+            request = dict(request, done=pipeline.done())
+            with open(running_path + ".tmp", 'w') as f:
+                json.dump(request, f, default=str)
+            os.replace(running_path + ".tmp", running_path)
+
+    def _done(self, pipeline, running_path):
+        if pipeline.errors:
+            os.replace(running_path, running_path[:-len(".json.running")] + ".failed")
+        else:
+            os.remove(running_path)
+        print("pipeline {} done: {}".format(pipeline.name, pipeline))
+
+    def status(self):
+        """
+        For the hub's "stages" command
+        """
+        return [(pipeline.name, pipeline.status()) for pipeline in self.pipelines]
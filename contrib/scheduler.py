@@ -0,0 +1,212 @@
+"""
+Hub job scheduler with per-source resource classes
+
+The hub's managers run their jobs in the event loop's default executor. A Scheduler is set as the default executor
+instead of a single process pool: each job is routed to the resource class of its source (config.HUB_SOURCES), and
+each resource class has its own pool of workers, so that e.g. a long network-bound bot run doesn't take the slot of
+a cpu-bound parse.
+
+Jobs queued in a class start in priority order (lower first), when a worker is free and the estimated memory of the
+running jobs plus theirs fits under the class' memory cap (a job bigger than the cap still runs alone). A job that
+starts its own processes takes as many workers of its class as its source's 'workers' says
+
+    scheduler = Scheduler.from_config(config)
+    loop.set_default_executor(scheduler)
+    scheduler.run("network", ProteinBot.main, version_info)  # explicit resource class
+    scheduler.status()
+"""
+import heapq
+import itertools
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from functools import partial
+
+DEFAULT_CLASSES = {"cpu": {"workers": 2}}
+
+
+def source_classes():
+    """
+    The biothings base classes of the uploaders and dumpers, () without biothings
+    """
+    try:
+        from biothings.dataload.dumper import BaseDumper
+        from biothings.dataload.uploader import BaseSourceUploader
+    except ImportError:
+        return ()
+    return BaseSourceUploader, BaseDumper
+
+
+def job_source(fn, args=()):
+    """
+    Name of the source a job is for: the `name` (or dumper SRC_NAME, or main_source) of the uploader/dumper class or
+    instance the job is a method of, or is called with (also through partials and bound methods in the arguments, e.g.
+    partial(storage.process, self.load_data)). None if there isn't one
+    """
+    bases = source_classes()
+    candidates = [fn] + list(args)
+    objs = []
+    while candidates:
+        obj = candidates.pop(0)
+        if isinstance(obj, partial):
+            candidates = [obj.func] + list(obj.args) + list(obj.keywords.values()) + candidates
+            continue
+        objs.append(obj)
+        if callable(obj) and getattr(obj, '__self__', None) is not None:
+            objs.append(obj.__self__)
+    for obj in objs:
+        # only uploaders and dumpers: any other object can have a `name`
+        if not (isinstance(obj, bases) or isinstance(obj, type) and issubclass(obj, bases)):
+            continue
+        for attr in ('name', 'SRC_NAME', 'main_source'):
+            value = getattr(obj, attr, None)
+            if isinstance(value, str):
+                return value
+    return None
+
+
+class ResourceClass:
+    def __init__(self, name, workers=1, priority=0, max_memory=None, executor=None):
+        self.name = name
+        self.workers = workers
+        self.priority = priority
+        self.max_memory = max_memory
+        self.executor = executor or ProcessPoolExecutor(workers)
+        self.running = []
+        self.memory = 0
+        # worker slots taken by the running jobs
+        self.busy = 0
+
+    def can_run(self, memory, workers=1):
+        if not self.running:
+            return True
+        if self.busy + workers > self.workers:
+            return False
+        return self.max_memory is None or self.memory + memory <= self.max_memory
+
+
+class Job:
+    def __init__(self, fn, args, kwargs, source, resource_class, memory, priority, workers=1):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.source = source
+        self.resource_class = resource_class
+        self.memory = memory
+        self.priority = priority
+        self.workers = workers
+        self.future = Future()
+
+    def __repr__(self):
+        return "<Job {} ({}, {}GB)>".format(self.source or getattr(self.fn, '__name__', self.fn),
+                                            self.resource_class.name, self.memory)
+
+
+class Scheduler(Executor):
+    def __init__(self, classes=None, sources=None, default_class=None):
+        """
+        :param classes: {name: {'workers': n, 'priority': p, 'max_memory': GB}}
+        :param sources: {source name: {'class': name, 'memory': GB, 'priority': p, 'workers': n}}, priority defaults
+            to the class'. workers: worker slots of the class a job takes, for jobs that start processes of their own
+            (default 1, None: all of them)
+        :param default_class: class of the jobs of sources that aren't in `sources`. Default: the first class
+        """
+        classes = classes or DEFAULT_CLASSES
+        self.classes = {name: ResourceClass(name, **conf) for name, conf in classes.items()}
+        self.sources = sources or {}
+        self.default_class = default_class or next(iter(classes))
+        self.queue = []
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(getattr(config, 'HUB_RESOURCE_CLASSES', None), getattr(config, 'HUB_SOURCES', None),
+                   getattr(config, 'HUB_DEFAULT_RESOURCE_CLASS', None))
+
+    def submit(self, fn, *args, **kwargs):
+        return self.submit_job(fn, args, kwargs)
+
+    def run(self, resource_class, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) in `resource_class`, whatever its source
+        """
+        return self.submit_job(fn, args, kwargs, resource_class=resource_class)
+
+    def submit_job(self, fn, args=(), kwargs=None, source=None, resource_class=None):
+        source = source or job_source(fn, args)
+        conf = self.sources.get(source, {})
+        rc = self.classes[resource_class or conf.get('class', self.default_class)]
+        job = Job(fn, args, kwargs or {}, source, rc, conf.get('memory', 0), conf.get('priority', rc.priority),
+                  min(conf.get('workers', 1) or rc.workers, rc.workers))
+        with self.lock:
+            heapq.heappush(self.queue, (job.priority, next(self.counter), job))
+        self._dispatch()
+        return job.future
+
+    def _dispatch(self):
+        started = []
+        with self.lock:
+            blocked = set()
+            queued = []
+            while self.queue:
+                item = heapq.heappop(self.queue)
+                job = item[2]
+                rc = job.resource_class
+                if job.future.cancelled():
+                    continue
+                # jobs don't overtake a queued job of their class that has a higher priority
+                if rc.name in blocked or not rc.can_run(job.memory, job.workers):
+                    blocked.add(rc.name)
+                    queued.append(item)
+                    continue
+                rc.running.append(job)
+                rc.memory += job.memory
+                rc.busy += job.workers
+                started.append(job)
+            for item in queued:
+                heapq.heappush(self.queue, item)
+        for job in started:
+            self._start(job)
+
+    def _start(self, job):
+        if not job.future.set_running_or_notify_cancel():
+            self._finish(job)
+            return
+        try:
+            inner = job.resource_class.executor.submit(job.fn, *job.args, **job.kwargs)
+        except Exception as e:
+            job.future.set_exception(e)
+            self._finish(job)
+            return
+        inner.add_done_callback(partial(self._done, job))
+
+    def _done(self, job, inner):
+        try:
+            job.future.set_result(inner.result())
+        except Exception as e:
+            job.future.set_exception(e)
+        finally:
+            self._finish(job)
+
+    def _finish(self, job):
+        with self.lock:
+            rc = job.resource_class
+            rc.running.remove(job)
+            rc.memory -= job.memory
+            rc.busy -= job.workers
+        self._dispatch()
+
+    def status(self):
+        """
+        {class: {'workers', 'running', 'queued', 'memory'}}. For the hub's "sched" command
+        """
+        with self.lock:
+            status = {name: {'workers': rc.workers, 'running': list(rc.running), 'queued': [], 'memory': rc.memory}
+                      for name, rc in self.classes.items()}
+            for _, _, job in sorted(self.queue):
+                status[job.resource_class.name]['queued'].append(job)
+        return status
+
+    def shutdown(self, wait=True):
+        for rc in self.classes.values():
+            rc.executor.shutdown(wait)
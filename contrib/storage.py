@@ -0,0 +1,56 @@
+"""
+Bulk loading of the uploaders' docs into mongo
+
+biothings' BasicStorage inserts the docs into the uploader's temp collection, which is then renamed over the live
+collection (switch_collection, an atomic renameCollection). BulkStorage does the same with unordered insert_many
+batches of config.MONGO_BULK_BATCH_SIZE docs, config.MONGO_BULK_THREADS batches in flight, and
+config.MONGO_BULK_WRITE_CONCERN. The collection's `indexes` are only built once all the docs are in, still on the
+temp collection, so the live collection is never without them:
+
+    class InterproProteinUploader(uploader.BaseSourceUploader):
+        storage_class = BulkStorage
+"""
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from biothings.dataload.storage import BasicStorage
+from pymongo import WriteConcern
+
+import config
+
+
+def insert_batch(collection, docs):
+    collection.insert_many(docs, ordered=False, bypass_document_validation=True)
+    return len(docs)
+
+
+class BulkStorage(BasicStorage):
+    # [(keys, index options)], e.g. [("release", {})], built after the load
+    indexes = []
+
+    def __init__(self, db, dest_col_name, logger=logging):
+        super().__init__(db, dest_col_name, logger)
+        self.batch_size = config.MONGO_BULK_BATCH_SIZE
+        self.threads = config.MONGO_BULK_THREADS
+        self.write_concern = WriteConcern(**config.MONGO_BULK_WRITE_CONCERN)
+
+    def process(self, doc_d, batch_size):
+        collection = self.temp_collection.with_options(write_concern=self.write_concern)
+        self.logger.info("Bulk loading {} by batches of {}...".format(collection.name, self.batch_size))
+        total = 0
+        with ThreadPoolExecutor(self.threads) as executor:
+            pending = deque()
+            for doc_li in self.doc_iterator(doc_d, batch=True, batch_size=self.batch_size or batch_size):
+                if len(pending) >= self.threads * 2:
+                    total += pending.popleft().result()
+                pending.append(executor.submit(insert_batch, collection, doc_li))
+            while pending:
+                total += pending.popleft().result()
+        self.create_indexes(self.temp_collection)
+        return total
+
+    def create_indexes(self, collection):
+        for keys, options in self.indexes:
+            self.logger.info("Creating index {} on {}".format(keys, collection.name))
+            collection.create_index(keys, background=False, **options)
@@ -0,0 +1,357 @@
+"""
+Offline snapshot of the wikidata claims the bots compare against
+
+The bots' id mappings (PBB_Helpers.id_mapper) and fast run containers query the sparql endpoint, for millions of
+items with {UNIPROT: ''}. This builds a local snapshot from a wikidata JSON dump instead, keeping only the items
+that have one of the `properties`, and only the claims on those properties:
+
+    python -m contrib.wd_snapshot latest-all.json.gz wd_snapshot.jsonl.gz
+
+One line per item: {"id": "Q123", "claims": {"P352": [["<statement id>", "P12345"], ...], ...},
+                   "labels": {"en": "..."}, "descriptions": {"en": "..."}, "aliases": {"en": ["...", ...]}}
+
+    snapshot = Snapshot("wd_snapshot.jsonl.gz")
+    snapshot.id_mapper("P352", (("P703", "Q15978631"),))  # same as PBB_Helpers.id_mapper, without the network
+    snapshot.install()  # make the id mappers, the fast run containers and sparql lookups read from the snapshot
+
+The bots install config.WD_SNAPSHOT with install_configured(). Full items aren't in the snapshot: a write still
+loads the item from wikidata, and a dry run (offline) reports the items that would need one as needs_online_check.
+The release items the references point to aren't in it either: their lookups still go to the sparql endpoint.
+"""
+import argparse
+import bz2
+import gzip
+import importlib
+import json
+import multiprocessing
+import os
+import re
+import threading
+from urllib.parse import urlparse
+
+import requests
+from tqdm import tqdm
+
+# properties used by the bots, in their __metadata__ and fast run base filters
+PROPERTIES = ['P279', 'P361', 'P527', 'P2926', 'P352', 'P703', 'P699', 'P2892', 'P351', 'P2393', 'P594', 'P644',
+              'P645', 'P1057', 'P2548', 'P705', 'P637', 'P686', 'P688', 'P702', 'P2249']
+CHUNK_SIZE = 1000
+# languages of the labels, descriptions and aliases kept, for the fast run containers' language checks
+LANGUAGES = ['en']
+LANG_KEYS = {'label': 'labels', 'description': 'descriptions', 'aliases': 'aliases'}
+ENTITY_URI = "http://www.wikidata.org/entity/"
+SPARQL_HOST = "query.wikidata.org"
+# mediawiki api actions that load entities
+READ_ACTIONS = ('wbgetentities',)
+# the sparql lookup of IPRTerm.get_wdid
+LOOKUP_QUERY = re.compile(r'^SELECT \?item WHERE \{ \?item wdt:(P\d+) "([^"]*)" \}$')
+# the sparql lookup of PBB_Helpers.Release.get_or_create (edition of, edition number)
+RELEASE_QUERY_PROPS = ('wdt:P629', 'wdt:P393')
+# modules of the WDHelper class the mondo and mygene bots use
+WDHELPER_MODULES = ['WDHelper', 'interproscan.WDHelper']
+
+
+def open_dump(file_path):
+    if file_path.endswith(".bz2"):
+        return bz2.open(file_path, 'rt')
+    if file_path.endswith(".gz"):
+        return gzip.open(file_path, 'rt')
+    return open(file_path)
+
+
+def iter_chunks(f, chunk_size=CHUNK_SIZE):
+    # the dump is a json list with one entity per line
+    chunk = []
+    for line in f:
+        if line[0] in "[]":
+            continue
+        chunk.append(line)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def snak_value(snak):
+    if snak['snaktype'] != 'value':
+        return None
+    value = snak['datavalue']['value']
+    if isinstance(value, str):
+        return value
+    if 'numeric-id' in value:
+        return "Q{}".format(value['numeric-id'])
+    if 'time' in value:
+        return value['time']
+    if 'amount' in value:
+        return value['amount']
+    return None
+
+
+def extract(line, properties):
+    """
+    Returns {'id': qid, 'claims': {prop: [[statement_id, value], ...]}, 'labels': {lang: label}, 'descriptions': ...,
+    'aliases': {lang: [alias, ...]}} or None if the entity has none of the properties
+    """
+    # most entities don't have any of the properties, skip them without parsing the json
+    if not any('"{}"'.format(prop) in line for prop in properties):
+        return None
+    entity = json.loads(line.rstrip().rstrip(","))
+    claims = {}
+    for prop in properties:
+        values = []
+        for claim in entity.get('claims', {}).get(prop, []):
+            if claim.get('rank') == 'deprecated':
+                continue
+            value = snak_value(claim['mainsnak'])
+            if value is not None:
+                values.append([claim['id'], value])
+        if values:
+            claims[prop] = values
+    if not claims:
+        return None
+    item = {'id': entity['id'], 'claims': claims}
+    for key in LANG_KEYS.values():
+        values = entity.get(key, {})
+        item[key] = {lang: [x['value'] for x in values[lang]] if key == 'aliases' else values[lang]['value']
+                     for lang in LANGUAGES if lang in values}
+    return item
+
+
+def _extract_chunk(task):
+    chunk, properties = task
+    return [x for x in (extract(line, properties) for line in chunk) if x]
+
+
+def build_snapshot(dump_path, snapshot_path, properties=PROPERTIES, processes=None):
+    """
+    Stream a wikidata json dump (.json, .json.gz or .json.bz2) and write the snapshot. The json is parsed by a pool
+    of `processes` workers
+    """
+    tmp_path = snapshot_path + ".tmp"
+    n = 0
+    with open_dump(dump_path) as f, gzip.open(tmp_path, 'wt', compresslevel=1) as out, \
+            multiprocessing.Pool(processes) as pool:
+        tasks = ((chunk, properties) for chunk in iter_chunks(f))
+        for items in tqdm(pool.imap(_extract_chunk, tasks), miniters=1000):
+            for item in items:
+                out.write(json.dumps(item) + "\n")
+            n += len(items)
+    os.replace(tmp_path, snapshot_path)
+    print("wrote {} items to {}".format(n, snapshot_path))
+
+
+class OfflineError(Exception):
+    """
+    A bot that reads from a snapshot asked wikidata for something the snapshot can't answer
+    """
+
+
+def _request_params(args, kwargs):
+    # requests.Session.request(method, url, params=None, data=None, ...)
+    return [kwargs.get('params', args[0] if args else None), kwargs.get('data', args[1] if len(args) > 1 else None)]
+
+
+def is_release_query(query):
+    return all(prop in query for prop in RELEASE_QUERY_PROPS)
+
+
+def reads_wikidata(url, params, data, offline=False):
+    """
+    True if a request reads what the snapshot replaces: a sparql query other than a release lookup, or an entity
+    load when `offline`
+    """
+    host = urlparse(url).netloc
+    if host == SPARQL_HOST:
+        return not any(isinstance(d, dict) and is_release_query(d.get('query', '')) for d in (params, data))
+    if offline and host.endswith("wikidata.org"):
+        return any(isinstance(d, dict) and d.get('action') in READ_ACTIONS for d in (params, data))
+    return False
+
+
+class Snapshot:
+    """
+    The snapshot is streamed from disk on every query, only the results are kept in memory (as they would be when
+    read from the sparql endpoint)
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        # {prop: {value: qid}}, for execute_sparql_query
+        self.lookups = {}
+        self.lock = threading.Lock()
+        # the endpoint's execute_sparql_query, for the release lookups. set by install
+        self.sparql = None
+
+    def items(self, properties=()):
+        """
+        Items of the snapshot that have all the `properties`
+        """
+        keys = ['"{}"'.format(prop) for prop in properties]
+        with gzip.open(self.file_path, 'rt') as f:
+            for line in f:
+                # skip the items without the properties without parsing the json
+                if all(key in line for key in keys):
+                    yield json.loads(line)
+
+    @staticmethod
+    def values(claims, prop):
+        return [value for _, value in claims.get(prop, [])]
+
+    @staticmethod
+    def filter_props(filters):
+        filters = filters.items() if isinstance(filters, dict) else (filters or ())
+        return [prop for prop, _ in filters]
+
+    def matches(self, claims, filters):
+        """
+        filters: ((prop, value), ...) or {prop: value}. An empty value means any value
+        """
+        filters = filters.items() if isinstance(filters, dict) else filters
+        return all(prop in claims and (not value or value in self.values(claims, prop)) for prop, value in filters)
+
+    def id_mapper(self, prop, filters=None):
+        """
+        {value of prop: qid} for the items that match `filters`, like PBB_Helpers.id_mapper
+        """
+        d = {}
+        for item in self.items([prop] + self.filter_props(filters)):
+            claims = item['claims']
+            if prop not in claims or (filters and not self.matches(claims, filters)):
+                continue
+            for _, value in claims[prop]:
+                d[value] = item['id']
+        return d
+
+    def query_data(self, container, prop_nr):
+        """
+        Fill a PBB_fastrun.FastRunContainer's prop_data and rev_lookup for prop_nr, as its _query_data does from
+        the sparql endpoint
+        """
+        for item in self.items([prop_nr] + self.filter_props(container.base_filter)):
+            claims = item['claims']
+            if prop_nr not in claims or not self.matches(claims, container.base_filter):
+                continue
+            prop_data = container.prop_data.setdefault(item['id'], {}).setdefault(prop_nr, {})
+            for statement_id, value in claims[prop_nr]:
+                prop_data[statement_id] = {'v': value, 'ref': {}, 'qual': set()}
+                container.rev_lookup[value].add(item['id'])
+
+    def query_lang(self, container, lang, lang_data_type):
+        """
+        sparql bindings of the labels, descriptions or aliases in `lang` of the items that match the container's
+        base filter, as its _query_lang returns them
+        """
+        key = LANG_KEYS[lang_data_type]
+        if lang not in LANGUAGES:
+            raise OfflineError("{} only has {} in {}".format(self.file_path, key, ", ".join(LANGUAGES)))
+        bindings = []
+        with_lang = False
+        for item in self.items(self.filter_props(container.base_filter)):
+            with_lang = with_lang or key in item
+            if not self.matches(item['claims'], container.base_filter):
+                continue
+            values = item.get(key, {}).get(lang, [])
+            for value in values if isinstance(values, list) else [values]:
+                bindings.append({'item': {'value': ENTITY_URI + item['id']}, 'label': {'value': value}})
+        if not with_lang:
+            raise OfflineError("{} was built without {}, rebuild it".format(self.file_path, key))
+        return bindings
+
+    def execute_sparql_query(self, query, *args, **kwargs):
+        """
+        Answers the single item lookups of IPRTerm.get_wdid, passes the release lookups on to the endpoint, raises
+        OfflineError for any other query
+        """
+        if self.sparql and is_release_query(query):
+            return self.sparql(query, *args, **kwargs)
+        match = LOOKUP_QUERY.match(query.strip())
+        if not match:
+            raise OfflineError("sparql query with a wikidata snapshot installed: {}".format(query))
+        prop, value = match.groups()
+        with self.lock:
+            if prop not in self.lookups:
+                self.lookups[prop] = self.id_mapper(prop)
+        qid = self.lookups[prop].get(value)
+        return {'results': {'bindings': [{'item': {'value': ENTITY_URI + qid}}] if qid else []}}
+
+    def install(self, offline=False):
+        """
+        Make the id mappers (PBB_Helpers.id_mapper, WDHelper().id_mapper), the fast run containers and the sparql
+        queries of this process read from the snapshot. Anything else reading wikidata's sparql endpoint (but the
+        release lookups) raises OfflineError. If `offline` (dry runs), entities aren't loaded either: an item that
+        needs a write gets an empty entity and needs_online_check, which dry_run.DryRun reports
+        """
+        from ProteinBoxBot_Core import PBB_Core, PBB_Helpers, PBB_fastrun
+        snapshot = self
+
+        def id_mapper(helper, prop, filters=None, *args, **kwargs):
+            return snapshot.id_mapper(prop, filters)
+
+        def _query_data(container, prop_nr):
+            snapshot.query_data(container, prop_nr)
+
+        def _query_lang(container, lang, lang_data_type):
+            return snapshot.query_lang(container, lang, lang_data_type)
+
+        def request(session, method, url, *args, **kwargs):
+            if reads_wikidata(url, *_request_params(args, kwargs), offline=offline):
+                raise OfflineError("{} {} with a wikidata snapshot installed".format(method, url))
+            return _session_request(session, method, url, *args, **kwargs)
+
+        def execute_sparql_query(query, *args, **kwargs):
+            return snapshot.execute_sparql_query(query, *args, **kwargs)
+
+        def get_wd_entity(item, *args, **kwargs):
+            item.needs_online_check = True
+            return {'id': item.wd_item_id, 'labels': {}, 'descriptions': {}, 'aliases': {}, 'claims': {},
+                    'sitelinks': {}}
+
+        engine = PBB_Core.WDItemEngine
+        # the loader installed before any snapshot
+        get_wd_entity.online = getattr(engine.get_wd_entity, 'online', engine.get_wd_entity)
+
+        PBB_Helpers.id_mapper = self.id_mapper
+        for name in WDHELPER_MODULES:
+            try:
+                module = importlib.import_module(name)
+            except ImportError:
+                continue
+            module.WDHelper.id_mapper = id_mapper
+        PBB_fastrun.FastRunContainer._query_data = _query_data
+        PBB_fastrun.FastRunContainer._query_lang = _query_lang
+        # the endpoint's, not the one of a snapshot installed before
+        self.sparql = getattr(engine.execute_sparql_query, 'endpoint', engine.execute_sparql_query)
+        execute_sparql_query.endpoint = self.sparql
+        engine.execute_sparql_query = staticmethod(execute_sparql_query)
+        engine.get_wd_entity = get_wd_entity if offline else get_wd_entity.online
+        requests.Session.request = request
+
+
+_session_request = requests.Session.request
+_installed = None
+
+
+def install_configured(offline=False):
+    """
+    Install the snapshot in config.WD_SNAPSHOT, once per process. Returns it, or None if there is none
+    """
+    import config
+    global _installed
+    if not config.WD_SNAPSHOT:
+        return None
+    if _installed is None or _installed[0] != (config.WD_SNAPSHOT, offline):
+        snapshot = Snapshot(config.WD_SNAPSHOT)
+        snapshot.install(offline=offline)
+        _installed = ((config.WD_SNAPSHOT, offline), snapshot)
+    return _installed[1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='build an offline snapshot of wikidata from a json dump')
+    parser.add_argument('dump', help='wikidata json dump (.json, .json.gz, .json.bz2)')
+    parser.add_argument('snapshot', help='snapshot file to write (.jsonl.gz)')
+    parser.add_argument('--properties', help='comma separated properties to keep', default=",".join(PROPERTIES))
+    parser.add_argument('--processes', type=int, help='number of parsing processes (default: one per cpu)')
+    args = parser.parse_args()
+    build_snapshot(args.dump, args.snapshot, properties=args.properties.split(","), processes=args.processes)
@@ -0,0 +1,231 @@
+"""
+Concurrent, rate-limited writes of WDItemEngine items
+
+Bots build their items in the main thread and hand them to a WriteExecutor, which writes up to `max_workers` items
+at a time. The API etiquette is one request at a time, so this is opt-in (config.WD_WRITE_THREADS). Writes are
+spaced by a delay shared by all threads: it grows when the API says we're going too fast (maxlag, ratelimited,
+HTTP 429/503, honoring Retry-After), and decays back to `min_delay` as writes go through. On top of that, each
+thread waits `thread_delay` between the starts of its own writes.
+
+The write functions (PBB_Helpers.try_write by default) are called as usual, only wd_item.write is wrapped with the
+throttling and retries, so the logging is the same as when writing sequentially.
+
+    with WriteExecutor(max_workers=4) as executor:
+        for wd_item, record_id in items:
+            executor.write(wd_item, record_id, INTERPRO, login, edit_summary="...")
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics
+
+RATE_LIMIT_CODES = {'maxlag', 'ratelimited'}
+RATE_LIMIT_STATUS = {429, 503}
+# seconds between the starts of two writes, of any thread / of the same thread
+MIN_DELAY = 0.25
+THREAD_DELAY = 1
+
+
+def try_write(wd_item, record_id, record_prop, login, executor=None, **kwargs):
+    """
+    PBB_Helpers.try_write, queued on `executor` if there is one
+    """
+    if executor is None:
+        from ProteinBoxBot_Core import PBB_Helpers
+        count_action(wd_item)
+        return PBB_Helpers.try_write(timed(wd_item), record_id, record_prop, login, **kwargs)
+    return executor.write(wd_item, record_id, record_prop, login, **kwargs)
+
+
+def timed(wd_item):
+    """
+    Wrap wd_item.write to observe its latency
+    """
+    write = wd_item.write
+    latency = metrics.histogram("wd_write_seconds")
+
+    def timed_write(*args, **kwargs):
+        with latency.time():
+            return write(*args, **kwargs)
+
+    wd_item.write = timed_write
+    return wd_item
+
+
+def count_action(wd_item):
+    """
+    Count whether writing wd_item creates, updates or skips it (no change)
+    """
+    if not wd_item.require_write:
+        action = "skip"
+    elif wd_item.create_new_item:
+        action = "create"
+    else:
+        action = "update"
+    metrics.counter("wd_items_total", action=action).inc()
+
+
+def retry_after(e):
+    """
+    If `e` means we're being rate limited, return how long to wait in seconds (0 if the API didn't say), else None
+    """
+    response = getattr(e, 'response', None)
+    if response is not None and getattr(response, 'status_code', None) in RATE_LIMIT_STATUS:
+        try:
+            return float(response.headers.get('Retry-After', 0))
+        except ValueError:
+            return 0
+    error = getattr(e, 'wd_error_msg', None)
+    if isinstance(error, dict) and error.get('error', {}).get('code') in RATE_LIMIT_CODES:
+        try:
+            return float(error['error'].get('lag', 0))
+        except (TypeError, ValueError):
+            return 0
+    return None
+
+
+class RateLimiter:
+    """
+    Spaces out the start of requests by `delay`, and the requests of each thread by `thread_delay`. The delay
+    doubles on backoff() and decays on success(), never below min_delay. Requests that were already started when
+    the delay was last doubled don't double it again
+    """
+
+    def __init__(self, min_delay=MIN_DELAY, thread_delay=THREAD_DELAY, max_delay=60, backoff_delay=1, decay=0.9,
+                 sleep=time.sleep, clock=time.monotonic):
+        self.min_delay = min_delay
+        self.thread_delay = thread_delay
+        self.max_delay = max_delay
+        self.backoff_delay = backoff_delay
+        self.decay = decay
+        self.delay = min_delay
+        self.sleep = sleep
+        self.clock = clock
+        self.next_start = 0
+        self.last_backoff = None
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def wait(self):
+        """
+        Wait for our turn. Returns the start time, to pass to backoff()
+        """
+        with self.lock:
+            now = self.clock()
+            start = max(now, self.next_start, getattr(self.local, 'next_start', now))
+            self.next_start = start + self.delay
+            self.local.next_start = start + self.thread_delay
+        if start > now:
+            self.sleep(start - now)
+        return start
+
+    def backoff(self, wait=0, started=None):
+        with self.lock:
+            now = self.clock()
+            if started is None or self.last_backoff is None or started >= self.last_backoff:
+                self.delay = min(max(self.delay * 2, self.backoff_delay), self.max_delay)
+                self.last_backoff = now
+            self.next_start = max(self.next_start, now + max(wait, self.delay))
+
+    def success(self):
+        with self.lock:
+            self.delay = max(self.delay * self.decay, self.min_delay)
+            if self.delay < self.min_delay + 0.01:
+                self.delay = self.min_delay
+
+
+class WriteExecutor:
+    def __init__(self, max_workers=4, max_retries=10, limiter=None):
+        self.max_retries = max_retries
+        self.limiter = limiter or RateLimiter()
+        self.pool = ThreadPoolExecutor(max_workers)
+        # bound the number of queued items (they hold all their statements)
+        self.slots = threading.BoundedSemaphore(max_workers * 2)
+        self.futures = set()
+        self.error = None
+        self.lock = threading.Lock()
+        self.n_throttled = 0
+
+    def throttle(self, wd_item):
+        """
+        Wrap wd_item.write: wait for the rate limiter, retry when rate limited
+        """
+        write = timed(wd_item).write
+
+        def throttled_write(*args, **kwargs):
+            for n in range(self.max_retries + 1):
+                started = self.limiter.wait()
+                try:
+                    result = write(*args, **kwargs)
+                except Exception as e:
+                    wait = retry_after(e)
+                    if wait is None or n == self.max_retries:
+                        raise
+                    with self.lock:
+                        self.n_throttled += 1
+                    metrics.counter("wd_write_throttled_total").inc()
+                    self.limiter.backoff(wait, started)
+                    continue
+                self.limiter.success()
+                return result
+
+        wd_item.write = throttled_write
+        return wd_item
+
+    def submit(self, fn, wd_item, *args, record_id=None, **kwargs):
+        """
+        Run fn(wd_item, *args, **kwargs) in the pool, with wd_item.write throttled. Blocks while the queue is full
+
+        :param record_id: id of the record the item is made from, for a dry_run.DryRun. Not passed to fn
+        """
+        count_action(wd_item)
+        self.slots.acquire()
+        try:
+            future = self.pool.submit(fn, self.throttle(wd_item), *args, **kwargs)
+        except Exception:
+            self.slots.release()
+            raise
+        with self.lock:
+            self.futures.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self.lock:
+            self.futures.discard(future)
+            if self.error is None and not future.cancelled() and future.exception() is not None:
+                self.error = future.exception()
+        self.slots.release()
+
+    def write(self, wd_item, record_id, record_prop, login, **kwargs):
+        """
+        PBB_Helpers.try_write(wd_item, record_id, record_prop, login, **kwargs), in the pool
+        """
+        from ProteinBoxBot_Core import PBB_Helpers
+        return self.submit(PBB_Helpers.try_write, wd_item, record_id, record_prop, login, **kwargs)
+
+    def join(self):
+        """
+        Wait for all submitted writes. Raises the first exception a write function raised
+        """
+        with self.lock:
+            futures = list(self.futures)
+        errors = [future.exception() for future in futures]
+        with self.lock:
+            error, self.error = self.error, None
+        error = error or next((e for e in errors if e is not None), None)
+        if error is not None:
+            raise error
+
+    def shutdown(self):
+        try:
+            self.join()
+        finally:
+            self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
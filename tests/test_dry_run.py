@@ -0,0 +1,85 @@
+import copy
+
+from contrib.dry_run import PLACEHOLDER_QID, DryRun, keep_loaded_entities, statement_diff
+
+
+def claim(prop, qid):
+    return {'mainsnak': {'snaktype': 'value', 'property': prop,
+                         'datavalue': {'value': {'entity-type': 'item', 'numeric-id': int(qid[1:])}}}}
+
+
+class Item:
+    """
+    Behaves like a WDItemEngine: the entity is loaded into wd_json_representation, and the new data is applied to
+    that same dict
+    """
+    entities = {}
+
+    def __init__(self, new, require_write=True, qid="Q1"):
+        self.wd_item_id = qid
+        self.create_new_item = qid not in self.entities
+        self.wd_json_representation = {'claims': {}} if self.create_new_item else self.get_wd_entity()
+        self.wd_json_representation['claims'].update(copy.deepcopy(new))
+        self.require_write = require_write
+
+    def get_wd_entity(self):
+        return copy.deepcopy(self.entities[self.wd_item_id])
+
+    def get_wd_json_representation(self):
+        return self.wd_json_representation
+
+
+class Release:
+    def __init__(self, title, qid=None):
+        self.title = title
+        self.qid = qid
+        self.logins = []
+
+    def get_or_create(self, login=None):
+        self.logins.append(login)
+        if self.qid is None and login is None:
+            raise ValueError("no release {}".format(self.title))
+        return self.qid
+
+
+def new_dry_run(monkeypatch, **kwargs):
+    monkeypatch.setattr(Item, "entities", {'Q1': {'claims': {'P279': [claim('P279', 'Q10')]}},
+                                           'Q2': {'claims': {}}})
+    monkeypatch.setattr(Item, "get_wd_entity", Item.get_wd_entity)
+    return DryRun(engine=Item, **kwargs)
+
+
+def test_statement_diff(monkeypatch):
+    new_dry_run(monkeypatch)
+    item = Item({'P279': [claim('P279', 'Q11')], 'P527': [claim('P527', 'Q12')]})
+    diff = statement_diff(item)
+    assert sorted(diff) == ['P279', 'P527']
+    assert len(diff['P279']['added']) == 1 and len(diff['P279']['removed']) == 1
+    assert diff['P527']['removed'] == []
+    # the entity is only wrapped once
+    keep_loaded_entities(Item)
+    assert statement_diff(Item({'P279': [claim('P279', 'Q10')]})) == {}
+
+
+def test_dry_run_report(monkeypatch):
+    dry_run = new_dry_run(monkeypatch, n_samples=1)
+    dry_run.submit(None, Item({'P279': [claim('P279', 'Q10')]}, qid="Q2"), "login", record_id="IPR000001")
+    dry_run.write(Item({}, require_write=False), "IPR000002", "P2926", "login")
+    other = DryRun()
+    other.write(Item({}, qid=None), "IPR000003", "P2926", "login")
+    report = dry_run.merge(other).report()
+    assert report['items'] == {'update': 1, 'skip': 1, 'create': 1}
+    assert report['properties'] == {'P279': {'added': 1, 'removed': 0}}
+    assert [x['id'] for x in report['samples']] == ["IPR000001"]
+
+
+def test_release_is_not_created(monkeypatch):
+    dry_run = new_dry_run(monkeypatch)
+    existing, missing = Release("InterPro Release 59.0", "Q3"), Release("InterPro Release 60.0")
+    assert dry_run.release_qid(existing) == "Q3"
+    assert dry_run.release_qid(missing) == dry_run.release_qid(missing) == PLACEHOLDER_QID
+    # looked up once, never with a login
+    assert missing.logins == [None]
+    other = DryRun()
+    other.release_qid(Release("ensembl Release 86"))
+    assert dry_run.merge(other).report()['would_create'] == ["InterPro Release 60.0", "ensembl Release 86"]
@@ -0,0 +1,67 @@
+import gzip
+import os
+
+import pytest
+
+from contrib.interpro import cache
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    calls = []
+
+    def parse_interpro_xml(data_folder):
+        calls.append(data_folder)
+        with gzip.open(os.path.join(data_folder, "interpro.xml.gz"), 'rt') as f:
+            return [{'id': line.strip()} for line in f]
+
+    monkeypatch.setattr(cache, "parse_interpro_xml", parse_interpro_xml)
+    monkeypatch.setattr(cache, "parse_release_info", lambda data_folder: [{'_id': "INTERPRO", 'version': "60.0"}])
+    return calls
+
+
+def write_xml(data_folder, ids):
+    os.makedirs(str(data_folder), exist_ok=True)
+    with gzip.open(str(data_folder / "interpro.xml.gz"), 'wt') as f:
+        f.write("".join(x + "\n" for x in ids))
+
+
+def cache_files(cache_dir):
+    return sorted(x for x in os.listdir(str(cache_dir)) if x.endswith(".pickle"))
+
+
+def test_cache_hit(tmp_path, parses):
+    write_xml(tmp_path / "60.0", ["IPR000001"])
+    parsed = cache.load_interpro(str(tmp_path / "60.0"), cache_dir=str(tmp_path / "cache"))
+    assert parsed['entries'] == [{'id': "IPR000001"}]
+    assert cache.load_interpro(str(tmp_path / "60.0"), cache_dir=str(tmp_path / "cache")) == parsed
+    assert len(parses) == 1
+
+
+def test_new_file_invalidates(tmp_path, parses):
+    data_folder, cache_dir = tmp_path / "60.0", str(tmp_path / "cache")
+    write_xml(data_folder, ["IPR000001"])
+    cache.load_interpro(str(data_folder), cache_dir=cache_dir)
+    old_cache = cache_files(cache_dir)
+    sha1 = cache.file_digest(str(data_folder / "interpro.xml.gz"))
+    write_xml(data_folder, ["IPR000001", "IPR000002"])
+    # (a different mtime even within the filesystem's timestamp resolution)
+    os.utime(str(data_folder / "interpro.xml.gz"), (0, 0))
+    assert cache.interpro_entries(str(data_folder), cache_dir=cache_dir) == [{'id': "IPR000001"}, {'id': "IPR000002"}]
+    assert len(parses) == 2
+    # the sidecar has the new sha1, and the old cache is gone
+    assert cache.file_digest(str(data_folder / "interpro.xml.gz")) != sha1
+    assert len(cache_files(cache_dir)) == 1 and cache_files(cache_dir) != old_cache
+
+
+def test_corrupt_cache(tmp_path, parses):
+    write_xml(tmp_path, ["IPR000001"])
+    cache.load_interpro(str(tmp_path))
+    cache_path, = [os.path.join(str(tmp_path), x) for x in cache_files(tmp_path)]
+    with open(cache_path, 'r+b') as f:
+        f.truncate(10)
+    assert cache.interpro_entries(str(tmp_path)) == [{'id': "IPR000001"}]
+    assert len(parses) == 2
+    # rewritten
+    assert cache.interpro_entries(str(tmp_path)) == [{'id': "IPR000001"}]
+    assert len(parses) == 2
@@ -0,0 +1,78 @@
+import gzip
+import os
+
+import pytest
+
+from contrib.interpro.delta import fingerprint, iter_snapshot, protein_delta
+
+
+def doc(uniprot_id, subclass=(), has_part=()):
+    return {'_id': uniprot_id, 'subclass': list(subclass), 'has_part': list(has_part)}
+
+
+def run_delta(tmp_path, previous_docs, docs, release="2"):
+    previous_path = str(tmp_path / "previous.snapshot.gz")
+    snapshot_path = str(tmp_path / "new.snapshot.gz")
+    if previous_docs is not None:
+        with gzip.open(previous_path, 'wt') as f:
+            for d in previous_docs:
+                f.write("{}\t{}\n".format(d['_id'], fingerprint(d)))
+    delta = list(protein_delta(iter(docs), previous_path, snapshot_path, release))
+    return delta, snapshot_path
+
+
+def test_fingerprint_ignores_order():
+    assert fingerprint(doc("P1", ["IPR1", "IPR2"], ["IPR3"])) == fingerprint(doc("P1", ["IPR2", "IPR1"], ["IPR3"]))
+    # subclass and has_part aren't mixed up
+    assert fingerprint(doc("P1", ["IPR1"])) != fingerprint(doc("P1", has_part=["IPR1"]))
+
+
+def test_merge_join(tmp_path):
+    previous = [doc("P0"), doc("P1", ["IPR1"]), doc("P2", ["IPR1"]), doc("P4", ["IPR2"]), doc("P6"), doc("P7")]
+    docs = [doc("P1", ["IPR1"]), doc("P2", ["IPR2"]), doc("P3", ["IPR1"]), doc("P4", ["IPR2"]), doc("P5")]
+    delta, snapshot_path = run_delta(tmp_path, previous, docs)
+    assert [(x['_id'], x['status']) for x in delta] == [
+        ("P0", 'removed'), ("P2", 'changed'), ("P3", 'added'), ("P5", 'added'), ("P6", 'removed'),
+        ("P7", 'removed')]
+    assert all(x['release'] == "2" for x in delta)
+    assert delta[1]['subclass'] == ["IPR2"]
+    # the new snapshot has every protein of this release
+    assert list(iter_snapshot(snapshot_path)) == [(d['_id'], fingerprint(d)) for d in docs]
+
+
+def test_no_previous_snapshot(tmp_path):
+    docs = [doc("P1"), doc("P2", ["IPR1"])]
+    delta, _ = run_delta(tmp_path, None, docs)
+    assert [(x['_id'], x['status']) for x in delta] == [("P1", 'added'), ("P2", 'added')]
+
+
+def test_same_release_no_delta(tmp_path):
+    docs = [doc("P{}".format(n), ["IPR{}".format(n % 3)]) for n in range(10)]
+    delta, _ = run_delta(tmp_path, [dict(d) for d in docs], docs)
+    assert delta == []
+
+
+def test_unsorted_docs(tmp_path):
+    with pytest.raises(ValueError):
+        run_delta(tmp_path, [], [doc("P2"), doc("P1")])
+
+
+def test_unsorted_docs_leave_collection_unchanged(tmp_path):
+    previous = [doc("P1"), doc("P4", ["IPR1"])]
+    collection = {d['_id']: d for d in previous}
+    previous_path = str(tmp_path / "previous.snapshot.gz")
+    with gzip.open(previous_path, 'wt') as f:
+        for d in previous:
+            f.write("{}\t{}\n".format(d['_id'], fingerprint(d)))
+    snapshot_path = str(tmp_path / "new.snapshot.gz")
+    docs = [doc("P2", ["IPR1"]), doc("P4", ["IPR2"]), doc("P3")]
+    # applied as DeltaStorage does, as the delta is yielded
+    with pytest.raises(ValueError):
+        for x in protein_delta(iter(docs), previous_path, snapshot_path, "2"):
+            if x['status'] == 'removed':
+                del collection[x['_id']]
+            else:
+                collection[x['_id']] = x
+    assert collection == {d['_id']: d for d in previous}
+    # no snapshot of a release that wasn't applied, no leftovers
+    assert sorted(os.listdir(str(tmp_path))) == ["previous.snapshot.gz"]
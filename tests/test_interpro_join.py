@@ -0,0 +1,77 @@
+import pytest
+
+for module in ("ProteinBoxBot_Core", "pymongo", "dateutil", "local"):
+    pytest.importorskip(module)
+from contrib.interpro.ProteinBot import iter_docs_batched, iter_docs_merged  # noqa: E402
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction):
+        self.docs = sorted(self.docs, key=lambda x: x[key], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.docs:
+            raise StopIteration
+        return self.docs.pop(0)
+
+    def close(self):
+        pass
+
+
+class Collection:
+    """
+    find() with equality, $gt and $lte filters
+    """
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = []
+
+    def find(self, query, **kwargs):
+        self.queries.append(query)
+
+        def match(doc):
+            for key, value in query.items():
+                if not isinstance(value, dict):
+                    if doc[key] != value:
+                        return False
+                elif ('$gt' in value and not doc[key] > value['$gt']) or \
+                        ('$lte' in value and not doc[key] <= value['$lte']):
+                    return False
+            return True
+
+        return Cursor([doc for doc in self.docs if match(doc)])
+
+
+@pytest.fixture
+def collection():
+    return Collection([{'_id': "P{:05d}".format(n), 'release': str(n % 5)} for n in range(999, 0, -2)])
+
+
+@pytest.mark.parametrize("query", [{}, {'release': "1"}])
+def test_batched_same_as_merged(collection, query):
+    uniprot2wd = {"P{:05d}".format(n): "Q{}".format(n) for n in range(0, 600, 3)}
+    expected = sorted((doc for doc in collection.docs
+                       if doc['_id'] in uniprot2wd and all(doc[k] == v for k, v in query.items())),
+                      key=lambda x: x['_id'])
+    assert expected
+    assert list(iter_docs_merged(collection, dict(query), uniprot2wd)) == expected
+    assert list(iter_docs_batched(collection, dict(query), uniprot2wd, batch_size=7)) == expected
+    # the pages are _id range queries, up to the largest wanted id
+    assert all(x['_id']['$lte'] == "P00597" for x in collection.queries[1:])
+
+
+def test_batched_nothing_wanted(collection):
+    assert list(iter_docs_batched(collection, {}, {})) == []
+    assert collection.queries == []
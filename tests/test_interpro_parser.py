@@ -0,0 +1,94 @@
+import gzip
+import os
+import random
+
+import pytest
+
+from contrib.interpro import parser
+from contrib.interpro.parser import IprIndex, build_protein_index, parse_protein_ipr, parse_protein_ipr_parallel
+
+IPR_ITEMS = [
+    {'id': 'IPR000001', 'type': 'Family'},
+    {'id': 'IPR000002', 'type': 'Family', 'parent': 'IPR000001'},
+    {'id': 'IPR000003', 'type': 'Domain'},
+    {'id': 'IPR000004', 'type': 'Repeat'},
+]
+
+
+def write_protein2ipr(file_path, n_proteins, seed=0, trailing_newline=True):
+    rnd = random.Random(seed)
+    lines = []
+    for n in range(n_proteins):
+        # some proteins have runs of lines longer than the index spacing
+        for _ in range(rnd.choice([1, 1, 2, 3, 20])):
+            lines.append("P{:05d}\t{}\t{}\tPF00001\t1\t{}".format(
+                n, rnd.choice(IPR_ITEMS)['id'], "x" * rnd.randint(0, 40), rnd.randint(2, 500)))
+    data = "\n".join(lines) + ("\n" if trailing_newline else "")
+    with gzip.open(file_path, 'wt') as f:
+        f.write(data)
+    return data.encode()
+
+
+def check_offsets(offsets, data):
+    assert offsets[0] == [0, 0]
+    assert offsets[-1] == [len(data), data.count(b'\n') + (not data.endswith(b'\n'))]
+    starts = [x[0] for x in offsets]
+    assert starts == sorted(set(starts))
+    for start, line_no in offsets[1:-1]:
+        assert data[start - 1:start] == b'\n'
+        assert data.count(b'\n', 0, start) == line_no
+        # a protein boundary
+        prev_key = data[data.rfind(b'\n', 0, start - 1) + 1:].split(b'\t', 1)[0]
+        assert data[start:].split(b'\t', 1)[0] != prev_key
+
+
+@pytest.mark.parametrize("spacing", [1, 7, 50, 1000, 10 ** 9])
+@pytest.mark.parametrize("trailing_newline", [True, False])
+def test_build_protein_index_small_spacing(tmp_path, monkeypatch, spacing, trailing_newline):
+    # blocks smaller than a protein's lines, too
+    monkeypatch.setattr(parser, "BLOCK_SIZE", 256)
+    file_path = str(tmp_path / "protein2ipr.dat.gz")
+    data = write_protein2ipr(file_path, 300, trailing_newline=trailing_newline)
+    offsets = build_protein_index(file_path, spacing=spacing)
+    check_offsets(offsets, data)
+    if spacing == 1:
+        # every protein boundary
+        assert len(offsets) == 301
+    for (a, _), (b, _) in zip(offsets[1:-1], offsets[2:-1]):
+        assert b - a >= spacing
+
+
+def test_build_protein_index_seek_points(tmp_path):
+    pytest.importorskip("indexed_gzip")
+    file_path = str(tmp_path / "protein2ipr.dat.gz")
+    data = write_protein2ipr(file_path, 300)
+    offsets = build_protein_index(file_path, spacing=500, seek_index_path=file_path + ".gzidx")
+    check_offsets(offsets, data)
+    assert os.path.exists(file_path + ".gzidx")
+
+
+@pytest.mark.parametrize("seek_points", [True, False])
+def test_parallel_same_as_sequential(tmp_path, monkeypatch, seek_points):
+    if seek_points:
+        pytest.importorskip("indexed_gzip")
+    else:
+        monkeypatch.setattr(parser.importlib.util, "find_spec", lambda name: None)
+    write_protein2ipr(str(tmp_path / "protein2ipr.dat.gz"), 2000)
+    ipr = IprIndex(IPR_ITEMS)
+    expected = list(parse_protein_ipr(str(tmp_path), ipr))
+    docs = list(parse_protein_ipr_parallel(str(tmp_path), ipr, processes=3, spacing=2000))
+    assert docs == expected
+    # the shards' temporary files are removed. without seek points, no index: the file is parsed sequentially
+    assert sorted(os.listdir(str(tmp_path))) == (
+        ["protein2ipr.dat.gz", "protein2ipr.dat.gz.gzidx", "protein2ipr.dat.gz.idx"] if seek_points else
+        ["protein2ipr.dat.gz"])
+
+
+def test_parallel_allowlist(tmp_path):
+    write_protein2ipr(str(tmp_path / "protein2ipr.dat.gz"), 500)
+    allowlist = {"P{:05d}".format(n).encode() for n in range(0, 500, 7)}
+    ipr = IprIndex(IPR_ITEMS)
+    expected = list(parse_protein_ipr(str(tmp_path), ipr, allowlist=allowlist))
+    assert len(expected) == len(allowlist)
+    assert list(parse_protein_ipr_parallel(str(tmp_path), ipr, processes=2, spacing=500,
+                                           allowlist=allowlist)) == expected
@@ -0,0 +1,43 @@
+import sys
+import types
+
+import pytest
+
+pytest.importorskip("local")
+
+from contrib.interpro.stages import interpro_uploaded
+
+
+@pytest.fixture
+def src_dump(monkeypatch):
+    doc = {}
+    mongo = types.ModuleType("biothings.utils.mongo")
+    mongo.get_src_dump = lambda: types.SimpleNamespace(find_one=lambda query: doc)
+    for name in ("biothings", "biothings.utils"):
+        monkeypatch.setitem(sys.modules, name, types.ModuleType(name))
+    monkeypatch.setitem(sys.modules, "biothings.utils.mongo", mongo)
+    return doc
+
+
+def upload(status, release=None):
+    job = {'status': status}
+    if release:
+        job['release'] = release
+    return {'jobs': {'interpro': job}}
+
+
+def test_interpro_uploaded(src_dump):
+    context = {'release_info': {'version': "61.0"}}
+    # the previous release's upload
+    src_dump.update({'release': "60.0", 'upload': upload("success")})
+    assert interpro_uploaded(context) is None
+    src_dump.update({'release': "60.0", 'upload': upload("failed")})
+    assert interpro_uploaded(context) is None
+    # this release's
+    src_dump.update({'release': "61.0", 'upload': upload("uploading")})
+    assert interpro_uploaded(context) is None
+    src_dump.update({'upload': upload("success", release="61.0")})
+    assert interpro_uploaded(context) == "success"
+    src_dump.update({'upload': upload("failed")})
+    with pytest.raises(ValueError):
+        interpro_uploaded(context)
@@ -0,0 +1,54 @@
+import os
+import random
+
+import pytest
+
+from contrib.interpro.parser import IprIndex
+from contrib.interpro.store import ProteinStore, write_protein_store
+
+IPR_ITEMS = [{'id': "IPR{:06d}".format(n), 'type': "Family" if n % 2 else "Domain"} for n in range(1, 30)]
+
+
+@pytest.fixture
+def docs():
+    # interpro_protein docs, as parse_protein_ipr outputs them
+    rnd = random.Random(0)
+    ids = [x['id'] for x in IPR_ITEMS]
+    return [{'_id': "P{:05d}".format(n), 'subclass': rnd.sample(ids, rnd.randint(0, 3)),
+             'has_part': rnd.sample(ids, rnd.randint(0, 5))} for n in range(0, 1500, 3)]
+
+
+def test_round_trip(tmp_path, docs):
+    path = str(tmp_path / "interpro_protein.store")
+    # the docs go through as they're written
+    assert list(write_protein_store(iter(docs), path, IprIndex(IPR_ITEMS))) == docs
+    assert not os.path.exists(path + ".tmp")
+    with ProteinStore(path) as store:
+        assert len(store) == len(docs)
+        assert list(store) == docs
+        for doc in docs[::37]:
+            assert store[doc['_id']] == doc
+            assert doc['_id'] in store
+        assert "Q00000" not in store
+        assert store.get("Q00000") is None
+        with pytest.raises(KeyError):
+            store["Q00000"]
+        wanted = [doc['_id'] for doc in docs[::5]] + ["A00000", "Q00000"]
+        assert store.lookup(wanted) == {doc['_id']: doc for doc in docs[::5]}
+
+
+def test_empty_store(tmp_path):
+    path = str(tmp_path / "interpro_protein.store")
+    assert list(write_protein_store([], path, IprIndex(IPR_ITEMS))) == []
+    with ProteinStore(path) as store:
+        assert len(store) == 0
+        assert list(store) == []
+        assert store.get("P00001") is None
+
+
+def test_unsorted_docs(tmp_path, docs):
+    path = str(tmp_path / "interpro_protein.store")
+    with pytest.raises(ValueError):
+        list(write_protein_store([docs[1], docs[0]], path, IprIndex(IPR_ITEMS)))
+    # the previous store (none) is left alone
+    assert not os.path.exists(path)
@@ -0,0 +1,49 @@
+import threading
+import time
+
+from contrib.lazy import lazy_class_attribute
+
+
+def test_lazy_class_attribute_computed_once():
+    calls = []
+
+    class Term:
+        @lazy_class_attribute
+        def ipr2wd(cls):
+            calls.append(1)
+            return {'IPR000001': 'Q1'}
+
+    assert calls == []
+    assert Term.ipr2wd == {'IPR000001': 'Q1'}
+    Term.ipr2wd['IPR000002'] = 'Q2'
+    assert Term.ipr2wd == {'IPR000001': 'Q1', 'IPR000002': 'Q2'}
+    assert calls == [1]
+
+
+def test_lazy_class_attribute_threads():
+    calls = []
+    started = threading.Event()
+
+    class Term:
+        @lazy_class_attribute
+        def ipr2wd(cls):
+            calls.append(1)
+            started.set()
+            # a slow sparql query
+            time.sleep(0.2)
+            return {'IPR000001': 'Q1'}
+
+    def write_through(n):
+        Term.ipr2wd["IPR{:06d}".format(n)] = "Q{}".format(n)
+
+    first = threading.Thread(target=write_through, args=(100,))
+    first.start()
+    started.wait()
+    threads = [threading.Thread(target=write_through, args=(n,)) for n in range(10, 20)]
+    for t in threads:
+        t.start()
+    for t in [first] + threads:
+        t.join()
+    assert calls == [1]
+    # no write-through id was lost
+    assert len(Term.ipr2wd) == 12
@@ -0,0 +1,117 @@
+import gzip
+import os
+import time
+
+import pytest
+import requests
+
+from contrib import log_shipper
+from contrib.log_shipper import SENDING, LogShipper
+
+
+class Receiver:
+    """
+    Stands in for requests.post to the logging host
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.down = False
+
+    def __call__(self, url, data, headers, timeout):
+        if self.down:
+            raise requests.ConnectionError("down")
+        self.chunks.append((headers['X-Log-Name'], int(headers['X-Log-Offset']), gzip.decompress(data)))
+        return Response()
+
+    def log(self, log_name):
+        data = b""
+        for name, offset, chunk in sorted(self.chunks):
+            if name == log_name:
+                assert offset == len(data)
+                data += chunk
+        return data
+
+
+class Response:
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def receiver(monkeypatch):
+    receiver = Receiver()
+    monkeypatch.setattr(log_shipper.requests, "post", receiver)
+    return receiver
+
+
+def new_shipper(tmp_path, **kwargs):
+    return LogShipper("http://localhost/uploadPOST/", str(tmp_path / "spool"), chunk_size=10, **kwargs)
+
+
+def write_log(tmp_path, data, mode='wb'):
+    file_path = str(tmp_path / "bot.log")
+    with open(file_path, mode) as f:
+        f.write(data)
+    return file_path
+
+
+def test_spool_offsets(tmp_path, receiver):
+    shipper = new_shipper(tmp_path)
+    file_path = write_log(tmp_path, b"line 1\nline 2\npartial")
+    # the bot is still writing: only whole lines
+    assert shipper.spool(file_path, final=False) == 2
+    assert shipper.get_offset("bot.log") == len(b"line 1\nline 2\n")
+    write_log(tmp_path, b" line 3\n", mode='ab')
+    shipper.spool(file_path)
+    assert shipper.get_offset("bot.log") == os.path.getsize(file_path)
+    assert shipper.send_pending()
+    assert receiver.log("bot.log") == b"line 1\nline 2\npartial line 3\n"
+    assert shipper.pending() == []
+    # nothing new, nothing sent again
+    n = len(receiver.chunks)
+    assert shipper.ship(file_path)
+    assert len(receiver.chunks) == n
+
+
+def test_retry_while_receiver_is_down(tmp_path, receiver):
+    shipper = new_shipper(tmp_path)
+    file_path = write_log(tmp_path, b"a" * 25)
+    receiver.down = True
+    assert not shipper.ship(file_path)
+    # the chunks stay in the spool, unclaimed
+    assert len(shipper.pending()) == 3
+    assert not any(x.endswith(SENDING) for x in os.listdir(shipper.spool_dir))
+    receiver.down = False
+    assert shipper.send_pending()
+    assert receiver.log("bot.log") == b"a" * 25
+    assert len(receiver.chunks) == 3
+
+
+def test_claimed_chunks_are_sent_once(tmp_path, receiver):
+    shipper = new_shipper(tmp_path)
+    other = new_shipper(tmp_path)
+    shipper.spool(write_log(tmp_path, b"a" * 25))
+    first = shipper.pending()[0]
+    # another shipper is sending the first chunk
+    assert other.claim(first)
+    assert not shipper.claim(first)
+    assert shipper.send_pending()
+    assert [offset for _, offset, _ in receiver.chunks] == [10, 20]
+    other.unclaim(first)
+    assert other.send_pending()
+    assert sorted(offset for _, offset, _ in receiver.chunks) == [0, 10, 20]
+
+
+def test_stale_claims_are_recovered(tmp_path, receiver):
+    shipper = new_shipper(tmp_path, claim_timeout=60)
+    shipper.spool(write_log(tmp_path, b"a" * 5))
+    chunk_path, = shipper.pending()
+    # a shipper died while sending it
+    assert shipper.claim(chunk_path)
+    assert shipper.send_pending() and receiver.chunks == []
+    old = time.time() - 120
+    os.utime(chunk_path + SENDING, (old, old))
+    assert shipper.send_pending()
+    assert receiver.log("bot.log") == b"a" * 5
+    assert os.listdir(shipper.spool_dir) == ["bot.log.offset"]
@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+
+from contrib import metrics
+from contrib.metrics import Registry, read_all
+
+
+def write_registry(metrics_dir, pid, n):
+    registry = Registry()
+    registry.counter("wd_items_total", action="create").inc(n)
+    registry.histogram("mongo_fetch_seconds").observe(0.2)
+    registry.write(os.path.join(metrics_dir, "{}.prom".format(pid)), pid=pid)
+
+
+def dead_pid():
+    p = subprocess.Popen([sys.executable, "-c", "pass"])
+    p.wait()
+    return p.pid
+
+
+def test_to_text():
+    registry = Registry()
+    registry.counter("wd_items_total", action="create").inc(2)
+    registry.counter("wd_items_total", action="update").inc()
+    text = registry.to_text(pid=1)
+    assert text.count("# TYPE wd_items_total counter") == 1
+    assert 'wd_items_total{action="create",pid="1"} 2' in text
+    assert 'wd_items_total{action="update",pid="1"} 1' in text
+
+
+def test_read_all_merges_processes(tmp_path):
+    metrics_dir = str(tmp_path)
+    write_registry(metrics_dir, os.getpid(), 2)
+    write_registry(metrics_dir, os.getppid(), 3)
+    lines = read_all(metrics_dir).splitlines()
+    # one TYPE line per metric, followed by the samples of every process
+    assert [x for x in lines if x.startswith("#")] == ["# TYPE mongo_fetch_seconds histogram",
+                                                      "# TYPE wd_items_total counter"]
+    i = lines.index("# TYPE wd_items_total counter")
+    assert sorted(lines[i + 1:]) == sorted('wd_items_total{{action="create",pid="{}"}} {}'.format(pid, n)
+                                           for pid, n in [(os.getpid(), 2), (os.getppid(), 3)])
+    assert sum(x.startswith("mongo_fetch_seconds_count") for x in lines) == 2
+
+
+def test_read_all_removes_dead_processes(tmp_path):
+    metrics_dir = str(tmp_path)
+    pid = dead_pid()
+    write_registry(metrics_dir, pid, 1)
+    write_registry(metrics_dir, os.getpid(), 2)
+    text = read_all(metrics_dir)
+    assert 'pid="{}"'.format(pid) not in text
+    assert os.listdir(metrics_dir) == ["{}.prom".format(os.getpid())]
+
+
+def test_export_file_removed_at_exit(tmp_path):
+    metrics_dir = str(tmp_path)
+    code = "from contrib import metrics; metrics.start_export({!r}, interval=0.01); " \
+           "metrics.counter('x_total').inc(); import time; time.sleep(0.2)".format(metrics_dir)
+    subprocess.check_call([sys.executable, "-c", code], cwd=os.path.dirname(os.path.dirname(metrics.__file__)))
+    assert os.listdir(metrics_dir) == []
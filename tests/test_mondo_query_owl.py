@@ -0,0 +1,60 @@
+import random
+from itertools import chain
+
+import pytest
+
+from contrib.mondo.query_owl import do_queries, equivalence_classes, get_all_ids
+
+rdflib = pytest.importorskip("rdflib")
+from rdflib.namespace import OWL  # noqa: E402
+from rdflib.plugins.sparql import prepareQuery  # noqa: E402
+
+BASE = "http://purl.obolibrary.org/obo/"
+
+
+def baseline_all_ids(g):
+    # get_all_ids and do_queries as they were, with sparql property paths
+    q = prepareQuery("""PREFIX owl: <http://www.w3.org/2002/07/owl#>
+    select * where { ?s owl:equivalentClass|^owl:equivalentClass ?x . filter (?s != ?x) }""")
+    return set(chain(*[(str(r[0]), str(r[1])) for r in g.query(q)]))
+
+
+def baseline_queries(g, ids):
+    q = prepareQuery("""PREFIX owl: <http://www.w3.org/2002/07/owl#>
+    select * where { ?s (owl:equivalentClass|^owl:equivalentClass)* ?x . }""")
+    d = []
+    for id in ids:
+        result = g.query(q, initBindings={'s': rdflib.URIRef(id)})
+        equiv_class = [x.split("/")[-1] for x in set(chain(*list(result)))]
+        d.append({'_id': id.split("/")[-1].replace("_", ":"),
+                  'equivalent_class': [x.replace("_", ":") for x in equiv_class]})
+    return d
+
+
+def normalized(docs):
+    return sorted((d['_id'], sorted(d['equivalent_class'])) for d in docs)
+
+
+def random_graph(seed, n_nodes=60, n_edges=50):
+    rnd = random.Random(seed)
+    nodes = [rdflib.URIRef(BASE + "{}_{}".format(rnd.choice(["DOID", "UMLS", "MESH"]), n)) for n in range(n_nodes)]
+    g = rdflib.Graph()
+    for _ in range(n_edges):
+        # chains, cycles, both directions and self equivalences
+        g.add((rnd.choice(nodes), OWL.equivalentClass, rnd.choice(nodes)))
+    return g
+
+
+def test_equivalence_classes():
+    classes = equivalence_classes([("a", "b"), ("c", "b"), ("d", "e"), ("e", "d"), ("f", "f")])
+    assert classes["a"] == classes["b"] == classes["c"] == {"a", "b", "c"}
+    assert classes["d"] == {"d", "e"}
+    assert classes["f"] == {"f"}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_same_as_sparql_closure(seed):
+    g = random_graph(seed)
+    ids = get_all_ids(g)
+    assert ids == baseline_all_ids(g)
+    assert normalized(do_queries(g, ids)) == normalized(baseline_queries(g, ids))
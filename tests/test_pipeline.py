@@ -0,0 +1,103 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from contrib.pipeline import DONE, FAILED, SKIPPED, Pipeline, PipelineManager, Stage, Wait, request
+
+CALLS = []
+
+
+def record(name, fail=False):
+    def fn(context):
+        CALLS.append(name)
+        if fail:
+            raise ValueError("{} failed".format(name))
+        return "{}({})".format(name, ",".join(sorted(k for k in context if k != 'fail')))
+    return fn
+
+
+def make(params):
+    # a -> b -> c, a -> d
+    return Pipeline("test", [Stage("a", record("a")), Stage("b", record("b", fail=params.get('fail')), after=["a"]),
+                             Stage("c", record("c"), after=["b"]), Stage("d", record("d"), after=["a"])], params)
+
+
+def test_inline_run():
+    del CALLS[:]
+    pipeline = make({})
+    status = pipeline.run()
+    assert CALLS.index("a") < CALLS.index("b") < CALLS.index("c")
+    assert CALLS.index("a") < CALLS.index("d")
+    assert {name: x['state'] for name, x in status.items()} == {'a': DONE, 'b': DONE, 'c': DONE, 'd': DONE}
+    assert pipeline.context['b'] == "b(a)"
+
+
+def test_failed_stage_skips_the_stages_after_it():
+    del CALLS[:]
+    pipeline = make({'fail': True})
+    status = pipeline.run(ThreadPoolExecutor(2))
+    assert {name: x['state'] for name, x in status.items()} == {'a': DONE, 'b': FAILED, 'c': SKIPPED, 'd': DONE}
+    assert "b failed" in pipeline.errors['b']
+    assert "c" not in CALLS
+
+
+def test_wait_stage_is_checked_on_poll():
+    checks = []
+
+    def uploaded(context):
+        checks.append(1)
+        return "success" if len(checks) >= 3 else None
+
+    pipeline = Pipeline("test", [Wait("uploaded", uploaded), Stage("bot", record("bot"), after=["uploaded"])])
+    future = pipeline.start(ThreadPoolExecutor(1))
+    assert len(checks) == 1 and not future.done()
+    pipeline.poll()
+    assert not future.done()
+    pipeline.poll()
+    assert future.result(timeout=5)['bot']['state'] == DONE
+    assert pipeline.context['uploaded'] == "success"
+
+
+def test_wait_stage_timeout():
+    pipeline = Pipeline("test", [Wait("uploaded", lambda context: None, timeout=0),
+                                 Stage("bot", record("bot"), after=["uploaded"])])
+    status = pipeline.run(poll_interval=0.01)
+    assert status['uploaded']['state'] == FAILED
+    assert status['bot']['state'] == SKIPPED
+
+
+def test_manager_saves_and_resumes(tmp_path):
+    del CALLS[:]
+    pipeline_dir = str(tmp_path)
+    executor = ThreadPoolExecutor(2)
+    request("test_pipeline.make", {'fail': True}, pipeline_dir)
+    manager = PipelineManager(executor, pipeline_dir)
+    manager.poll()
+    manager.pipelines[0].future.result(timeout=5)
+    for _ in range(100):
+        if any(x.endswith(".failed") for x in os.listdir(pipeline_dir)):
+            break
+        time.sleep(0.01)
+    failed, = [x for x in os.listdir(pipeline_dir) if x.endswith(".failed")]
+    with open(os.path.join(pipeline_dir, failed)) as f:
+        d = json.load(f)
+    assert d['done'] == {'a': "a()", 'd': "d(a)"}
+
+    # asked again: only what wasn't done runs
+    del CALLS[:]
+    d['params']['fail'] = False
+    with open(os.path.join(pipeline_dir, failed[:-len(".failed")] + ".json.running"), 'w') as f:
+        json.dump(d, f)
+    os.remove(os.path.join(pipeline_dir, failed))
+    manager = PipelineManager(executor, pipeline_dir)
+    manager.poll()
+    status = manager.pipelines[0].future.result(timeout=5)
+    assert sorted(CALLS) == ["b", "c"]
+    assert all(x['state'] == DONE for x in status.values())
+    # the request is removed by a callback of the future
+    for _ in range(100):
+        if not os.listdir(pipeline_dir):
+            break
+        time.sleep(0.01)
+    assert os.listdir(pipeline_dir) == []
@@ -0,0 +1,86 @@
+import sys
+import threading
+import types
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import pytest
+
+from contrib.scheduler import Scheduler, job_source
+
+
+class BaseSourceUploader:
+    pass
+
+
+class BaseDumper:
+    pass
+
+
+class Uploader(BaseSourceUploader):
+    name = "interpro_protein"
+
+    def load_data(self, data_folder):
+        return data_folder
+
+
+class Dumper(BaseDumper):
+    SRC_NAME = "interpro"
+
+
+class Named:
+    name = "not a source"
+
+
+@pytest.fixture
+def biothings(monkeypatch):
+    # the uploader and dumper base classes job_source checks for
+    for name, attrs in [("biothings", {}), ("biothings.dataload", {}),
+                        ("biothings.dataload.uploader", {'BaseSourceUploader': BaseSourceUploader}),
+                        ("biothings.dataload.dumper", {'BaseDumper': BaseDumper})]:
+        module = types.ModuleType(name)
+        module.__dict__.update(attrs)
+        monkeypatch.setitem(sys.modules, name, module)
+
+
+def process(load, *args):
+    return load(*args)
+
+
+def test_job_source(biothings):
+    uploader = Uploader()
+    assert job_source(uploader.load_data) == "interpro_protein"
+    assert job_source(process, (Dumper,)) == "interpro"
+    # other objects with a name aren't sources
+    assert job_source(process, (Named(), uploader)) == "interpro_protein"
+    assert job_source(process, (Named,)) is None
+    assert job_source(process, (uploader,)) == "interpro_protein"
+    # a bound method of the uploader in a partial, as the storages are called
+    assert job_source(partial(process, uploader.load_data, "data")) == "interpro_protein"
+    assert job_source(process, (partial(uploader.load_data, "data"),)) == "interpro_protein"
+    assert job_source(partial(process, len), ("data",)) is None
+
+
+def test_job_workers():
+    release = threading.Event()
+    started = []
+
+    def job(name):
+        started.append(name)
+        release.wait(5)
+        return name
+
+    scheduler = Scheduler({"cpu": {"workers": 3, "executor": ThreadPoolExecutor(3)}},
+                          {"parse": {"class": "cpu", "workers": 2}, "all": {"class": "cpu", "workers": None}})
+    futures = [scheduler.submit_job(job, ("parse",), source="parse"),
+               scheduler.submit_job(job, ("other",)),
+               scheduler.submit_job(job, ("all",), source="all"),
+               scheduler.submit_job(job, ("other2",))]
+    status = scheduler.status()['cpu']
+    # parse takes 2 of the 3 workers. "all" waits for the whole class, and the job after it waits its turn
+    assert [j.source or j.args[0] for j in status['running']] == ["parse", "other"]
+    assert [j.source or j.args[0] for j in status['queued']] == ["all", "other2"]
+    release.set()
+    assert [f.result(timeout=5) for f in futures] == ["parse", "other", "all", "other2"]
+    assert scheduler.classes["cpu"].busy == 0
+    scheduler.shutdown()
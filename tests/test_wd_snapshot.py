@@ -0,0 +1,172 @@
+import gzip
+import json
+import sys
+import types
+from collections import defaultdict
+
+import pytest
+import requests
+
+from contrib import wd_snapshot
+from contrib.dry_run import DryRun
+from contrib.wd_snapshot import PROPERTIES, OfflineError, Snapshot, extract, reads_wikidata
+
+RELEASE_QUERY = 'SELECT ?item WHERE { ?item wdt:P629 wd:Q3047275; wdt:P393 "60.0" }'
+
+
+def entity(qid, claims, label=None, aliases=()):
+    d = {'id': qid, 'claims': {}, 'labels': {}, 'descriptions': {}, 'aliases': {}}
+    for n, (prop, value) in enumerate(claims):
+        datavalue = {'value': {'numeric-id': int(value[1:])} if value.startswith("Q") else value}
+        d['claims'].setdefault(prop, []).append({'id': "{}${}".format(qid, n), 'rank': 'normal',
+                                                 'mainsnak': {'snaktype': 'value', 'datavalue': datavalue}})
+    if label:
+        d['labels'] = {'en': {'language': 'en', 'value': label}, 'fr': {'language': 'fr', 'value': label + "_fr"}}
+    if aliases:
+        d['aliases'] = {'en': [{'language': 'en', 'value': x} for x in aliases]}
+    return json.dumps(d) + ",\n"
+
+
+class Container:
+    def __init__(self, base_filter):
+        self.base_filter = base_filter
+        self.prop_data = {}
+        self.rev_lookup = defaultdict(set)
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    lines = [entity("Q1", [("P352", "P00001"), ("P703", "Q15978631")], label="protein 1", aliases=["p1", "prot1"]),
+             entity("Q2", [("P352", "P00002"), ("P703", "Q5")], label="protein 2"),
+             entity("Q3", [("P2926", "IPR000001")], label="family"),
+             entity("Q4", [("P31", "Q5")], label="human")]
+    file_path = str(tmp_path / "wd_snapshot.jsonl.gz")
+    with gzip.open(file_path, 'wt') as f:
+        for line in lines:
+            item = extract(line, PROPERTIES)
+            if item:
+                f.write(json.dumps(item) + "\n")
+    return Snapshot(file_path)
+
+
+def test_extract():
+    item = extract(entity("Q1", [("P352", "P00001")], label="protein 1", aliases=["p1"]), PROPERTIES)
+    assert item == {'id': "Q1", 'claims': {'P352': [["Q1$0", "P00001"]]}, 'labels': {'en': "protein 1"},
+                    'descriptions': {}, 'aliases': {'en': ["p1"]}}
+    assert extract(entity("Q4", [("P31", "Q5")]), PROPERTIES) is None
+
+
+def test_id_mapper(snapshot):
+    assert snapshot.id_mapper("P352") == {'P00001': "Q1", 'P00002': "Q2"}
+    assert snapshot.id_mapper("P352", (("P703", "Q15978631"),)) == {'P00001': "Q1"}
+    assert snapshot.id_mapper("P699") == {}
+
+
+def test_query_data(snapshot):
+    container = Container({'P352': '', 'P703': "Q5"})
+    snapshot.query_data(container, "P352")
+    assert container.prop_data == {'Q2': {'P352': {"Q2$0": {'v': "P00002", 'ref': {}, 'qual': set()}}}}
+    assert container.rev_lookup == {'P00002': {"Q2"}}
+
+
+def test_query_lang(snapshot):
+    container = Container({'P352': ''})
+    assert sorted((x['item']['value'], x['label']['value']) for x in snapshot.query_lang(container, "en", "aliases")) \
+        == [("http://www.wikidata.org/entity/Q1", "p1"), ("http://www.wikidata.org/entity/Q1", "prot1")]
+    assert len(snapshot.query_lang(container, "en", "label")) == 2
+    with pytest.raises(OfflineError):
+        snapshot.query_lang(container, "fr", "label")
+
+
+def test_sparql_lookups(snapshot):
+    query = 'SELECT ?item WHERE {{ ?item wdt:P2926 "{}" }}'
+    assert snapshot.execute_sparql_query(query.format("IPR000001"))['results']['bindings'] == \
+        [{'item': {'value': "http://www.wikidata.org/entity/Q3"}}]
+    assert snapshot.execute_sparql_query(query.format("IPR000002"))['results']['bindings'] == []
+    # anything else would go to the network
+    with pytest.raises(OfflineError):
+        snapshot.execute_sparql_query("SELECT ?item ?label WHERE { ?item rdfs:label ?label }")
+
+
+def test_reads_wikidata():
+    api = "https://www.wikidata.org/w/api.php"
+    assert reads_wikidata("https://query.wikidata.org/sparql", {'query': "..."}, None)
+    assert not reads_wikidata(api, {'action': 'wbgetentities', 'ids': "Q1"}, None)
+    assert reads_wikidata(api, {'action': 'wbgetentities', 'ids': "Q1"}, None, offline=True)
+    # logins and writes still go through
+    assert not reads_wikidata(api, None, {'action': 'login'}, offline=True)
+    assert not reads_wikidata(api, None, {'action': 'wbeditentity'}, offline=True)
+    assert not reads_wikidata("http://localhost:8080/log", None, None, offline=True)
+    # the release items aren't in the snapshot
+    assert not reads_wikidata("https://query.wikidata.org/sparql", {'query': RELEASE_QUERY}, None, offline=True)
+
+
+def fake_pbb(monkeypatch, endpoint_queries):
+    """
+    ProteinBoxBot_Core with a WDItemEngine that loads its entity and applies the new data to it, as the real one
+    """
+    pbb = types.ModuleType("ProteinBoxBot_Core")
+    for name in ("PBB_Core", "PBB_Helpers", "PBB_fastrun"):
+        setattr(pbb, name, types.ModuleType("ProteinBoxBot_Core." + name))
+        monkeypatch.setitem(sys.modules, "ProteinBoxBot_Core." + name, getattr(pbb, name))
+    monkeypatch.setitem(sys.modules, "ProteinBoxBot_Core", pbb)
+
+    class WDItemEngine:
+        def __init__(self, wd_item_id='', data=()):
+            self.wd_item_id = wd_item_id
+            self.create_new_item = not wd_item_id
+            self.wd_json_representation = self.get_wd_entity() if wd_item_id else {'claims': {}}
+            claims = self.wd_json_representation['claims']
+            self.require_write = any(prop not in claims for prop, _ in data)
+            for prop, value in data:
+                claims.setdefault(prop, []).append({'mainsnak': {'snaktype': 'value', 'datavalue': {'value': value}}})
+
+        @staticmethod
+        def execute_sparql_query(query):
+            endpoint_queries.append(query)
+            return {'results': {'bindings': [{'item': {'value': "http://www.wikidata.org/entity/Q9"}}]}}
+
+        def get_wd_entity(self):
+            raise AssertionError("loaded {} from wikidata".format(self.wd_item_id))
+
+        def get_wd_json_representation(self):
+            return self.wd_json_representation
+
+    class Release:
+        def __init__(self, title):
+            self.title = title
+
+        def get_or_create(self, login=None):
+            bindings = pbb.PBB_Core.WDItemEngine.execute_sparql_query(RELEASE_QUERY)['results']['bindings']
+            return bindings[0]['item']['value'].split("/")[-1]
+
+    pbb.PBB_Core.WDItemEngine = WDItemEngine
+    pbb.PBB_Helpers.Release = Release
+    pbb.PBB_fastrun.FastRunContainer = type("FastRunContainer", (), {})
+    return pbb
+
+
+def test_offline_dry_run(monkeypatch, snapshot):
+    endpoint_queries = []
+    pbb = fake_pbb(monkeypatch, endpoint_queries)
+    monkeypatch.setattr(wd_snapshot, "WDHELPER_MODULES", [])
+    monkeypatch.setattr(requests.Session, "request", requests.Session.request)
+    snapshot.install(offline=True)
+
+    # a bot's dry run
+    dry_run = DryRun()
+    assert dry_run.release_qid(pbb.PBB_Helpers.Release("InterPro Release 60.0")) == "Q9"
+    uniprot2wd = pbb.PBB_Helpers.id_mapper("P352")
+    for uniprot_id in ["P00001", "P00003"]:
+        wd_item = pbb.PBB_Core.WDItemEngine(uniprot2wd.get(uniprot_id, ''), data=[("P2926", "IPR000001")])
+        dry_run.write(wd_item, uniprot_id, "P352", None)
+    report = dry_run.report()
+    assert report['items'] == {'needs_online_check': 1, 'create': 1}
+    assert report['samples'][0] == {'id': "P00001", 'qid': "Q1", 'needs_online_check': True}
+    assert report['would_create'] == []
+    # the release lookup went to the endpoint, the IPRTerm lookups still don't
+    assert endpoint_queries == [RELEASE_QUERY]
+    assert pbb.PBB_Core.WDItemEngine.execute_sparql_query('SELECT ?item WHERE { ?item wdt:P2926 "IPR000001" }') == \
+        {'results': {'bindings': [{'item': {'value': "http://www.wikidata.org/entity/Q3"}}]}}
+    with pytest.raises(OfflineError):
+        requests.Session().get("https://query.wikidata.org/sparql", params={'query': "SELECT ?item"})
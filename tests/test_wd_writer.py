@@ -0,0 +1,153 @@
+import threading
+
+import pytest
+
+from contrib.wd_writer import RateLimiter, WriteExecutor, retry_after
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        with self.lock:
+            self.now += seconds
+
+
+class Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code, headers=None):
+        self.response = Response(status_code, headers)
+
+
+class WDApiError(Exception):
+    def __init__(self, code, lag=None):
+        self.wd_error_msg = {'error': {'code': code, 'lag': lag}}
+
+
+class Item:
+    require_write = True
+    create_new_item = False
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.n_writes = 0
+
+    def write(self, login):
+        self.n_writes += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "Q1"
+
+
+def write_item(wd_item, login):
+    return wd_item.write(login)
+
+
+def new_limiter(clock, **kwargs):
+    return RateLimiter(sleep=clock.sleep, clock=clock, **kwargs)
+
+
+def test_retry_after():
+    assert retry_after(HTTPError(429, {'Retry-After': '7'})) == 7
+    assert retry_after(HTTPError(503)) == 0
+    assert retry_after(HTTPError(500)) is None
+    assert retry_after(WDApiError('maxlag', lag=3)) == 3
+    assert retry_after(WDApiError('ratelimited')) == 0
+    assert retry_after(WDApiError('badtoken')) is None
+    assert retry_after(ValueError()) is None
+
+
+def test_rate_limiter_spaces_requests():
+    clock = Clock()
+    limiter = new_limiter(clock, min_delay=0.5, thread_delay=0)
+    starts = [limiter.wait() for _ in range(4)]
+    assert starts == [100, 100.5, 101, 101.5]
+
+
+def test_rate_limiter_min_delay_by_default():
+    clock = Clock()
+    limiter = new_limiter(clock)
+    assert limiter.delay > 0
+    first, second = limiter.wait(), limiter.wait()
+    assert second - first >= limiter.min_delay
+
+
+def test_rate_limiter_thread_delay():
+    clock = Clock()
+    limiter = new_limiter(clock, min_delay=0, thread_delay=2)
+    assert limiter.wait() == 100
+    # another thread isn't held up by this thread's delay
+    other = []
+    t = threading.Thread(target=lambda: other.append(limiter.wait()))
+    t.start()
+    t.join()
+    assert other == [100]
+    assert limiter.wait() == 102
+
+
+def test_rate_limiter_backoff_and_decay():
+    clock = Clock()
+    limiter = new_limiter(clock, min_delay=0.5, thread_delay=0, backoff_delay=1, max_delay=8, decay=0.5)
+    started = limiter.wait()
+    # the request took a second
+    clock.sleep(1)
+    limiter.backoff(started=started)
+    assert limiter.delay == 1
+    # a request started before that backoff doesn't double it again
+    limiter.backoff(started=started)
+    assert limiter.delay == 1
+    for _ in range(5):
+        limiter.backoff()
+    assert limiter.delay == 8
+    # Retry-After pushes the next start
+    now = clock()
+    limiter.backoff(wait=30)
+    assert limiter.wait() >= now + 30
+    for _ in range(10):
+        limiter.success()
+    assert limiter.delay == 0.5
+
+
+def test_executor_retries_rate_limited_writes():
+    clock = Clock()
+    item = Item([HTTPError(429, {'Retry-After': '5'}), WDApiError('maxlag', lag=2)])
+    with WriteExecutor(max_workers=2, limiter=new_limiter(clock)) as executor:
+        future = executor.submit(write_item, item, "login")
+    assert future.result() == "Q1"
+    assert item.n_writes == 3
+    assert executor.n_throttled == 2
+    # waited at least the Retry-After
+    assert clock() >= 105
+
+
+def test_executor_gives_up_after_max_retries():
+    clock = Clock()
+    item = Item([HTTPError(429)] * 4)
+    executor = WriteExecutor(max_workers=1, max_retries=3, limiter=new_limiter(clock))
+    future = executor.submit(write_item, item, "login")
+    with pytest.raises(HTTPError):
+        executor.shutdown()
+    assert item.n_writes == 4
+    assert isinstance(future.exception(), HTTPError)
+
+
+def test_executor_doesnt_retry_other_errors():
+    clock = Clock()
+    items = [Item([ValueError("bad claim")]), Item()]
+    executor = WriteExecutor(max_workers=2, limiter=new_limiter(clock))
+    futures = [executor.submit(write_item, item, "login") for item in items]
+    with pytest.raises(ValueError):
+        executor.join()
+    executor.shutdown()
+    assert items[0].n_writes == 1
+    assert futures[1].result() == "Q1"